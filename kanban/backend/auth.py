@@ -1,33 +1,73 @@
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
 from .config import settings
 from .db import get_db
 from . import models
+from .services.password_hasher import PasswordHasher, HasherBusy, hash_password_sync, verify_and_update_sync
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_QUEUE,
+    rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+)
 security = HTTPBearer()
 
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    """Hashes on the calling thread; request handlers should use `ahash_password`."""
+    return hash_password_sync(password, settings.PASSWORD_BCRYPT_ROUNDS)
 
 def verify_password(password: str, hash_: str) -> bool:
-    return pwd_context.verify(password, hash_)
+    return verify_and_update_sync(password, hash_, settings.PASSWORD_BCRYPT_ROUNDS)[0]
+
+def _hasher_busy() -> HTTPException:
+    return HTTPException(status_code=503, detail="Too many sign-ins right now, please retry shortly", headers={"Retry-After": "2"})
+
+async def ahash_password(password: str) -> str:
+    try:
+        return await password_hasher.hash(password)
+    except HasherBusy:
+        raise _hasher_busy()
+
+async def averify_password(password: str, hash_: str) -> tuple[bool, Optional[str]]:
+    """(matches, new_hash); `new_hash` is set when the stored hash should be replaced (work factor changed)."""
+    try:
+        return await password_hasher.verify_and_update(password, hash_)
+    except HasherBusy:
+        raise _hasher_busy()
 
 def create_access_token(sub: str, expires_delta: Optional[timedelta] = None) -> str:
     expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode = {"sub": sub, "exp": expire}
     return jwt.encode(to_encode, settings.JWT_SECRET, algorithm=ALGORITHM)
 
-def get_current_user(creds: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)) -> models.User:
-    token = creds.credentials
+# --- Auth caches ---
+# token -> (sub, exp timestamp): a token seen before is not HMAC-verified again until it expires
+_token_cache: "OrderedDict[str, tuple[str, float]]" = OrderedDict()
+# email -> (cached_until, column values): rebuilt into a User without a query
+_user_cache: dict[str, tuple[float, dict]] = {}
+_cache_lock = threading.Lock()
+
+def _decode_token(token: str) -> str:
+    """Subject of a valid token; raises HTTPException(401) otherwise."""
+    now = time.time()
+    with _cache_lock:
+        cached = _token_cache.get(token)
+        if cached is not None:
+            if cached[1] > now:
+                _token_cache.move_to_end(token)
+                return cached[0]
+            del _token_cache[token]
     try:
         payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -35,7 +75,66 @@ def get_current_user(creds: HTTPAuthorizationCredentials = Depends(security), db
             raise HTTPException(status_code=401, detail="Invalid token")
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    with _cache_lock:
+        _token_cache[token] = (email, float(payload.get("exp", now + 60)))
+        while len(_token_cache) > settings.AUTH_TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+    return email
+
+def _cached_user(db: Session, email: str) -> Optional[models.User]:
+    with _cache_lock:
+        cached = _user_cache.get(email)
+    if cached is None or cached[0] <= time.monotonic():
+        return None
+    # Attach a copy to this request's session without loading it (relationships still lazy-load)
+    user = models.User(**cached[1])
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
+
+def _cache_user(user: models.User):
+    values = {attr.key: getattr(user, attr.key) for attr in inspect(models.User).column_attrs}
+    now = time.monotonic()
+    with _cache_lock:
+        _user_cache[user.email] = (now + settings.AUTH_USER_CACHE_TTL, values)
+        if len(_user_cache) > settings.AUTH_USER_CACHE_SIZE:
+            for email in [e for e, (until, _) in _user_cache.items() if until <= now]:
+                del _user_cache[email]
+            while len(_user_cache) > settings.AUTH_USER_CACHE_SIZE:
+                del _user_cache[next(iter(_user_cache))]
+
+def invalidate_user(email: str):
+    with _cache_lock:
+        _user_cache.pop(email, None)
+
+# Changed users are collected at flush and dropped from the cache only once the
+# transaction commits; dropping them at flush would let a concurrent request
+# re-cache the old row before the change is visible
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _collect_changed_user(mapper, connection, target):
+    session = object_session(target)
+    if session is None:
+        return
+    # The old email too when it changed
+    history = inspect(target).attrs.email.history
+    session.info.setdefault("auth_changed_emails", set()).update((target.email, *(history.deleted or ())))
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    for email in session.info.pop("auth_changed_emails", ()):
+        invalidate_user(email)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("auth_changed_emails", None)
+
+def get_current_user(creds: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)) -> models.User:
+    email = _decode_token(creds.credentials)
+    user = _cached_user(db, email)
+    if user is not None:
+        return user
     user = db.query(models.User).filter(models.User.email == email).first()
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
+    _cache_user(user)
     return user
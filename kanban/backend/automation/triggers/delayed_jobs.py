@@ -0,0 +1,355 @@
+import asyncio
+import heapq
+import importlib
+import inspect
+import logging
+import random
+import re
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional, Union
+
+from sqlalchemy import and_, or_, update
+
+from ...models import ScheduledJob
+from .event_bus import Handler, event_bus
+
+logger = logging.getLogger(__name__)
+
+_UNITS = {
+    "s": 1, "sec": 1, "secs": 1, "second": 1, "seconds": 1,
+    "m": 60, "min": 60, "mins": 60, "minute": 60, "minutes": 60,
+    "h": 3600, "hr": 3600, "hrs": 3600, "hour": 3600, "hours": 3600,
+    "d": 86400, "day": 86400, "days": 86400,
+    "w": 604800, "week": 604800, "weeks": 604800,
+}
+_DELAY_PART = re.compile(r"(\d+(?:\.\d+)?)\s*([a-z]+)")
+
+
+def parse_delay(delay: Union[str, int, float, timedelta]) -> timedelta:
+    """
+    "1 hour", "30 minutes", "24h", "1h30m", "2 days" (or seconds / a timedelta)
+    as a timedelta. Raises ValueError for anything else.
+    """
+    if isinstance(delay, timedelta):
+        return delay
+    if isinstance(delay, (int, float)):
+        return timedelta(seconds=delay)
+    text = delay.strip().lower().replace(",", " ").replace(" and ", " ")
+    parts = _DELAY_PART.findall(text)
+    if not parts or _DELAY_PART.sub("", text).strip():
+        raise ValueError(f"Unrecognised delay: {delay!r}")
+    seconds = 0.0
+    for amount, unit in parts:
+        if unit not in _UNITS:
+            raise ValueError(f"Unrecognised delay unit {unit!r} in {delay!r}")
+        seconds += float(amount) * _UNITS[unit]
+    return timedelta(seconds=seconds)
+
+
+def _handler_key(func: Callable) -> str:
+    return f"{func.__module__}:{func.__qualname__}"
+
+
+def _naive_utc(when: datetime) -> datetime:
+    return when.astimezone(timezone.utc).replace(tzinfo=None) if when.tzinfo else when
+
+
+def _ts(when: datetime) -> float:
+    return _naive_utc(when).replace(tzinfo=timezone.utc).timestamp()
+
+
+class DelayedJobScheduler:
+    """
+    Runs delayed `@listen_for` handlers from a `scheduled_jobs` table.
+
+    Each timer is one row, so pending jobs survive restarts and any number of
+    workers can share the table. A worker never scans it: it loads only the
+    jobs due within the next `horizon` seconds (an index range on
+    status/run_at) into an in-memory min-heap and sleeps until the earliest
+    one. Due jobs are claimed with a lease (SKIP LOCKED on Postgres, a
+    conditional UPDATE elsewhere), so each runs on one worker at a time; a
+    worker that dies mid-job lets its lease expire and the job is retried,
+    i.e. delivery is at-least-once. Finished jobs are deleted.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        horizon: float = 60.0,
+        refill_interval: float = 15.0,
+        heap_limit: int = 10000,
+        batch_size: int = 100,
+        concurrency: int = 8,
+        lease_seconds: float = 300.0,
+        max_attempts: int = 5,
+        backoff_base: float = 30.0,
+        backoff_max: float = 3600.0,
+    ):
+        self.session_factory = session_factory
+        self.horizon = horizon
+        self.refill_interval = refill_interval
+        self.heap_limit = heap_limit
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stats = {"scheduled": 0, "completed": 0, "retried": 0, "failed": 0, "lost_claims": 0}
+        self._heap: list[tuple[float, int]] = []
+        self._queued: set[int] = set()
+        self._horizon_end = 0.0  # every pending job due before this is in the heap
+        self._lock = threading.Lock()
+        self._handlers: dict[str, Callable] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    # ----------------------------------------------------------------------
+    # 1. Scheduling
+    # ----------------------------------------------------------------------
+    def schedule(self, event: str, func: Callable, delay, data: dict, db=None) -> int:
+        """Stores a call to `func(**data)` after `delay`; in `db`'s transaction if given."""
+        run_at = datetime.utcnow() + parse_delay(delay)
+        job = ScheduledJob(event=event, handler=_handler_key(func), payload=data, run_at=run_at, status="pending")
+        self._handlers.setdefault(job.handler, func)
+        own_db = db is None
+        db = self.session_factory() if own_db else db
+        try:
+            db.add(job)
+            db.flush()
+            job_id = job.id
+            if own_db:
+                db.commit()
+        finally:
+            if own_db:
+                db.close()
+        self.stats["scheduled"] += 1
+        self._offer(job_id, _ts(run_at))
+        return job_id
+
+    def schedule_handler(self, handler: Handler, data: dict):
+        """Event bus hook for handlers registered with a delay."""
+        self.schedule(handler.event, handler.func, handler.delay, data)
+
+    def _offer(self, job_id: int, due: float):
+        # Only jobs inside the loaded horizon go into the heap; later ones are picked up by a refill
+        with self._lock:
+            if due >= self._horizon_end or job_id in self._queued:
+                return
+            heapq.heappush(self._heap, (due, job_id))
+            self._queued.add(job_id)
+        if self._loop and self._wakeup and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    # ----------------------------------------------------------------------
+    # 2. Lifecycle
+    # ----------------------------------------------------------------------
+    async def start(self):
+        bind = self.session_factory.kw.get("bind")
+        if bind is not None:
+            await asyncio.to_thread(ScheduledJob.__table__.create, bind=bind, checkfirst=True)
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        self._loop = None
+
+    async def _run(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        running: set[asyncio.Task] = set()
+        next_refill = 0.0
+        while True:
+            now = self._loop.time()
+            try:
+                if now >= next_refill:
+                    await asyncio.to_thread(self._refill)
+                    next_refill = now + self.refill_interval
+                due = self._pop_due()
+                if due:
+                    jobs = await asyncio.to_thread(self._claim, due)
+                    for job in jobs:
+                        task = asyncio.create_task(self._execute(job, semaphore))
+                        running.add(task)
+                        task.add_done_callback(running.discard)
+                    continue
+            except Exception as e:
+                logger.error(f"Delayed job loop failed: {e}")
+            # Sleep until the earliest job, the next refill, or a newly scheduled job
+            wait = next_refill - self._loop.time()
+            with self._lock:
+                if self._heap:
+                    wait = min(wait, self._heap[0][0] - datetime.now(timezone.utc).timestamp())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, wait))
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    # ----------------------------------------------------------------------
+    # 3. Claiming and running
+    # ----------------------------------------------------------------------
+    def _refill(self):
+        """Loads jobs due within the horizon (and expired leases) into the heap."""
+        now = datetime.utcnow()
+        horizon_end = now + timedelta(seconds=self.horizon)
+        db = self.session_factory()
+        try:
+            rows = db.query(ScheduledJob.id, ScheduledJob.status, ScheduledJob.run_at, ScheduledJob.locked_until).filter(
+                or_(
+                    and_(ScheduledJob.status == "pending", ScheduledJob.run_at < horizon_end),
+                    and_(ScheduledJob.status == "running", ScheduledJob.locked_until < horizon_end),
+                )
+            ).order_by(ScheduledJob.run_at).limit(self.heap_limit).all()
+        finally:
+            db.close()
+        end = _ts(horizon_end)
+        if len(rows) >= self.heap_limit:
+            end = _ts(rows[-1].run_at)  # the rest of the window waits for the next refill
+        loaded = {}
+        for job_id, status, run_at, locked_until in rows:
+            due = _ts(locked_until if status == "running" else run_at)
+            if due < end:
+                loaded[job_id] = due
+        with self._lock:
+            # Keep jobs offered while the query ran; they may not be in `rows`
+            for due, job_id in self._heap:
+                if due < end:
+                    loaded.setdefault(job_id, due)
+            self._heap = [(due, job_id) for job_id, due in loaded.items()]
+            heapq.heapify(self._heap)
+            self._queued = set(loaded)
+            self._horizon_end = end
+
+    def _pop_due(self) -> list[int]:
+        now = datetime.now(timezone.utc).timestamp()
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+                _, job_id = heapq.heappop(self._heap)
+                self._queued.discard(job_id)
+                due.append(job_id)
+        return due
+
+    def _claim(self, job_ids: list[int]) -> list[tuple]:
+        """Leases the given jobs if they are still due and unclaimed; returns the ones this worker won."""
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        claimable = or_(
+            and_(ScheduledJob.status == "pending", ScheduledJob.run_at <= now),
+            and_(ScheduledJob.status == "running", ScheduledJob.locked_until <= now),
+        )
+        db = self.session_factory()
+        try:
+            # Postgres skips rows another worker holds; SQLite serialises writers and the
+            # conditional UPDATE below is what keeps two workers from claiming the same job
+            ids = [row.id for row in db.query(ScheduledJob.id).filter(
+                ScheduledJob.id.in_(job_ids), claimable
+            ).with_for_update(skip_locked=True)]
+            if ids:
+                db.execute(
+                    update(ScheduledJob)
+                    .where(ScheduledJob.id.in_(ids), claimable)
+                    .values(status="running", lease_token=token, locked_until=now + timedelta(seconds=self.lease_seconds))
+                )
+            db.commit()
+            # id first so the lookup goes through the primary key instead of scanning for the token
+            claimed = db.query(ScheduledJob).filter(
+                ScheduledJob.id.in_(ids), ScheduledJob.lease_token == token
+            ).all() if ids else []
+            self.stats["lost_claims"] += len(job_ids) - len(claimed)
+            return [(job.id, job.event, job.handler, job.payload, job.attempts, token) for job in claimed]
+        finally:
+            db.close()
+
+    def _resolve(self, event: str, key: str) -> Callable:
+        func = self._handlers.get(key)
+        if func is not None:
+            return func
+        for handler in event_bus.handlers.get(event, []):
+            if _handler_key(handler.func) == key:
+                func = handler.func
+                break
+        else:
+            module, _, qualname = key.partition(":")
+            func = importlib.import_module(module)
+            for name in qualname.split("."):
+                func = getattr(func, name)
+            func = getattr(func, "_original_func", func)
+        self._handlers[key] = func
+        return func
+
+    async def _execute(self, job: tuple, semaphore: asyncio.Semaphore):
+        job_id, event, key, payload, attempts, token = job
+        async with semaphore:
+            try:
+                func = self._resolve(event, key)
+                handler = event_bus.handler_for(event, func)
+                if handler.is_async:
+                    await func(**handler.call_args(payload))
+                else:
+                    await asyncio.to_thread(func, **handler.call_args(payload))
+                error = None
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+        await asyncio.to_thread(self._finish, job_id, attempts, token, error)
+
+    def _finish(self, job_id: int, attempts: int, token: str, error: Optional[str]):
+        db = self.session_factory()
+        try:
+            job = db.query(ScheduledJob).filter(ScheduledJob.id == job_id, ScheduledJob.lease_token == token).first()
+            if job is None:
+                return  # lease expired and another worker took it over
+            if error is None:
+                db.delete(job)
+                self.stats["completed"] += 1
+            elif attempts + 1 >= self.max_attempts:
+                job.status, job.attempts, job.last_error = "failed", attempts + 1, error
+                self.stats["failed"] += 1
+                logger.error(f"Giving up on delayed job {job_id} ({job.event}) after {attempts + 1} attempts: {error}")
+            else:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempts) * random.uniform(0.8, 1.2)
+                job.status, job.attempts, job.last_error = "pending", attempts + 1, error
+                job.run_at, job.lease_token, job.locked_until = datetime.utcnow() + timedelta(seconds=delay), None, None
+                self.stats["retried"] += 1
+                logger.warning(f"Delayed job {job_id} ({job.event}) failed, retrying in {delay:.0f}s: {error}")
+            db.commit()
+            if error is not None and job.status == "pending":
+                self._offer(job_id, _ts(job.run_at))
+        finally:
+            db.close()
+
+    def run_due(self, limit: int = 1000) -> int:
+        """Runs due jobs once, synchronously (cron / `run_scheduled_jobs`). Returns how many ran."""
+        now = datetime.utcnow()
+        db = self.session_factory()
+        try:
+            ids = [row.id for row in db.query(ScheduledJob.id).filter(or_(
+                and_(ScheduledJob.status == "pending", ScheduledJob.run_at <= now),
+                and_(ScheduledJob.status == "running", ScheduledJob.locked_until <= now),
+            )).order_by(ScheduledJob.run_at).limit(limit)]
+        finally:
+            db.close()
+        jobs = self._claim(ids) if ids else []
+        for job_id, event, key, payload, attempts, token in jobs:
+            try:
+                func = self._resolve(event, key)
+                result = func(**event_bus.handler_for(event, func).call_args(payload))
+                if inspect.isawaitable(result):
+                    asyncio.run(result)
+                error = None
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            self._finish(job_id, attempts, token, error)
+        return len(jobs)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            heap_size = len(self._heap)
+        return {**self.stats, "in_memory": heap_size}
@@ -0,0 +1,226 @@
+import asyncio
+import importlib
+import inspect
+import logging
+import os
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from sqlalchemy import event as sa_event
+
+logger = logging.getLogger(__name__)
+
+# Modules (relative to the backend package) whose @listen_for handlers are loaded on startup
+HANDLER_MODULES = [
+    m.strip()
+    for m in os.getenv("EVENT_HANDLER_MODULES", "services.cart_abandonment,automation.workflows.churn_prediction").split(",")
+    if m.strip()
+]
+
+
+@dataclass
+class Handler:
+    event: str
+    func: Callable
+    delay: Optional[str] = None
+    is_async: bool = False
+    accepts_any: bool = False
+    params: frozenset = frozenset()
+
+    def call_args(self, data: dict) -> dict:
+        # Handlers take the event data as keyword arguments; keys they don't declare are dropped
+        return data if self.accepts_any else {k: v for k, v in data.items() if k in self.params}
+
+
+def _make_handler(event: str, func: Callable, delay: Optional[str] = None) -> Handler:
+    signature = inspect.signature(func)
+    return Handler(
+        event=event,
+        func=func,
+        delay=delay,
+        is_async=inspect.iscoroutinefunction(func),
+        accepts_any=any(p.kind is p.VAR_KEYWORD for p in signature.parameters.values()),
+        params=frozenset(signature.parameters),
+    )
+
+
+class EventBus:
+    """
+    In-process dispatch of automation events to `@listen_for` handlers.
+
+    `publish` is non-blocking and thread-safe: events go onto an asyncio queue
+    drained by a small pool of worker tasks. Async handlers run on the loop,
+    sync ones in the default thread pool, and each event name has its own
+    concurrency limit so one busy event can't starve the others. Events
+    published before `start()` are buffered.
+    """
+
+    def __init__(self, workers: int = 8, default_concurrency: int = 4):
+        self.workers = workers
+        self.default_concurrency = default_concurrency
+        self.handlers: dict[str, list[Handler]] = defaultdict(list)
+        self.limits: dict[str, int] = {}
+        self.stats = defaultdict(lambda: {"events": 0, "handled": 0, "errors": 0, "latency_us": deque(maxlen=500)})
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._buffer: deque[tuple[str, dict]] = deque()
+        self._queue: asyncio.Queue | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._tasks: list[asyncio.Task] = []
+        self.load_errors: dict[str, str] = {}  # handler module -> import error (see discover)
+        self.scheduler = None  # delayed handlers go through this when set (see schedule_delayed)
+
+    # ----------------------------------------------------------------------
+    # 1. Registration
+    # ----------------------------------------------------------------------
+    def register(self, event: str, func: Callable, delay: Optional[str] = None, concurrency: Optional[int] = None):
+        if any(h.func is func for h in self.handlers[event]):
+            return
+        self.handlers[event].append(_make_handler(event, func, delay))
+        if concurrency:
+            self.limits[event] = concurrency
+
+    def handler_for(self, event: str, func: Callable) -> Handler:
+        """The registered handler for `func`, or an unregistered one wrapping it."""
+        for handler in self.handlers.get(event, []):
+            if handler.func is func:
+                return handler
+        return _make_handler(event, func)
+
+    def discover(self, modules: list[str] = HANDLER_MODULES):
+        """Imports the handler modules so their decorators register with the bus."""
+        root = __package__.rsplit(".", 2)[0]
+        for module in modules:
+            try:
+                importlib.import_module(f"{root}.{module}")
+                self.load_errors.pop(module, None)
+            except Exception as e:
+                self.load_errors[module] = f"{type(e).__name__}: {e}"
+                logger.error(f"Could not load event handlers from {module}: {e}")
+        if self.load_errors:
+            # A configured handler module that doesn't import means events silently go unhandled
+            raise RuntimeError(f"Event handler modules failed to load: {self.load_errors}")
+
+    # ----------------------------------------------------------------------
+    # 2. Publishing
+    # ----------------------------------------------------------------------
+    def publish(self, event: str, data: dict):
+        """Queues an event for local handlers; returns immediately, from any thread."""
+        if not self.handlers.get(event):
+            return
+        if self._loop is None:
+            self._buffer.append((event, data))
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._queue.put_nowait((event, data))
+        else:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, (event, data))
+
+    def publish_after_commit(self, db, event: str, data: dict):
+        """Publishes once `db` commits; dropped if it rolls back."""
+        if not db.in_transaction():
+            db.begin()  # so a rollback before any SQL still discards the event
+        pending = db.info.get("event_bus_pending")
+        if pending is None:
+            pending = db.info["event_bus_pending"] = []
+
+            def flush(session):
+                events, session.info["event_bus_pending"] = session.info.get("event_bus_pending", []), []
+                for name, payload in events:
+                    self.publish(name, payload)
+
+            def discard(session):
+                session.info["event_bus_pending"] = []
+
+            sa_event.listen(db, "after_commit", flush)
+            sa_event.listen(db, "after_rollback", discard)
+        pending.append((event, data))
+
+    # ----------------------------------------------------------------------
+    # 3. Workers
+    # ----------------------------------------------------------------------
+    async def start(self):
+        self.discover()
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        while self._buffer:
+            self._queue.put_nowait(self._buffer.popleft())
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        count = sum(len(h) for h in self.handlers.values())
+        logger.info(f"Event bus started with {count} handlers for {len(self.handlers)} events")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._loop = None
+
+    async def _worker(self):
+        while True:
+            event, data = await self._queue.get()
+            try:
+                await self._dispatch(event, data)
+            finally:
+                self._queue.task_done()
+
+    async def _dispatch(self, event: str, data: dict):
+        stats = self.stats[event]
+        stats["events"] += 1
+        semaphore = self._semaphores.get(event)
+        if semaphore is None:
+            semaphore = self._semaphores[event] = asyncio.Semaphore(self.limits.get(event, self.default_concurrency))
+        for handler in list(self.handlers.get(event, [])):
+            started = time.perf_counter()
+            try:
+                async with semaphore:
+                    if handler.delay:
+                        await self.schedule_delayed(handler, data)
+                    elif handler.is_async:
+                        await handler.func(**handler.call_args(data))
+                    else:
+                        await asyncio.to_thread(handler.func, **handler.call_args(data))
+                stats["handled"] += 1
+            except Exception as e:
+                stats["errors"] += 1
+                logger.error(f"Handler {handler.func.__name__} for '{event}' failed: {e}")
+            stats["latency_us"].append((time.perf_counter() - started) * 1e6)
+
+    async def schedule_delayed(self, handler: Handler, data: dict):
+        """Delayed handlers: hand the event to the configured scheduler (n8n's schedule_event if none)."""
+        if self.scheduler is not None:
+            await asyncio.to_thread(self.scheduler, handler, data)
+        else:
+            from .event_triggers import schedule_event
+            await asyncio.to_thread(schedule_event, handler.event, handler.delay, **data)
+
+    async def drain(self):
+        """Waits until every queued event has been handled (tests, shutdown)."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    def snapshot(self) -> dict:
+        events = {}
+        for event, stats in list(self.stats.items()):
+            latencies = sorted(stats["latency_us"])
+            events[event] = {
+                "events": stats["events"],
+                "handled": stats["handled"],
+                "errors": stats["errors"],
+                "p50_us": round(latencies[len(latencies) // 2], 1) if latencies else None,
+            }
+        return {
+            "handlers": {event: [h.func.__name__ for h in handlers] for event, handlers in self.handlers.items() if handlers},
+            "load_errors": dict(self.load_errors),
+            "events": events,
+        }
+
+
+event_bus = EventBus(
+    workers=int(os.getenv("EVENT_BUS_WORKERS", "8")),
+    default_concurrency=int(os.getenv("EVENT_BUS_CONCURRENCY", "4")),
+)
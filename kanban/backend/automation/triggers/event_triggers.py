@@ -1,8 +1,12 @@
 import logging
-import requests
 import os
 from functools import wraps
-from typing import Callable, Any
+from typing import Callable, Any, Optional
+
+from ...db import SessionLocal
+from .delayed_jobs import DelayedJobScheduler, parse_delay
+from .event_bus import event_bus
+from .outbox import OutboxDispatcher
 
 logger = logging.getLogger(__name__)
 
@@ -11,46 +15,52 @@ logger = logging.getLogger(__name__)
 # Example: export N8N_WEBHOOK_BASE_URL="https://your-n8n-instance.com/webhook/"
 # For local development with n8n, it might be something like "http://localhost:5678/webhook-test/"
 N8N_WEBHOOK_BASE_URL = os.getenv("N8N_WEBHOOK_BASE_URL", "http://localhost:5678/webhook-test/")
+# Set to "false" to keep events local (only @listen_for handlers, nothing sent to n8n)
+N8N_FORWARDING = os.getenv("N8N_FORWARDING", "true").lower() == "true"
 
-def send_webhook_to_n8n(event_name, payload):
-    """Sends an event payload as a webhook to n8n."""
-    # Ensure the base URL ends with a slash to correctly append the event_name
-    if not N8N_WEBHOOK_BASE_URL.endswith("/"):
-        base_url = N8N_WEBHOOK_BASE_URL + "/"
-    else:
-        base_url = N8N_WEBHOOK_BASE_URL
+# Events are written to the outbox table and delivered to n8n in the background
+outbox_dispatcher = OutboxDispatcher(SessionLocal, N8N_WEBHOOK_BASE_URL)
 
-    # The full webhook URL for a specific event
-    webhook_url = f"{base_url}{event_name}"
+# Delayed @listen_for handlers run from the scheduled_jobs table instead of an n8n Wait node
+delayed_jobs = DelayedJobScheduler(SessionLocal)
+event_bus.scheduler = delayed_jobs.schedule_handler
 
+def _enqueue(endpoint: str, payload: dict, db=None):
+    """Stores the webhook in the outbox: in the caller's transaction if `db` is given, else in its own."""
+    if db is not None:
+        outbox_dispatcher.enqueue(db, endpoint, payload)
+        return
+    own_db = SessionLocal()
     try:
-        response = requests.post(webhook_url, json=payload, timeout=5)
-        response.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
-        logger.info(f"Successfully sent \'{event_name}\' webhook to n8n. Status: {response.status_code}")
-        return True
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to send \'{event_name}\' webhook to n8n: {e}")
-        return False
+        outbox_dispatcher.enqueue(own_db, endpoint, payload)
+        own_db.commit()
+    finally:
+        own_db.close()
 
-def trigger_event(event_name, **kwargs):
-    """Trigger automation workflows based on events"""
-    payload = {"event_name": event_name, "data": kwargs}
+def trigger_event(event_name, data: Optional[dict] = None, db=None, **kwargs):
+    """
+    Trigger automation workflows based on events.
 
-    # All events will now be sent to n8n for processing
-    if send_webhook_to_n8n(event_name, payload):
-        logger.info(f"Event \'{event_name}\' triggered and sent to n8n.")
+    Never touches the network: local `@listen_for` handlers get the event
+    through the in-process event bus, and (unless N8N_FORWARDING is off) it is
+    also queued in the outbox for n8n. Pass the caller's `db` session to tie
+    both to the transaction of the change it describes.
+    """
+    data = {**(data or {}), **kwargs}
+    if db is not None:
+        event_bus.publish_after_commit(db, event_name, data)
     else:
-        logger.error(f"Failed to trigger event \'{event_name}\' via n8n webhook.")
+        event_bus.publish(event_name, data)
+    if N8N_FORWARDING:
+        _enqueue(event_name, {"event_name": event_name, "data": data}, db)
+    logger.info(f"Event \'{event_name}\' triggered.")
 
-def schedule_event(event_name, delay, **kwargs):
+def schedule_event(event_name, delay, db=None, **kwargs):
     """Schedule a delayed event trigger using n8n."""
-    # This function will now also send a webhook to n8n, which will then handle the delay.
-    # The n8n workflow would start with a webhook, then a 'Wait' node, and then trigger the actual event.
+    # The n8n workflow starts with a webhook, then a 'Wait' node, and then triggers the actual event.
     payload = {"event_name": event_name, "delay": delay, "data": kwargs}
-    if send_webhook_to_n8n("schedule_event", payload): # Use a generic 'schedule_event' endpoint in n8n
-        logger.info(f"Event \'{event_name}\' scheduled with {delay} delay via n8n.")
-    else:
-        logger.error(f"Failed to schedule event \'{event_name}\' via n8n webhook.")
+    _enqueue("schedule_event", payload, db)  # Use a generic 'schedule_event' endpoint in n8n
+    logger.info(f"Event \'{event_name}\' queued for scheduling with {delay} delay via n8n.")
 
 # Decorator for event listeners
 def listen_for(event: str, delay: str = None):
@@ -61,14 +71,17 @@ def listen_for(event: str, delay: str = None):
         event: The event name to listen for
         delay: Optional delay (e.g., "1 hour", "30 minutes")
     """
+    if delay:
+        parse_delay(delay)  # fail at import time on a delay the scheduler can't read
+
     def decorator(func: Callable) -> Callable:
         @wraps(func)
         def wrapper(*args, **kwargs):
             logger.info(f"Event listener '{event}' triggered for function {func.__name__}")
             if delay:
                 logger.info(f"Event '{event}' will be processed after {delay}")
-                # Schedule the event with delay
-                schedule_event(event, delay, **kwargs)
+                # Schedule the handler locally with delay
+                delayed_jobs.schedule(event, func, delay, kwargs)
             else:
                 # Execute immediately
                 return func(*args, **kwargs)
@@ -77,6 +90,9 @@ def listen_for(event: str, delay: str = None):
         wrapper._event_name = event
         wrapper._delay = delay
         wrapper._original_func = func
+
+        # Register with the in-process bus so trigger_event reaches it without n8n
+        event_bus.register(event, func, delay=delay)
         
         return wrapper
     return decorator
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import random
+import statistics
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import delete, event, select, update
+
+from ...models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxDispatcher:
+    """
+    Delivers outbox rows to n8n webhooks from a background task.
+
+    Producers only insert an `OutboxEvent` row in their own transaction, so a
+    slow or unreachable n8n never delays a write and no event is lost. The
+    dispatcher claims due rows in batches (leasing them with a conditional
+    UPDATE so several workers don't double-send), posts them concurrently over
+    one pooled HTTP client, and retries failures with exponential backoff until
+    `max_attempts`. Delivered rows are deleted after `retention` seconds;
+    failed ones are kept for inspection.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        base_url: str,
+        batch_size: int = 50,
+        concurrency: int = 8,
+        poll_interval: float = 2.0,
+        max_attempts: int = 10,
+        backoff_base: float = 2.0,
+        backoff_max: float = 600.0,
+        lease_seconds: float = 60.0,
+        timeout: float = 5.0,
+        retention: float = 7 * 86400,
+        prune_interval: float = 3600.0,
+        prune_batch: int = 1000,
+    ):
+        self.session_factory = session_factory
+        self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease_seconds = lease_seconds
+        self.timeout = timeout
+        self.retention = retention
+        self.prune_interval = prune_interval
+        self.prune_batch = prune_batch
+        self.stats = {"delivered": 0, "retried": 0, "failed": 0, "lost_claims": 0, "pruned": 0}
+        self._latencies: deque[float] = deque(maxlen=1000)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._http: httpx.AsyncClient | None = None
+
+    # ----------------------------------------------------------------------
+    # 1. Producer side
+    # ----------------------------------------------------------------------
+    def enqueue(self, db, endpoint: str, payload: dict):
+        """Adds an event to `db`'s transaction; delivery starts once the caller commits."""
+        db.add(OutboxEvent(endpoint=endpoint, payload=payload, status="pending", next_attempt_at=datetime.utcnow()))
+        if not db.info.get("outbox_notify"):
+            db.info["outbox_notify"] = True
+            event.listen(db, "after_commit", lambda session: self.notify())
+
+    def notify(self):
+        """Wakes the dispatcher early; safe to call from any thread."""
+        if self._loop and self._wakeup and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    # ----------------------------------------------------------------------
+    # 2. Lifecycle
+    # ----------------------------------------------------------------------
+    async def start(self):
+        bind = self.session_factory.kw.get("bind")
+        if bind is not None:
+            await asyncio.to_thread(OutboxEvent.__table__.create, bind=bind, checkfirst=True)
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+            timeout=httpx.Timeout(self.timeout),
+        )
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._http:
+            await self._http.aclose()
+            self._http = None
+
+    async def _run(self):
+        next_prune = 0.0
+        while True:
+            try:
+                if time.monotonic() >= next_prune:
+                    next_prune = time.monotonic() + self.prune_interval
+                    await asyncio.to_thread(self.prune)
+                delivered = await self.dispatch_once()
+            except Exception as e:
+                logger.error(f"Outbox dispatch failed: {e}")
+                delivered = 0
+            if delivered < self.batch_size:
+                # Caught up: sleep until the next commit or poll
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    # ----------------------------------------------------------------------
+    # 3. Delivery
+    # ----------------------------------------------------------------------
+    async def dispatch_once(self) -> int:
+        """Claims one batch of due events and delivers it. Returns the batch size."""
+        batch = await asyncio.to_thread(self._claim)
+        if not batch:
+            return 0
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def deliver(row):
+            async with semaphore:
+                return await self._deliver(*row)
+
+        results = await asyncio.gather(*(deliver(row) for row in batch))
+        await asyncio.to_thread(self._finish, results)
+        return len(batch)
+
+    def _claim(self) -> list[tuple]:
+        """Leases up to `batch_size` due events; returns the ones this worker won."""
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        claimable = (OutboxEvent.status == "pending", OutboxEvent.next_attempt_at <= now)
+        db = self.session_factory()
+        try:
+            # Postgres skips rows another worker holds; SQLite serialises writers and the
+            # conditional UPDATE below is what keeps two workers from claiming the same event
+            ids = [row.id for row in db.query(OutboxEvent.id).filter(*claimable).order_by(
+                OutboxEvent.next_attempt_at
+            ).limit(self.batch_size).with_for_update(skip_locked=True)]
+            if ids:
+                db.execute(
+                    update(OutboxEvent)
+                    .where(OutboxEvent.id.in_(ids), *claimable)
+                    .values(next_attempt_at=now + timedelta(seconds=self.lease_seconds), lease_token=token)
+                )
+            db.commit()
+            claimed = db.query(OutboxEvent).filter(
+                OutboxEvent.id.in_(ids), OutboxEvent.lease_token == token
+            ).all() if ids else []
+            self.stats["lost_claims"] += len(ids) - len(claimed)
+            return [(row.id, row.endpoint, row.payload, row.attempts) for row in claimed]
+        finally:
+            db.close()
+
+    async def _deliver(self, event_id: int, endpoint: str, payload: dict, attempts: int) -> tuple:
+        started = time.perf_counter()
+        try:
+            response = await self._http.post(f"{self.base_url}{endpoint}", json=payload)
+            response.raise_for_status()
+            return event_id, attempts, None, (time.perf_counter() - started) * 1000
+        except Exception as e:
+            # Anything (bad URL, unserialisable payload, ...) is a failed attempt, not a lost batch
+            return event_id, attempts, f"{type(e).__name__}: {e}", None
+
+    def _finish(self, results: list[tuple]):
+        now = datetime.utcnow()
+        db = self.session_factory()
+        try:
+            rows = {r.id: r for r in db.query(OutboxEvent).filter(OutboxEvent.id.in_([res[0] for res in results]))}
+            for event_id, attempts, error, latency_ms in results:
+                row = rows.get(event_id)
+                if row is None:
+                    continue
+                row.attempts = attempts + 1
+                if error is None:
+                    row.status, row.delivered_at, row.latency_ms = "delivered", now, int(latency_ms)
+                    self._latencies.append(latency_ms)
+                    self.stats["delivered"] += 1
+                elif row.attempts >= self.max_attempts:
+                    row.status, row.last_error = "failed", error
+                    self.stats["failed"] += 1
+                    logger.error(f"Giving up on outbox event {event_id} ({row.endpoint}) after {row.attempts} attempts: {error}")
+                else:
+                    delay = min(self.backoff_max, self.backoff_base ** row.attempts) * random.uniform(0.8, 1.2)
+                    row.next_attempt_at, row.last_error = now + timedelta(seconds=delay), error
+                    self.stats["retried"] += 1
+                    logger.warning(f"Outbox event {event_id} ({row.endpoint}) failed, retrying in {delay:.0f}s: {error}")
+            db.commit()
+        finally:
+            db.close()
+
+    def prune(self) -> int:
+        """Deletes events delivered more than `retention` seconds ago, `prune_batch` rows per statement."""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.retention)
+        total = 0
+        db = self.session_factory()
+        try:
+            while True:
+                ids = select(OutboxEvent.id).where(
+                    OutboxEvent.status == "delivered", OutboxEvent.delivered_at < cutoff
+                ).limit(self.prune_batch)
+                deleted = db.execute(
+                    delete(OutboxEvent).where(OutboxEvent.id.in_(ids)).execution_options(synchronize_session=False)
+                ).rowcount
+                db.commit()
+                total += deleted
+                if deleted < self.prune_batch:
+                    break
+        finally:
+            db.close()
+        self.stats["pruned"] += total
+        return total
+
+    def snapshot(self) -> dict:
+        latencies = list(self._latencies)
+        p50 = statistics.median(latencies) if latencies else None
+        p95 = statistics.quantiles(latencies, n=20)[18] if len(latencies) > 1 else p50
+        return {
+            **self.stats,
+            "latency_ms": {"p50": round(p50, 1) if p50 is not None else None, "p95": round(p95, 1) if p95 is not None else None},
+        }
@@ -0,0 +1,147 @@
+# backend/automation/workflows/churn_engine.py
+
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import and_, case, func
+
+from ...db import get_db
+from ...models import User, Order
+from .churn_prediction import ChurnPredictionService
+
+logger = logging.getLogger(__name__)
+
+NO_ORDER_DAYS = 999  # recency used for users without orders in the last 90 days
+
+
+@dataclass
+class OrderAggregates:
+    """90-day order aggregates for every user, one array element per user"""
+    user_ids: np.ndarray
+    days_since_last_order: np.ndarray
+    orders_90d: np.ndarray
+    orders_60d: np.ndarray
+    orders_30d: np.ndarray
+    total_spent: np.ndarray
+    has_cancelled: np.ndarray
+
+    @property
+    def avg_order_value(self) -> np.ndarray:
+        return np.divide(self.total_spent, self.orders_90d, out=np.zeros_like(self.total_spent), where=self.orders_90d > 0)
+
+    @property
+    def frequency_declining(self) -> np.ndarray:
+        # Fewer orders in the last 30 days than in the 30 days before
+        return self.orders_30d < self.orders_60d - self.orders_30d
+
+    def metrics(self, i: int) -> Dict[str, Any]:
+        """Metrics for one user, in the shape `ChurnPredictionService._get_user_metrics` returns"""
+        return {
+            "total_orders": int(self.orders_90d[i]),
+            "orders_last_30d": int(self.orders_30d[i]),
+            "orders_last_60d": int(self.orders_60d[i]),
+            "avg_order_value": float(self.avg_order_value[i]),
+            "days_since_last_order": int(self.days_since_last_order[i]),
+            "total_spent": float(self.total_spent[i]),
+            "order_frequency_declining": bool(self.frequency_declining[i]),
+            "has_cancelled_orders": bool(self.has_cancelled[i]),
+        }
+
+
+def load_order_aggregates(db, now: Optional[datetime] = None) -> OrderAggregates:
+    """Aggregates the last 90 days of orders for all users in one grouped query"""
+    now = now or datetime.utcnow()
+    since_30d, since_60d, since_90d = (now - timedelta(days=d) for d in (30, 60, 90))
+
+    rows = db.query(
+        User.id,
+        func.max(Order.created_at),
+        func.count(Order.id),
+        func.sum(case((Order.created_at >= since_60d, 1), else_=0)),
+        func.sum(case((Order.created_at >= since_30d, 1), else_=0)),
+        func.coalesce(func.sum(Order.total_cents), 0),
+        func.max(case((Order.status == "cancelled", 1), else_=0)),
+    ).outerjoin(
+        Order, and_(Order.user_id == User.id, Order.created_at >= since_90d)
+    ).group_by(User.id).order_by(User.id).all()
+
+    n = len(rows)
+    columns = list(zip(*rows)) if rows else [()] * 7
+    now_ts = _epoch(now)
+    last_ts = np.fromiter((_epoch(t) if t else np.nan for t in columns[1]), dtype=np.float64, count=n)
+    days = np.where(np.isnan(last_ts), NO_ORDER_DAYS, np.floor((now_ts - last_ts) / 86400.0))
+
+    return OrderAggregates(
+        user_ids=np.fromiter(columns[0], dtype=np.int64, count=n),
+        days_since_last_order=days.astype(np.int64),
+        orders_90d=np.fromiter(columns[2], dtype=np.int64, count=n),
+        orders_60d=np.fromiter((v or 0 for v in columns[3]), dtype=np.int64, count=n),
+        orders_30d=np.fromiter((v or 0 for v in columns[4]), dtype=np.int64, count=n),
+        total_spent=np.fromiter(columns[5], dtype=np.float64, count=n) / 100.0,
+        has_cancelled=np.fromiter((bool(v) for v in columns[6]), dtype=bool, count=n),
+    )
+
+
+def _epoch(dt: datetime) -> float:
+    # Naive timestamps are UTC (they're written with datetime.utcnow())
+    return (dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def rule_based_scores(agg: OrderAggregates) -> np.ndarray:
+    """`ChurnPredictionService._rule_based_risk` for every user at once"""
+    days = agg.days_since_last_order
+    risk = (
+        np.where(days > 60, 0.4, np.where(days > 30, 0.2, 0.0))
+        + np.where(agg.orders_30d == 0, 0.3, 0.0)
+        + np.where(agg.frequency_declining, 0.2, 0.0)
+        + np.where(agg.has_cancelled, 0.1, 0.0)
+    )
+    return np.minimum(risk, 1.0)
+
+
+def score_all_users(
+    db=None,
+    ambiguous_band: Tuple[float, float] = (0.3, 0.7),
+    use_ai: bool = True,
+) -> Dict[int, float]:
+    """
+    Churn risk for the whole user base.
+
+    Rule-based scores are computed vectorized for everyone; only users whose
+    score falls in `ambiguous_band` (low inclusive, high exclusive) are sent
+    to the LLM, packed several per request.
+    """
+    started = time.perf_counter()
+    db = db or next(get_db())
+    agg = load_order_aggregates(db)
+    scores = rule_based_scores(agg)
+
+    low, high = ambiguous_band
+    ambiguous = np.flatnonzero((scores >= low) & (scores < high)) if use_ai else np.array([], dtype=np.int64)
+    if len(ambiguous):
+        ai_scores = ChurnPredictionService.batch_ai_risk({int(agg.user_ids[i]): agg.metrics(i) for i in ambiguous})
+        scores[ambiguous] = [ai_scores[int(agg.user_ids[i])] for i in ambiguous]
+
+    logger.info(
+        f"Churn pass over {len(scores)} users in {time.perf_counter() - started:.2f}s "
+        f"({len(ambiguous)} sent to AI)"
+    )
+    return dict(zip(agg.user_ids.tolist(), scores.tolist()))
+
+
+def run_retention_pass(db=None) -> Dict[str, int]:
+    """Scores every user and triggers the matching retention workflow for risky ones"""
+    scores = score_all_users(db)
+    counts = {"high": 0, "medium": 0}
+    for user_id, risk_score in scores.items():
+        if risk_score >= ChurnPredictionService.HIGH_RISK:
+            ChurnPredictionService._trigger_high_risk_retention(user_id, risk_score)
+            counts["high"] += 1
+        elif risk_score >= ChurnPredictionService.MEDIUM_RISK:
+            ChurnPredictionService._trigger_medium_risk_retention(user_id, risk_score)
+            counts["medium"] += 1
+    return counts
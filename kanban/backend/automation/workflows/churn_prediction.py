@@ -3,12 +3,11 @@
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, Any, List
-from app.db import get_db
-from app.models import User, Order
-from app.automation.triggers.event_triggers import trigger_event
-from app.services.ai_services import AIService
-from app.automation.integrations import ai_services
-from app.automation.workflows import churn_prediction
+from ...db import get_db
+from ...models import User, Order
+from ..triggers.event_triggers import trigger_event, listen_for
+from ...services.ai_services import AIService
+from ...services.churn_features import ChurnFeatureStore
 import json
 
 # backend/app/automation/workflows/churn_prediction.py
@@ -42,8 +41,8 @@ class ChurnPredictionService:
                 logger.warning(f"User {user_id} not found for churn prediction")
                 return 0.0
             
-            # Get user activity metrics
-            metrics = ChurnPredictionService._get_user_metrics(user_id)
+            # Get user activity metrics (precomputed features, O(1))
+            metrics = ChurnPredictionService._get_user_metrics(user_id, db)
             
             # Use AI to calculate churn risk
             risk_score = ChurnPredictionService._ai_calculate_risk(user, metrics)
@@ -56,9 +55,13 @@ class ChurnPredictionService:
             return 0.0
     
     @staticmethod
-    def _get_user_metrics(user_id: int) -> Dict[str, Any]:
-        """Collect user engagement metrics"""
-        db = next(get_db())
+    def _get_user_metrics(user_id: int, db=None) -> Dict[str, Any]:
+        """Collect user engagement metrics from the feature store, scanning orders only for users without features yet"""
+        db = db or next(get_db())
+        
+        metrics = ChurnFeatureStore.get_metrics(db, user_id)
+        if metrics is not None:
+            return metrics
         
         now = datetime.utcnow()
         last_30_days = now - timedelta(days=30)
@@ -120,9 +123,7 @@ class ChurnPredictionService:
             
             try:
                 # Extract risk score from AI response
-                risk_score = float(ai_response.strip())
-                risk_score = max(0.0, min(1.0, risk_score))  # Clamp between 0-1
-                return risk_score
+                return ChurnPredictionService._parse_risk(ai_response)
             except ValueError:
                 # Fallback to rule-based if AI fails
                 return ChurnPredictionService._rule_based_risk(metrics)
@@ -131,6 +132,43 @@ class ChurnPredictionService:
             logger.error(f"AI churn prediction failed: {str(e)}, using rule-based")
             return ChurnPredictionService._rule_based_risk(metrics)
     
+    @staticmethod
+    def _parse_risk(value: Any) -> float:
+        """AI risk answer as a float clamped between 0-1; raises ValueError if it isn't a number"""
+        risk_score = float(value.strip() if isinstance(value, str) else value)
+        return max(0.0, min(1.0, risk_score))
+
+    @staticmethod
+    def batch_ai_risk(metrics_by_user: Dict[int, Dict[str, Any]]) -> Dict[int, float]:
+        """
+        AI churn risk for many users at once (nightly passes). Users are packed
+        several per LLM request instead of one round-trip each; users the AI
+        could not score fall back to the rule-based risk.
+        """
+        items = {
+            user_id: {
+                "days_since_last_order": m["days_since_last_order"],
+                "orders_90d": m["total_orders"],
+                "orders_30d": m["orders_last_30d"],
+                "avg_order_value": round(m["avg_order_value"], 2),
+                "total_spent": round(m["total_spent"], 2),
+                "frequency_declining": m["order_frequency_declining"],
+                "has_cancelled_orders": m["has_cancelled_orders"],
+            }
+            for user_id, m in metrics_by_user.items()
+        }
+        instruction = (
+            "For each customer, estimate the churn risk from recency, frequency, monetary value "
+            "and trend, as a number between 0.0 (no risk) and 1.0 (very high risk)."
+        )
+        result = AIService.batch_analysis(items, instruction, validate=ChurnPredictionService._parse_risk)
+        logger.info(f"Batch churn scoring: {len(result.results)} users via AI at {result.items_per_sec:.1f} users/sec")
+
+        return {
+            user_id: result.results.get(str(user_id), ChurnPredictionService._rule_based_risk(metrics))
+            for user_id, metrics in metrics_by_user.items()
+        }
+
     @staticmethod
     def _rule_based_risk(metrics: Dict[str, Any]) -> float:
         """Fallback rule-based churn risk calculation"""
@@ -217,20 +255,7 @@ def apply_discount(user_id: int, discount: str):
         logger.error(f"Error applying discount to user {user_id}: {str(e)}")
 
 
-# Event listener decorator (for future implementation)
-def listen_for(event: str, delay: str = None):
-    """
-    Decorator to mark functions as event listeners
-    This is a placeholder for future scheduler integration
-    """
-    def decorator(func):
-        func._event_listener = event
-        func._delay = delay
-        return func
-    return decorator
-
-
-# Example usage with decorator
+# Runs through the event bus; the 24h delay is handed to the scheduler
 @listen_for(event="low_engagement", delay="24h")
 def trigger_retention_offer(user_id: int):
     """
@@ -1,5 +1,5 @@
-from app.services.ai_services import AIService
-from app.services.product_service import update_price, get_product_details
+from ...services.ai_services import AIService
+from ...services.product_service import update_price, get_product_details
 
 # Placeholder for get_sales_trend. You would replace this with your actual implementation.
 def get_sales_trend():
@@ -1,9 +1,17 @@
 # backend/chat/chat_api.py || v4.7 – Fixed Course Detection
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from backend.services.ai_client import get_ai_client
-import os, json, re
-from PyPDF2 import PdfReader
+from backend.services.llm_scheduler import SchedulerFull
+from backend.chat.journal import ConversationJournal
+from backend.chat.pdf_cache import PdfTextCache
+from backend.chat.ingest import DocumentIngestor
+from backend.chat.retrieval import BM25Index
+from backend.chat.embeddings import HashingEmbedder, OllamaEmbedder, VectorIndex
+from backend.chat.context_builder import ContextBuilder
+from backend.chat.summarizer import HistorySummarizer, is_summary
+import os, json, re, atexit, asyncio
 
 router = APIRouter()
 
@@ -20,6 +28,24 @@ MEMORY_PATH = os.path.join(BASE_DIR, "memory.json")
 BLUEPRINT_DIR = os.path.join(BASE_DIR, "blueprints")
 PDF_DIR = os.path.join(BASE_DIR, "pdfs")
 COURSE_DIR = os.path.join(BASE_DIR, "courses")
+PDF_CACHE_DIR = os.path.join(BASE_DIR, ".pdf_cache")
+AI_DOCS_DIR = os.path.join(os.path.dirname(BASE_DIR), "ai", "docs")
+VECTOR_INDEX_DIR = os.path.join(BASE_DIR, ".vector_index")
+ARCHIVE_DIR = os.path.join(BASE_DIR, "archive")
+
+RETRIEVAL_TOP_K = 3
+SEMANTIC_MIN_SCORE = 0.3
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "ollama")  # "ollama" or "hashing" (offline stub)
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
+# Prompt budget defaults to the model context window; part of it is kept free for the reply
+PROMPT_TOKEN_BUDGET = int(os.getenv("CHAT_PROMPT_TOKENS", ai_client.num_ctx))
+REPLY_TOKEN_RESERVE = int(os.getenv("CHAT_REPLY_TOKENS", 768))
+# Past this many stored messages the oldest turns are folded into a running summary
+SUMMARY_THRESHOLD = int(os.getenv("CHAT_SUMMARY_THRESHOLD", 40))
+SUMMARY_FOLD_SIZE = int(os.getenv("CHAT_SUMMARY_FOLD", 20))
+# Keep the model loaded and the static system prompt's KV cache warm between chats
+PINNED_SESSION = os.getenv("CHAT_PINNED_SESSION", "true").lower() == "true"
+PDF_KEY_RE = re.compile(r"pdf-\d+")
 
 print(f"📂 BASE_DIR: {BASE_DIR}")
 print(f"📂 MEMORY_PATH: {MEMORY_PATH}")
@@ -33,29 +59,31 @@ os.makedirs(PDF_DIR, exist_ok=True)
 os.makedirs(COURSE_DIR, exist_ok=True)
 
 # --- Blueprint Loader ---
-def load_blueprint_files():
+def load_blueprint_files(verbose=True):
     files = {}
     if os.path.exists(BLUEPRINT_DIR):
-        for filename in os.listdir(BLUEPRINT_DIR):
+        for filename in sorted(os.listdir(BLUEPRINT_DIR)):
             if filename.endswith(".txt"):
                 key = filename.replace(".txt", "")
                 files[key] = os.path.join(BLUEPRINT_DIR, filename)
-    print(f"📘 Loaded {len(files)} blueprints: {', '.join(files.keys()) or 'none'}")
+    if verbose:
+        print(f"📘 Loaded {len(files)} blueprints: {', '.join(files.keys()) or 'none'}")
     return files
 
 # --- PDF Loader ---
-def load_pdf_files():
+def load_pdf_files(verbose=True):
     files = {}
     if os.path.exists(PDF_DIR):
         for i, filename in enumerate(sorted(os.listdir(PDF_DIR)), 1):
             if filename.lower().endswith(".pdf"):
                 key = f"pdf-{i:02d}"
                 files[key] = {"path": os.path.join(PDF_DIR, filename), "name": filename}
-    print(f"📄 Loaded {len(files)} PDFs: {', '.join(files.keys()) or 'none'}")
+    if verbose:
+        print(f"📄 Loaded {len(files)} PDFs: {', '.join(files.keys()) or 'none'}")
     return files
 
 # --- Course Loader (Recursive) ---
-def load_course_files():
+def load_course_files(verbose=True):
     files = {}
     if os.path.exists(COURSE_DIR):
         for root, _, filenames in os.walk(COURSE_DIR):
@@ -64,7 +92,8 @@ def load_course_files():
                     rel_path = os.path.relpath(os.path.join(root, filename), COURSE_DIR)
                     key = f"course-{rel_path.replace(os.sep, '-')}"
                     files[key] = os.path.join(root, filename)
-    print(f"🎓 Loaded {len(files)} course files: {', '.join(list(files.keys())[:6]) if files else 'none'}...")
+    if verbose:
+        print(f"🎓 Loaded {len(files)} course files: {', '.join(list(files.keys())[:6]) if files else 'none'}...")
     return files
 
 BLUEPRINT_FILES = load_blueprint_files()
@@ -88,17 +117,128 @@ except FileNotFoundError:
     kanbanotion_context = "You are Koby, a development assistant for Robyn."
     print("❌ Kanban context missing; using fallback.")
 
+# --- Background Ingestion ---
+# Per-page text survives restarts, so previews and "full" requests skip re-parsing
+pdf_cache = PdfTextCache(PDF_CACHE_DIR)
+
+def discover_documents():
+    """Current on-disk resources for the ingestor: key -> (kind, path, display name)"""
+    docs = {}
+    for key, path in load_blueprint_files(verbose=False).items():
+        docs[key] = ("blueprint", path, os.path.basename(path))
+    for key, info in load_pdf_files(verbose=False).items():
+        docs[key] = ("pdf", info["path"], info["name"])
+    for key, path in load_course_files(verbose=False).items():
+        docs[key] = ("course", path, os.path.basename(path))
+    if os.path.exists(AI_DOCS_DIR):
+        for filename in sorted(os.listdir(AI_DOCS_DIR)):
+            if filename.endswith(".md"):
+                docs[f"doc-{filename[:-3]}"] = ("doc", os.path.join(AI_DOCS_DIR, filename), filename)
+    return docs
+
+def _on_document_update(doc):
+    """Keep the resource lookups in sync with files added or removed at runtime"""
+    registry = {"blueprint": BLUEPRINT_FILES, "pdf": PDF_FILES, "course": COURSE_FILES}.get(doc.kind)
+    if registry is None:
+        return
+    if doc.status == "removed":
+        registry.pop(doc.key, None)
+    elif doc.kind == "pdf":
+        registry[doc.key] = {"path": doc.path, "name": doc.name}
+    else:
+        registry[doc.key] = doc.path
+
+# Chunked BM25 index over every ingested document, kept current as files change
+retrieval_index = BM25Index()
+
+def _index_document(doc):
+    if doc.status == "ready":
+        retrieval_index.update_document(doc.key, doc.name, doc.text)
+    else:
+        retrieval_index.remove_document(doc.key)
+
+# Semantic index: one float32 matrix, re-embedding only chunks whose text changed
+embedder = OllamaEmbedder(ai_client, EMBEDDING_MODEL) if EMBEDDING_BACKEND == "ollama" else HashingEmbedder()
+vector_index = VectorIndex(VECTOR_INDEX_DIR, embedder)
+_embedding_lock = asyncio.Lock()
+_background_tasks = set()
+
+def _embed_document(doc):
+    """Embedding calls the model server, so it runs in a thread instead of inside the ingest callback"""
+    async def update():
+        async with _embedding_lock:
+            try:
+                if doc.status == "ready":
+                    embedded = await asyncio.to_thread(vector_index.update_document, doc.key, doc.name, doc.text)
+                    if embedded:
+                        print(f"🧮 Embedded {embedded} new chunks from '{doc.name}'")
+                else:
+                    vector_index.remove_document(doc.key)
+            except Exception as e:
+                print(f"⚠️ Could not embed '{doc.name}': {e}")
+            # Save once per burst (e.g. the startup scan), after the last queued update
+            if len(_background_tasks) == 1:
+                try:
+                    await asyncio.to_thread(vector_index.save)
+                except Exception as e:
+                    print(f"⚠️ Could not save the vector index: {e}")
+    task = asyncio.get_running_loop().create_task(update())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+ingestor = DocumentIngestor(
+    discover_documents, [PDF_DIR, BLUEPRINT_DIR, COURSE_DIR, AI_DOCS_DIR], pdf_cache=pdf_cache
+)
+ingestor.subscribe(_on_document_update)
+ingestor.subscribe(_index_document)
+ingestor.subscribe(_embed_document)
+
 # --- Helpers ---
-def extract_pdf_text(key: str, full=False):
+def _ready_pages(key: str):
+    doc = ingestor.get(key)
+    return doc.pages if doc and doc.status == "ready" else None
+
+def pending_document_notice(user_message: str):
+    """A short reply for messages that need a document the ingestor is still parsing"""
+    for key in PDF_KEY_RE.findall(user_message.lower()):
+        doc = ingestor.get(key)
+        if doc and doc.status == "processing":
+            return f"📄 '{doc.name}' is still being processed. Please ask again in a moment."
+    return None
+
+async def retrieve_context(user_message: str, k: int = RETRIEVAL_TOP_K):
+    """Top-k chunks relevant to the message (BM25 + embeddings), formatted for the prompt"""
+    lexical = [(c.id, c.name, c.text) for c, _ in retrieval_index.search(user_message, k=k * 2)]
+    semantic = []
+    if len(vector_index):
+        try:
+            hits = (await asyncio.to_thread(vector_index.search, [user_message], k * 2))[0]
+            semantic = [(m["id"], m["name"], m["text"]) for m, score in hits if score >= SEMANTIC_MIN_SCORE]
+        except Exception as e:
+            print(f"⚠️ Semantic search unavailable: {e}")
+
+    # Reciprocal rank fusion of the lexical and semantic rankings
+    fused = {}
+    for ranking in (lexical, semantic):
+        for rank, (chunk_id, name, text) in enumerate(ranking):
+            entry = fused.setdefault(chunk_id, [name, text, 0.0])
+            entry[2] += 1.0 / (60 + rank)
+    if not fused:
+        return None
+    best = sorted(fused.values(), key=lambda entry: entry[2], reverse=True)[:k]
+    sections = [f"[{name}]\n{text}" for name, text, _ in best]
+    return "=== RELEVANT CONTEXT ===\n\n" + "\n\n---\n\n".join(sections)
+
+async def extract_pdf_text(key: str, full=False):
     pdf_info = PDF_FILES.get(key)
     if not pdf_info: 
         return None
     try:
-        reader = PdfReader(pdf_info["path"])
-        text = ""
-        pages = reader.pages if full else reader.pages[:5]
-        for page in pages:
-            text += page.extract_text() or ""
+        pages = _ready_pages(key)
+        if pages is None:
+            # Not ingested (yet, or it failed): parse in the ingestor's worker pool, not on the event loop
+            pages = await ingestor.read("pdf", pdf_info["path"])
+        text = "".join(pages if full else pages[:5])
         if len(text) > 3000:
             text = text[:3000] + "...\n\n[Use 'details {key}' for full content]"
         return f"📄 {pdf_info['name']}\n\n{text}"
@@ -109,8 +249,12 @@ def load_course_content(key: str):
     path = COURSE_FILES.get(key)
     if not path or not os.path.exists(path):
         return None
-    with open(path, "r", encoding="utf-8", errors="ignore") as f:
-        content = f.read()
+    pages = _ready_pages(key)
+    if pages is not None:
+        content = "\n".join(pages)
+    else:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            content = f.read()
     if len(content) > 3000:
         content = content[:3000] + "\n\n[... truncated for brevity]"
     return f"🎓 Course File: {os.path.basename(path)}\n\n{content}"
@@ -146,80 +290,171 @@ def find_course_match(user_message: str):
     return None
 
 # --- Memory Management ---
+# memory.json holds a periodic snapshot; each turn only appends to memory.jsonl
+journal = ConversationJournal(MEMORY_PATH)
+atexit.register(journal.close)
+
 def load_memory():
-    if os.path.exists(MEMORY_PATH):
-        try:
-            with open(MEMORY_PATH, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            print("⚠️ Memory corrupted, resetting.")
-    print("💾 Creating new memory file.")
-    return [{"role": "system", "content": kanbanotion_context}]
-
-def save_memory():
-    with open(MEMORY_PATH, "w", encoding="utf-8") as f:
-        json.dump(conversation_history, f, indent=2, ensure_ascii=False)
-
-def get_recent_messages(max_messages=10):
-    """Keep only system message + last N user/assistant pairs to prevent context overload"""
-    if not conversation_history:
-        return [{"role": "system", "content": kanbanotion_context}]
-    
-    # Always keep the system message
-    system_msg = conversation_history[0] if conversation_history[0]["role"] == "system" else {"role": "system", "content": kanbanotion_context}
-    
-    # Get recent messages (skip system message if it exists)
-    start_idx = 1 if conversation_history[0]["role"] == "system" else 0
-    recent = conversation_history[start_idx:][-(max_messages * 2):]  # *2 for user+assistant pairs
-    
-    return [system_msg] + recent
+    return journal.load([{"role": "system", "content": kanbanotion_context}])
+
+def save_memory(*new_messages):
+    """Journal the messages added this turn (compaction rewrites the snapshot periodically)"""
+    journal.append(*new_messages, history=conversation_history)
+
+context_builder = ContextBuilder(PROMPT_TOKEN_BUDGET, reserve_tokens=REPLY_TOKEN_RESERVE)
+
+# Every prompt starts with this exact message, so Ollama can reuse its cached prefill.
+# Anything that varies per request (summary, retrieved context) goes after it.
+STATIC_SYSTEM_MESSAGE = {"role": "system", "content": kanbanotion_context}
+
+def build_prompt(context=None):
+    """System prompt + retrieved context + as many recent turns as fit the token budget"""
+    has_system = bool(conversation_history) and conversation_history[0]["role"] == "system"
+    turns = conversation_history[1:] if has_system else conversation_history
+    summary = turns[0] if turns and is_summary(turns[0]) else None
+    return context_builder.build(STATIC_SYSTEM_MESSAGE, turns[1:] if summary else turns, context, summary)
 
 conversation_history = load_memory()
 
+summarizer = HistorySummarizer(
+    ai_client,
+    get_history=lambda: conversation_history,
+    on_rewrite=journal.rewrite,
+    archive_dir=ARCHIVE_DIR,
+    max_messages=SUMMARY_THRESHOLD,
+    fold_messages=SUMMARY_FOLD_SIZE,
+)
+
 # --- Chat Endpoints ---
 @router.post("/chat/reset")
 async def reset_chat():
     global conversation_history
     conversation_history = [{"role": "system", "content": kanbanotion_context}]
-    save_memory()
+    journal.rewrite(conversation_history)
     print("🔄 Memory reset.")
     return {"status": "ok", "message": "Chat memory reset."}
 
-@router.post("/chat")
-async def handle_chat(request: ChatRequest):
-    global conversation_history
-    user_message = request.message.strip()
+@router.get("/chat/stats")
+async def chat_stats():
+    """Response cache hit/miss counters, coalesced-call counts, LLM queue and backend metrics"""
+    cache = ai_client.cache
+    scheduler = ai_client.scheduler
+    return {
+        "cache": cache.snapshot() if cache else {"enabled": False},
+        "single_flight": ai_client.flight.snapshot(),
+        "scheduler": scheduler.snapshot() if scheduler else {"enabled": False},
+        "backends": ai_client.router.snapshot(),
+    }
+
+async def build_user_content(user_message: str) -> str:
+    """Attach PDF or course content to the user's message when it asks for it"""
     user_message_lower = user_message.lower()
 
     # PDF detection
-    if any(k in user_message_lower for k in PDF_FILES.keys()):
-        pdf_key = next(k for k in PDF_FILES if k in user_message_lower)
-        pdf_text = extract_pdf_text(pdf_key, full=("full" in user_message_lower or "details" in user_message_lower))
+    pdf_key = next((k for k in PDF_KEY_RE.findall(user_message_lower) if k in PDF_FILES), None)
+    if pdf_key:
+        pdf_text = await extract_pdf_text(pdf_key, full=("full" in user_message_lower or "details" in user_message_lower))
         if pdf_text:
-            conversation_history.append({"role": "user", "content": f"{user_message}\n\n{pdf_text}"})
-            ai_response = ai_client.chat_completion(messages=get_recent_messages())
-            conversation_history.append({"role": "assistant", "content": ai_response})
-            save_memory()
-            return {"reply": ai_response}
+            return f"{user_message}\n\n{pdf_text}"
 
     # Course detection - NOW MUCH MORE RESTRICTIVE
     course_key = find_course_match(user_message_lower)
     if course_key:
         course_content = load_course_content(course_key)
         if course_content:
-            conversation_history.append({"role": "user", "content": f"{user_message}\n\n{course_content}"})
-            ai_response = ai_client.chat_completion(messages=get_recent_messages())
-            conversation_history.append({"role": "assistant", "content": ai_response})
-            save_memory()
-            return {"reply": ai_response}
-
-    # Default chat
-    conversation_history.append({"role": "user", "content": user_message})
-    ai_response = ai_client.chat_completion(messages=get_recent_messages())
-    conversation_history.append({"role": "assistant", "content": ai_response})
-    save_memory()
+            return f"{user_message}\n\n{course_content}"
+
+    return user_message
+
+@router.post("/chat")
+async def handle_chat(request: ChatRequest):
+    global conversation_history
+    user_message = request.message.strip()
+
+    notice = pending_document_notice(user_message)
+    if notice:
+        return {"reply": notice}
+
+    user_content = await build_user_content(user_message)
+    # Retrieved chunks only go into this request's prompt, never into stored history
+    context = await retrieve_context(user_message) if user_content == user_message else None
+    user_entry = {"role": "user", "content": user_content}
+    conversation_history.append(user_entry)
+    try:
+        ai_response = await ai_client.achat_completion(messages=build_prompt(context))
+    except SchedulerFull:
+        # Rejected before reaching the model: forget the turn, the app answers 503
+        conversation_history.remove(user_entry)
+        raise
+    assistant_entry = {"role": "assistant", "content": ai_response}
+    conversation_history.append(assistant_entry)
+    # Journal this request's own pair: other turns may have been appended while we awaited
+    save_memory(user_entry, assistant_entry)
+    summarizer.notify()
     return {"reply": ai_response}
 
+@router.post("/chat/stream")
+async def handle_chat_stream(request: ChatRequest):
+    """Same as /chat, but forwards tokens as server-sent events while Ollama generates them"""
+    user_message = request.message.strip()
+
+    notice = pending_document_notice(user_message)
+    if notice:
+        async def notice_stream():
+            yield f"data: {json.dumps({'token': notice}, ensure_ascii=False)}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        return StreamingResponse(notice_stream(), media_type="text/event-stream")
+
+    user_content = await build_user_content(user_message)
+    context = await retrieve_context(user_message) if user_content == user_message else None
+    user_entry = {"role": "user", "content": user_content}
+    conversation_history.append(user_entry)
+    messages = build_prompt(context)
+
+    # Wait for a scheduler slot and the first token before answering, so an
+    # overloaded server can still reply with a plain 503
+    tokens = ai_client.astream_chat_completion(messages=messages)
+    try:
+        first_token = await anext(tokens, None)
+    except SchedulerFull:
+        conversation_history.remove(user_entry)
+        raise
+
+    async def event_stream():
+        parts = []
+        failed = False
+        try:
+            if first_token is not None:
+                parts.append(first_token)
+                yield f"data: {json.dumps({'token': first_token}, ensure_ascii=False)}\n\n"
+            async for token in tokens:
+                parts.append(token)
+                yield f"data: {json.dumps({'token': token}, ensure_ascii=False)}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception:
+            # The model broke off mid-answer: tell the client, and keep the partial reply out of memory
+            failed = True
+            yield f"event: error\ndata: {json.dumps({'error': 'The AI service stopped responding mid-answer.'})}\n\n"
+        finally:
+            # Runs on normal completion and on client disconnect alike
+            await tokens.aclose()  # frees the scheduler slot if the client left mid-stream
+            if failed:
+                if user_entry in conversation_history:
+                    conversation_history.remove(user_entry)
+            elif parts:
+                assistant_entry = {"role": "assistant", "content": "".join(parts).strip()}
+                conversation_history.append(assistant_entry)
+                save_memory(user_entry, assistant_entry)
+            else:
+                save_memory(user_entry)
+            summarizer.notify()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 # backend/chat/chat_api.py || v4.5 – Blueprint, PDF & Course Auto-Integration
 # from fastapi import APIRouter
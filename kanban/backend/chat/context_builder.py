@@ -0,0 +1,120 @@
+# backend/chat/context_builder.py || Token-budgeted prompt assembly
+import re
+from functools import lru_cache
+
+PIECE_RE = re.compile(r"\w+|[^\w\s]+")
+MESSAGE_OVERHEAD = 4  # role markers and separators added by the chat template
+CHARS_PER_TOKEN = 3.8  # starting point when sizing truncated excerpts
+
+
+def _estimate(text: str) -> int:
+    return sum(1 + len(piece) // 6 for piece in PIECE_RE.findall(text))
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    """
+    Calibrated estimate of Llama-3 BPE tokens: short words and punctuation runs are
+    one token each, long words add one token per ~6 characters. Results are
+    cached per string, so each stored message is only counted once.
+    """
+    return _estimate(text)
+
+
+def message_tokens(message: dict) -> int:
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD
+
+
+def shorten(message: dict, max_tokens: int) -> dict:
+    """Keep the head and tail of an oversized message within `max_tokens`."""
+    content = message["content"]
+    keep_chars = int(max_tokens * CHARS_PER_TOKEN)
+    while True:
+        head = content[: keep_chars * 2 // 3]
+        tail = content[len(content) - keep_chars // 3:]
+        excerpt = f"{head}\n[… earlier text omitted …]\n{tail}"
+        if _estimate(excerpt) + MESSAGE_OVERHEAD <= max_tokens or keep_chars == 0:
+            return {**message, "content": excerpt}
+        keep_chars = int(keep_chars * 0.8)
+
+
+CONTEXT_HEADER = "=== RELEVANT CONTEXT ===\n\n"
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+MIN_EXCERPT_TOKENS = 64  # below this a trimmed context chunk isn't worth sending
+
+
+class ContextBuilder:
+    """
+    Packs system prompt + retrieved context + the newest turns into a fixed
+    token budget, so the prompt never silently overflows the model's num_ctx.
+
+    Room for the newest turn is reserved first; it is only shortened if it
+    doesn't fit even with no context at all. Retrieved context then gets what
+    is left, best-ranked chunks first (the last one trimmed, the rest dropped).
+    Older turns follow, newest first: those above `max_turn_tokens` are cut
+    down to an excerpt, and once the budget is spent everything older is dropped.
+    """
+
+    def __init__(self, budget_tokens: int, reserve_tokens: int = 768, max_turn_tokens: int = 600):
+        self.budget_tokens = budget_tokens
+        self.reserve_tokens = reserve_tokens
+        self.max_turn_tokens = max_turn_tokens
+
+    def fit_context(self, context: str, max_tokens: int) -> dict | None:
+        """The retrieved context as a system message of at most `max_tokens`, or None if nothing fits."""
+        header = CONTEXT_HEADER if context.startswith(CONTEXT_HEADER) else ""
+        chunks = context[len(header):].split(CONTEXT_SEPARATOR)
+        kept = []
+        for chunk in chunks:
+            candidate = header + CONTEXT_SEPARATOR.join(kept + [chunk])
+            if count_tokens(candidate) + MESSAGE_OVERHEAD <= max_tokens:
+                kept.append(chunk)
+                continue
+            room = max_tokens - count_tokens(header + CONTEXT_SEPARATOR.join(kept + [""])) - MESSAGE_OVERHEAD
+            if room >= MIN_EXCERPT_TOKENS:
+                kept.append(shorten({"content": chunk}, room)["content"])
+            break
+        if not kept:
+            return None
+        return {"role": "system", "content": header + CONTEXT_SEPARATOR.join(kept)}
+
+    def build(
+        self,
+        system_message: dict,
+        turns: list[dict],
+        context: str | None = None,
+        summary: dict | None = None,
+    ) -> list[dict]:
+        """`summary` (the running summary of folded turns) is always kept, right after the system prompt."""
+        pinned = [system_message] + ([summary] if summary else [])
+        remaining = self.budget_tokens - self.reserve_tokens - sum(message_tokens(m) for m in pinned)
+
+        picked = []
+        if turns:
+            newest = turns[-1]
+            if message_tokens(newest) > remaining:
+                # Doesn't fit even without context: send as much of it as there is room for
+                newest = shorten(newest, max(remaining, MESSAGE_OVERHEAD + 32))
+            picked.append(newest)
+            remaining -= message_tokens(newest)
+
+        context_message = self.fit_context(context, remaining) if context and remaining > 0 else None
+        if context_message:
+            remaining -= message_tokens(context_message)
+
+        for message in reversed(turns[:-1]):
+            cost = message_tokens(message)
+            if cost > self.max_turn_tokens:
+                message = shorten(message, self.max_turn_tokens)
+                cost = message_tokens(message)
+            if cost > remaining:
+                break
+            picked.append(message)
+            remaining -= cost
+        picked.reverse()
+
+        if context_message and picked:
+            picked.insert(len(picked) - 1, context_message)
+        elif context_message:
+            picked.append(context_message)
+        return pinned + picked
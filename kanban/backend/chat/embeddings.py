@@ -0,0 +1,175 @@
+# backend/chat/embeddings.py || Local embedding index with NumPy top-k search
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from backend.chat.retrieval import TOKEN_RE, chunk_text
+
+
+class HashingEmbedder:
+    """
+    Deterministic stand-in for a real embedding model (feature hashing of word
+    unigrams and bigrams). Needs no server, so it also works in tests.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = TOKEN_RE.findall(text.lower())
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                vectors[row, bucket] += 1.0 if digest[4] & 1 else -1.0
+        return vectors
+
+
+class OllamaEmbedder:
+    """Embeddings from the local Ollama server via `AIClient.embed`."""
+
+    def __init__(self, ai_client, model: str = "nomic-embed-text"):
+        self.ai_client = ai_client
+        self.model = model
+        self.name = f"ollama:{model}"
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        return np.asarray(self.ai_client.embed(texts, model=self.model), dtype=np.float32)
+
+
+class VectorIndex:
+    """
+    Chunk embeddings stored as one float32 matrix (`vectors.npy`, memory-mapped
+    on load) plus `meta.json` describing each row.
+
+    Rows are L2-normalized, so a query is a single matrix-vector product.
+    Chunks are keyed by content hash and only new or changed chunks are sent
+    to the embedder. A document whose chunks are unchanged leaves the matrix
+    alone (so the startup re-scan keeps the memory-mapped file instead of
+    copying it into RAM), and `save` is a no-op until something changed.
+    """
+
+    def __init__(self, index_dir: str, embedder, chunk_size: int = 800, batch_size: int = 32):
+        self.index_dir = index_dir
+        self.embedder = embedder
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.vectors_path = os.path.join(index_dir, "vectors.npy")
+        self.meta_path = os.path.join(index_dir, "meta.json")
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._meta: list[dict] = []
+        self.dirty = False
+        os.makedirs(index_dir, exist_ok=True)
+        self._load()
+
+    def __len__(self):
+        return len(self._meta)
+
+    # ----------------------------------------------------------------------
+    # 1. Persistence
+    # ----------------------------------------------------------------------
+    def _load(self):
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            if stored.get("embedder") != self.embedder.name:
+                print(f"🧮 Embedder changed to '{self.embedder.name}', rebuilding vector index.")
+                return
+            vectors = np.load(self.vectors_path, mmap_mode="r")
+        except (OSError, ValueError, json.JSONDecodeError):
+            return
+        if len(vectors) == len(stored["chunks"]):
+            self._vectors, self._meta = vectors, stored["chunks"]
+
+    def save(self):
+        with self._lock:
+            if not self.dirty:
+                return
+            vectors, meta = self._vectors, self._meta
+            tmp_vectors = self.vectors_path + ".tmp.npy"
+            np.save(tmp_vectors, np.ascontiguousarray(vectors, dtype=np.float32))
+            os.replace(tmp_vectors, self.vectors_path)
+            tmp_meta = self.meta_path + ".tmp"
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump({"embedder": self.embedder.name, "chunks": meta}, f, ensure_ascii=False)
+            os.replace(tmp_meta, self.meta_path)
+            self.dirty = False
+
+    # ----------------------------------------------------------------------
+    # 2. Incremental updates
+    # ----------------------------------------------------------------------
+    def update_document(self, doc_key: str, name: str, text: str) -> int:
+        """Re-chunk a document, embedding only chunks not already indexed. Returns the number embedded."""
+        pieces = [(n, piece) for n, piece in enumerate(chunk_text(text, self.chunk_size))]
+        hashes = [hashlib.sha1(piece.encode("utf-8")).hexdigest() for _, piece in pieces]
+
+        with self._lock:
+            current = [(m["hash"], m["name"]) for m in self._meta if m["doc_key"] == doc_key]
+            if current == [(h, name) for h in hashes]:
+                return 0
+            known = {m["hash"]: row for row, m in enumerate(self._meta)}
+        missing = [i for i, h in enumerate(hashes) if h not in known]
+        fresh = self._embed([pieces[i][1] for i in missing]) if missing else None
+
+        with self._lock:
+            known = {m["hash"]: row for row, m in enumerate(self._meta)}
+            keep = [row for row, m in enumerate(self._meta) if m["doc_key"] != doc_key]
+            rows, meta = [], []
+            fresh_rows = dict(zip(missing, fresh)) if fresh is not None else {}
+            for i, ((n, piece), h) in enumerate(zip(pieces, hashes)):
+                vector = fresh_rows[i] if i in fresh_rows else self._vectors[known[h]]
+                rows.append(vector)
+                meta.append({"id": f"{doc_key}#{n}", "doc_key": doc_key, "name": name, "hash": h, "text": piece})
+            self._replace(keep, rows, meta)
+        return len(missing)
+
+    def remove_document(self, doc_key: str):
+        with self._lock:
+            keep = [row for row, m in enumerate(self._meta) if m["doc_key"] != doc_key]
+            if len(keep) != len(self._meta):
+                self._replace(keep, [], [])
+
+    def _replace(self, keep: list[int], rows: list, meta: list[dict]):
+        kept = np.asarray(self._vectors[keep], dtype=np.float32) if keep else None
+        parts = [p for p in (kept, np.asarray(rows, dtype=np.float32) if rows else None) if p is not None]
+        self._vectors = np.vstack(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+        self._meta = [self._meta[row] for row in keep] + meta
+        self.dirty = True
+
+    def _embed(self, texts: list[str]) -> np.ndarray:
+        batches = [
+            self.embedder.embed(texts[i:i + self.batch_size])
+            for i in range(0, len(texts), self.batch_size)
+        ]
+        return _normalize(np.vstack(batches))
+
+    # ----------------------------------------------------------------------
+    # 3. Search
+    # ----------------------------------------------------------------------
+    def search(self, queries: list[str], k: int = 3) -> list[list[tuple[dict, float]]]:
+        """Cosine top-k for each query, scored in one batched matrix product."""
+        vectors, meta = self._vectors, self._meta
+        if not meta or not queries:
+            return [[] for _ in queries]
+        scores = _normalize(self.embedder.embed(queries)) @ vectors.T
+        k = min(k, len(meta))
+        results = []
+        for row in scores:
+            top = np.argpartition(-row, k - 1)[:k]
+            top = top[np.argsort(-row[top])]
+            results.append([(meta[i], float(row[i])) for i in top])
+        return results
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
@@ -0,0 +1,193 @@
+# backend/chat/ingest.py || Background document ingestion
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable
+
+from backend.chat.pdf_cache import PdfTextCache, extract_pages, normalize_text
+
+
+@dataclass
+class Document:
+    key: str
+    kind: str  # "pdf", "blueprint", "course" or "doc"
+    path: str
+    name: str
+    status: str = "processing"  # "processing", "ready", "error" or "removed"
+    pages: list[str] = field(default_factory=list)
+    error: str | None = None
+    version: tuple = ()
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.pages)
+
+
+def _file_version(path: str) -> tuple:
+    st = os.stat(path)
+    return (path, st.st_mtime_ns, st.st_size)
+
+
+def _extract_document(kind: str, path: str) -> list[str]:
+    """Runs in a worker process: read or parse one file into normalized pages."""
+    if kind == "pdf":
+        return extract_pages(path)
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        return [normalize_text(f.read(), kind)]
+
+
+class DocumentIngestor:
+    """
+    Watches the resource directories and extracts documents off the event loop.
+
+    `discover` returns the current on-disk resources as {key: (kind, path, name)}.
+    New or changed files are parsed in a process pool; finished documents are
+    published to subscribers. Callers check `get(key).status` and can answer
+    "still processing" instead of waiting on a parse.
+    """
+
+    def __init__(
+        self,
+        discover: Callable[[], dict[str, tuple[str, str, str]]],
+        watch_dirs: list[str],
+        pdf_cache: PdfTextCache | None = None,
+        max_workers: int | None = None,
+        poll_interval: float = 2.0,
+    ):
+        self.discover = discover
+        self.watch_dirs = watch_dirs
+        self.pdf_cache = pdf_cache
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.poll_interval = poll_interval
+        self.documents: dict[str, Document] = {}
+        self._subscribers: list[Callable[[Document], None]] = []
+        self._executor: ProcessPoolExecutor | None = None
+        self._watch_task: asyncio.Task | None = None
+        self._jobs: set[asyncio.Task] = set()
+
+    def subscribe(self, callback: Callable[[Document], None]):
+        """Call `callback(doc)` whenever a document becomes ready, fails or is removed."""
+        self._subscribers.append(callback)
+
+    def get(self, key: str) -> Document | None:
+        return self.documents.get(key)
+
+    async def read(self, kind: str, path: str) -> list[str]:
+        """
+        Pages of a file the ingestor has not (successfully) extracted: from the
+        PDF cache, else parsed in the worker pool, never on the event loop.
+        """
+        version = _file_version(path)
+        cache_key = self.pdf_cache.version_key(*version) if self.pdf_cache and kind == "pdf" else None
+        cached = self.pdf_cache.lookup(path, cache_key) if cache_key else None
+        if cached is not None:
+            return cached
+        pages = await asyncio.get_running_loop().run_in_executor(self._executor, _extract_document, kind, path)
+        if cache_key:
+            self.pdf_cache.store(path, pages, key=cache_key)
+        return pages
+
+    # ----------------------------------------------------------------------
+    # 1. Lifecycle
+    # ----------------------------------------------------------------------
+    async def start(self):
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        self.scan()
+        self._watch_task = asyncio.create_task(self._watch())
+        print(f"📥 Document ingestion started ({self.max_workers} workers)")
+
+    async def stop(self):
+        if self._watch_task:
+            self._watch_task.cancel()
+            self._watch_task = None
+        for job in list(self._jobs):
+            job.cancel()
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _watch(self):
+        try:
+            from watchfiles import awatch
+        except ImportError:
+            awatch = None
+
+        dirs = [d for d in self.watch_dirs if os.path.isdir(d)]
+        if awatch and dirs:
+            async for _ in awatch(*dirs):
+                self.scan()
+        else:
+            while True:
+                await asyncio.sleep(self.poll_interval)
+                self.scan()
+
+    # ----------------------------------------------------------------------
+    # 2. Scanning and extraction
+    # ----------------------------------------------------------------------
+    def scan(self):
+        """Queue new or changed files for extraction and publish removals."""
+        current = self.discover()
+
+        for key in set(self.documents) - set(current):
+            doc = self.documents.pop(key)
+            doc.status = "removed"
+            self._publish(doc)
+
+        for key, (kind, path, name) in current.items():
+            try:
+                version = _file_version(path)
+            except OSError:
+                continue
+            existing = self.documents.get(key)
+            if existing and existing.version == version:
+                continue
+
+            doc = Document(key=key, kind=kind, path=path, name=name, version=version)
+            self.documents[key] = doc
+
+            cached = self.pdf_cache.lookup(path, self.pdf_cache.version_key(*version)) if self.pdf_cache and kind == "pdf" else None
+            if cached is not None:
+                self._finish(doc, cached)
+                continue
+
+            job = asyncio.get_running_loop().create_task(self._ingest(doc))
+            self._jobs.add(job)
+            job.add_done_callback(self._jobs.discard)
+
+    async def _ingest(self, doc: Document):
+        loop = asyncio.get_running_loop()
+        try:
+            pages = await loop.run_in_executor(self._executor, _extract_document, doc.kind, doc.path)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            doc.status = "error"
+            doc.error = str(e)
+            print(f"❌ Failed to ingest '{doc.name}': {e}")
+            self._publish(doc)
+            return
+
+        if self.documents.get(doc.key) is not doc:
+            return  # superseded by a newer version while parsing
+        if self.pdf_cache and doc.kind == "pdf":
+            # Keyed by the stat taken before parsing: if the file was edited meanwhile, the next
+            # scan sees a new version instead of finding these pages filed under it
+            self.pdf_cache.store(doc.path, pages, key=self.pdf_cache.version_key(*doc.version))
+        self._finish(doc, pages)
+
+    def _finish(self, doc: Document, pages: list[str]):
+        doc.pages = pages
+        doc.status = "ready"
+        self._publish(doc)
+
+    def _publish(self, doc: Document):
+        for callback in self._subscribers:
+            try:
+                callback(doc)
+            except Exception as e:
+                print(f"⚠️ Ingestion subscriber failed for '{doc.key}': {e}")
@@ -0,0 +1,187 @@
+# backend/chat/journal.py || Append-only conversation journal
+import json
+import os
+import threading
+import time
+
+
+class ConversationJournal:
+    """
+    Persists the chat history as a snapshot (memory.json) plus an append-only
+    journal (memory.jsonl) holding one JSON line per message.
+
+    Each chat turn appends a couple of short lines instead of rewriting the whole
+    history. Every `compact_every` journal lines the history is folded back into
+    the snapshot. Snapshot and journal share an epoch number, so a crash between
+    writing the snapshot and truncating the journal can never replay stale lines.
+
+    A snapshot may be written while a turn is still in flight (e.g. by the
+    summarizer), so it can already contain messages that will be passed to
+    `append` later; those are recognised by identity and not journaled twice.
+    """
+
+    def __init__(
+        self,
+        snapshot_path: str,
+        journal_path: str | None = None,
+        compact_every: int = 200,
+        fsync_every: int = 8,
+        fsync_interval: float = 1.0,
+    ):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or os.path.splitext(snapshot_path)[0] + ".jsonl"
+        self.compact_every = compact_every
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.epoch = 0
+        self._lock = threading.Lock()
+        self._fh = None
+        self._journal_lines = 0
+        self._unsynced = 0
+        self._last_fsync = time.monotonic()
+        # id -> message for everything in the current snapshot (the references keep ids from being reused)
+        self._snapshotted: dict[int, dict] = {}
+
+    # ----------------------------------------------------------------------
+    # 1. Startup: snapshot + journal replay
+    # ----------------------------------------------------------------------
+    def load(self, default: list[dict]) -> list[dict]:
+        """Return the stored history, or `default` if nothing usable is on disk."""
+        history = None
+        if os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                    snapshot = json.load(f)
+                # Older deployments stored a bare list of messages
+                if isinstance(snapshot, list):
+                    history = snapshot
+                else:
+                    self.epoch = snapshot.get("epoch", 0)
+                    history = snapshot.get("messages", [])
+            except (json.JSONDecodeError, OSError):
+                print("⚠️ Memory snapshot corrupted, resetting.")
+
+        if history is None:
+            print("💾 Creating new memory file.")
+            history = list(default)
+            self.rewrite(history)
+            return history
+
+        replayed = self._replay(history)
+        if replayed:
+            print(f"💾 Replayed {replayed} journaled messages.")
+        self._open_journal()
+        return history
+
+    def _replay(self, history: list[dict]) -> int:
+        if not os.path.exists(self.journal_path):
+            return 0
+        entries = []
+        good_bytes = 0
+        torn = False
+        with open(self.journal_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    torn = True
+                    break
+                try:
+                    entries.append(json.loads(line))
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    torn = True
+                    break
+                good_bytes += len(line)
+
+        if not entries or entries[0].get("epoch") != self.epoch:
+            # Missing header, or the journal predates the current snapshot
+            # (crash between snapshot write and journal truncation)
+            self._reset_journal()
+            return 0
+        if torn:
+            # A torn final line from a crash mid-write; drop it so new appends
+            # start on a clean line
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(good_bytes)
+
+        history.extend(entries[1:])
+        self._journal_lines = len(entries) - 1
+        return self._journal_lines
+
+    # ----------------------------------------------------------------------
+    # 2. Per-turn appends with batched fsync
+    # ----------------------------------------------------------------------
+    def append(self, *messages: dict, history: list[dict] | None = None):
+        """
+        Journal new messages. Pass the full `history` to let the journal compact
+        itself once it has grown past `compact_every` lines.
+        """
+        with self._lock:
+            messages = [m for m in messages if self._snapshotted.get(id(m)) is not m]
+            if not messages:
+                return
+            if self._fh is None:
+                self._open_journal()
+            for message in messages:
+                self._fh.write(json.dumps(message, ensure_ascii=False) + "\n")
+            self._fh.flush()
+            self._journal_lines += len(messages)
+            self._unsynced += len(messages)
+            now = time.monotonic()
+            if self._unsynced >= self.fsync_every or now - self._last_fsync >= self.fsync_interval:
+                self._fsync(now)
+
+        if history is not None and self._journal_lines >= self.compact_every:
+            self.rewrite(history)
+
+    def flush(self):
+        """Force any batched journal writes to disk."""
+        with self._lock:
+            if self._fh is not None and self._unsynced:
+                self._fsync(time.monotonic())
+
+    def _fsync(self, now: float):
+        os.fsync(self._fh.fileno())
+        self._unsynced = 0
+        self._last_fsync = now
+
+    # ----------------------------------------------------------------------
+    # 3. Compaction / reset
+    # ----------------------------------------------------------------------
+    def rewrite(self, history: list[dict]):
+        """Write `history` as a fresh snapshot and start an empty journal."""
+        with self._lock:
+            self.epoch += 1
+            tmp_path = self.snapshot_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"epoch": self.epoch, "messages": history}, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            self._snapshotted = {id(m): m for m in history}
+
+            self._reset_journal()
+            self._open_journal()
+
+    def _reset_journal(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        with open(self.journal_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"epoch": self.epoch}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_lines = 0
+        self._unsynced = 0
+
+    def _open_journal(self):
+        if self._fh is None:
+            if not os.path.exists(self.journal_path):
+                with open(self.journal_path, "w", encoding="utf-8") as f:
+                    f.write(json.dumps({"epoch": self.epoch}) + "\n")
+            self._fh = open(self.journal_path, "a", encoding="utf-8")
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
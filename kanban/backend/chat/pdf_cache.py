@@ -0,0 +1,111 @@
+# backend/chat/pdf_cache.py || Extracted PDF text cache
+import contextlib
+import glob
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from PyPDF2 import PdfReader
+
+
+# Bumped whenever the stored form of the pages changes, so older sidecars are never served
+CACHE_FORMAT = 2
+
+
+def normalize_text(text: str, kind: str = "") -> str:
+    """Tidy extracted text without touching code indentation."""
+    text = text.replace("\x00", "").replace("\r\n", "\n")
+    if kind == "pdf":
+        # Re-join words hyphenated across PDF line breaks
+        text = re.sub(r"(\w)-\n(\w)", r"\1\2", text)
+    text = re.sub(r"[ \t]+\n", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+def extract_pages(path: str) -> list[str]:
+    """Parse a PDF and return the normalized text of each page (the form the cache stores)."""
+    reader = PdfReader(path)
+    return [normalize_text(page.extract_text() or "", "pdf") for page in reader.pages]
+
+
+class PdfTextCache:
+    """
+    Per-page PDF text, cached in memory (LRU) and in JSON sidecar files.
+
+    Entries are keyed by path + mtime + size, so an edited or replaced PDF is
+    re-parsed once and every other lookup (preview or full) skips PyPDF2.
+    Pages are always stored as `extract_pages` returns them (normalized),
+    whichever caller filled the entry.
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int = 32):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._lru: OrderedDict[str, list[str]] = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get_pages(self, path: str) -> list[str]:
+        """Return per-page text for `path`, parsing the PDF (on the calling thread) only on a cache miss."""
+        key = self._key(path)  # before parsing, so an edit meanwhile can't file old text as new
+        pages = self.lookup(path, key)
+        if pages is None:
+            pages = extract_pages(path)
+            self.store(path, pages, key)
+        return pages
+
+    def lookup(self, path: str, key: str | None = None) -> list[str] | None:
+        """Return cached pages for the current version of `path`, or None."""
+        key = key or self._key(path)
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                return self._lru[key]
+
+        sidecar = os.path.join(self.cache_dir, key + ".json")
+        try:
+            with open(sidecar, "r", encoding="utf-8") as f:
+                pages = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        self._remember(key, pages)
+        return pages
+
+    def store(self, path: str, pages: list[str], key: str | None = None):
+        """Cache freshly extracted pages and drop sidecars of older versions."""
+        key = key or self._key(path)
+        path_prefix = key.split("-", 1)[0]
+        for stale in glob.glob(os.path.join(self.cache_dir, path_prefix + "-*.json")):
+            if not stale.endswith(key + ".json"):
+                # Another worker storing the same PDF may have removed it first
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(stale)
+
+        sidecar = os.path.join(self.cache_dir, key + ".json")
+        tmp_path = sidecar + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(pages, f, ensure_ascii=False)
+        os.replace(tmp_path, sidecar)
+        self._remember(key, pages)
+
+    def _remember(self, key: str, pages: list[str]):
+        with self._lock:
+            self._lru[key] = pages
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    @staticmethod
+    def version_key(path: str, mtime_ns: int, size: int) -> str:
+        """Cache key for one version of `path`, from a stat taken by the caller."""
+        path_hash = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:16]
+        return f"{path_hash}-{mtime_ns}-{size}-v{CACHE_FORMAT}"
+
+    @staticmethod
+    def _key(path: str) -> str:
+        st = os.stat(path)
+        return PdfTextCache.version_key(path, st.st_mtime_ns, st.st_size)
@@ -0,0 +1,110 @@
+# backend/chat/retrieval.py || BM25 retrieval over ingested documents
+import heapq
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do for from has have how i if in is it its "
+    "me my of on or so that the this to was what when where which who why will "
+    "with you your".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def chunk_text(text: str, size: int = 800) -> list[str]:
+    """Split on paragraph boundaries into chunks of roughly `size` characters."""
+    chunks, current = [], ""
+    for para in re.split(r"\n\s*\n", text):
+        para = para.strip()
+        if not para:
+            continue
+        while len(para) > size:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(para[:size])
+            para = para[size:]
+        if current and len(current) + len(para) + 2 > size:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{para}" if current else para
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+@dataclass
+class Chunk:
+    id: str
+    doc_key: str
+    name: str
+    text: str
+    length: int
+
+
+class BM25Index:
+    """
+    Inverted index with BM25 scoring, updated one document at a time.
+
+    A query only touches the posting lists of its own terms, so lookups stay
+    fast however many documents are indexed.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, chunk_size: int = 800):
+        self.k1 = k1
+        self.b = b
+        self.chunk_size = chunk_size
+        self.postings: dict[str, dict[str, int]] = {}
+        self.chunks: dict[str, Chunk] = {}
+        self._doc_chunks: dict[str, list[str]] = {}
+        self._total_length = 0
+
+    def update_document(self, doc_key: str, name: str, text: str):
+        self.remove_document(doc_key)
+        chunk_ids = []
+        for n, piece in enumerate(chunk_text(text, self.chunk_size)):
+            terms = Counter(tokenize(piece))
+            if not terms:
+                continue
+            chunk = Chunk(f"{doc_key}#{n}", doc_key, name, piece, sum(terms.values()))
+            self.chunks[chunk.id] = chunk
+            self._total_length += chunk.length
+            for term, tf in terms.items():
+                self.postings.setdefault(term, {})[chunk.id] = tf
+            chunk_ids.append(chunk.id)
+        self._doc_chunks[doc_key] = chunk_ids
+
+    def remove_document(self, doc_key: str):
+        for chunk_id in self._doc_chunks.pop(doc_key, []):
+            chunk = self.chunks.pop(chunk_id)
+            self._total_length -= chunk.length
+            for term in set(tokenize(chunk.text)):
+                posting = self.postings.get(term)
+                if posting is not None:
+                    posting.pop(chunk_id, None)
+                    if not posting:
+                        del self.postings[term]
+
+    def search(self, query: str, k: int = 3, min_score: float = 0.0) -> list[tuple[Chunk, float]]:
+        """Return the `k` best (chunk, score) pairs for `query`."""
+        n_chunks = len(self.chunks)
+        if not n_chunks:
+            return []
+        avg_length = self._total_length / n_chunks
+        scores: dict[str, float] = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n_chunks - len(posting) + 0.5) / (len(posting) + 0.5))
+            for chunk_id, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.chunks[chunk_id].length / avg_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.chunks[chunk_id], score) for chunk_id, score in best if score > min_score]
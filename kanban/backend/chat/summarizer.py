@@ -0,0 +1,109 @@
+# backend/chat/summarizer.py || Rolling background summarization of old turns
+import asyncio
+import json
+import os
+import time
+from typing import Callable
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+
+def is_summary(message: dict) -> bool:
+    return message["role"] == "system" and message["content"].startswith(SUMMARY_PREFIX)
+
+
+class HistorySummarizer:
+    """
+    Keeps the live conversation history short without losing its gist.
+
+    Once the history grows past `max_messages`, the oldest `fold_messages`
+    turns are folded (together with any previous summary) into a single
+    running summary message right after the system prompt. The raw turns are
+    appended to monthly JSONL files in `archive_dir` once the fold is
+    committed. All of this runs in a background task, never on the request
+    path.
+    """
+
+    def __init__(
+        self,
+        ai_client,
+        get_history: Callable[[], list[dict]],
+        on_rewrite: Callable[[list[dict]], None],
+        archive_dir: str,
+        max_messages: int = 40,
+        fold_messages: int = 20,
+        summary_words: int = 200,
+    ):
+        self.ai_client = ai_client
+        self.get_history = get_history
+        self.on_rewrite = on_rewrite
+        self.archive_dir = archive_dir
+        self.max_messages = max_messages
+        self.fold_messages = fold_messages
+        self.summary_words = summary_words
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def notify(self):
+        """Called after each turn; the background task decides whether to fold."""
+        self._wakeup.set()
+
+    async def start(self):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        self._task = asyncio.create_task(self._run())
+        self.notify()
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                while len(self.get_history()) > self.max_messages:
+                    if not await self.fold_oldest():
+                        break
+            except Exception as e:
+                # Ollama down or similar: keep the raw turns and retry after the next turn
+                print(f"⚠️ History summarization failed: {e}")
+
+    async def fold_oldest(self) -> bool:
+        """Fold the oldest turns into the running summary. Returns False if the history changed meanwhile."""
+        history = self.get_history()
+        start = 1 if history and history[0]["role"] == "system" else 0
+        previous = history[start] if len(history) > start and is_summary(history[start]) else None
+        first_turn = start + (1 if previous else 0)
+        folded = history[first_turn:first_turn + self.fold_messages]
+        if not folded:
+            return False
+
+        transcript = "\n\n".join(f"{m['role'].upper()}: {m['content'][:1500]}" for m in folded)
+        if previous:
+            transcript = f"{previous['content'][len(SUMMARY_PREFIX):]}\n\n{transcript}"
+        summary = await self.ai_client.asummarize(transcript, length=self.summary_words)
+
+        # Requests may have appended turns while we awaited (fine), or reset the history (abort)
+        current = self.get_history()
+        expected = ([previous] if previous else []) + folded
+        if (
+            current is not history
+            or len(current) < start + len(expected)
+            or any(a is not b for a, b in zip(current[start:], expected))
+        ):
+            return False
+
+        # No await from here on, so nothing can change the history between the check and the rewrite
+        self._archive(folded)
+        current[start:start + len(expected)] = [{"role": "system", "content": SUMMARY_PREFIX + summary}]
+        self.on_rewrite(current)
+        print(f"🗜️ Folded {len(folded)} old messages into the running summary.")
+        return True
+
+    def _archive(self, messages: list[dict]):
+        path = os.path.join(self.archive_dir, time.strftime("history-%Y-%m.jsonl"))
+        with open(path, "a", encoding="utf-8") as f:
+            for message in messages:
+                f.write(json.dumps({"archived_at": time.time(), **message}, ensure_ascii=False) + "\n")
@@ -22,6 +22,23 @@ class Settings(BaseSettings):
     ENVIRONMENT: str = "development"              # ← NEW: "development" or "production"
     ADMIN_EMAIL: str = "admin@example.com"        # ← NEW: for alerts/logging
 
+    # Model router: backends tried fastest-first, with failover
+    AI_BACKENDS: str = "ollama,groq"              # any of: ollama, groq, stub
+    GROQ_BASE_URL: str = "https://api.groq.com/openai/v1"
+    GROQ_MODEL: str = "llama-3.1-70b-versatile"
+    AI_CIRCUIT_FAILURES: int = 3                  # consecutive failures before a backend is skipped
+    AI_CIRCUIT_COOLDOWN: float = 30.0             # seconds before a failed backend is probed again
+
+    # Auth caches: verified tokens skip HMAC checks, users skip the per-request lookup
+    AUTH_TOKEN_CACHE_SIZE: int = 4096
+    AUTH_USER_CACHE_SIZE: int = 4096
+    AUTH_USER_CACHE_TTL: float = 30.0             # seconds; bounds staleness across worker processes
+
+    # Password hashing runs on its own process pool, isolated from the request threadpool
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE: int = 64                 # pending hashes before logins get a 503
+    PASSWORD_BCRYPT_ROUNDS: int = 12              # changing it rehashes passwords on next login
+
     model_config = SettingsConfigDict(env_file=".env", case_sensitive=False)
 
 settings = Settings()
\ No newline at end of file
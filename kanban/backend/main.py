@@ -1,12 +1,52 @@
 import uvicorn
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 # Import the chat router from the file we just fixed
-from .chat.chat_api import router as chat_router
+from .chat.chat_api import router as chat_router, ingestor, summarizer, PINNED_SESSION, STATIC_SYSTEM_MESSAGE
+from .services.ai_client import get_ai_client
+from .services.llm_scheduler import SchedulerFull
+from .automation.triggers.event_bus import event_bus
+from .automation.triggers.event_triggers import outbox_dispatcher, delayed_jobs
+from .middleware.metrics import RequestMetricsMiddleware, metrics
+from .middleware.rate_limiter import RateLimitMiddleware
+from .auth import password_hasher
+
+# --- LIFESPAN ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Parse PDFs, blueprints and course files in worker processes, off the request path
+    await ingestor.start()
+    # Fold old conversation turns into a running summary in the background
+    await summarizer.start()
+    if PINNED_SESSION:
+        get_ai_client().pin_prefix([STATIC_SYSTEM_MESSAGE])
+    # Deliver queued automation events to n8n, off the request path
+    await outbox_dispatcher.start()
+    # Run @listen_for handlers in-process
+    await event_bus.start()
+    # Fire delayed handlers (cart abandonment, retention offers) when due
+    await delayed_jobs.start()
+    yield
+    await delayed_jobs.stop()
+    await event_bus.stop()
+    await outbox_dispatcher.stop()
+    await summarizer.stop()
+    await ingestor.stop()
+    # Stop the bcrypt worker processes
+    password_hasher.shutdown()
+    # Close the pooled connections to Ollama
+    await get_ai_client().aclose()
 
 # --- SETUP ---
-app = FastAPI(title="Kanbanotion AI Assistant Backend")
+app = FastAPI(title="Kanbanotion AI Assistant Backend", lifespan=lifespan)
+
+# Raw ASGI middleware (no per-request task or stream wrapping). Added before CORS so
+# CORS stays outermost and 429s still carry its headers; metrics also counts 429s.
+app.add_middleware(RateLimitMiddleware)
+app.add_middleware(RequestMetricsMiddleware)
 
 # Configure CORS to allow your frontend to connect
 app.add_middleware(
@@ -21,6 +61,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- OVERLOAD ---
+@app.exception_handler(SchedulerFull)
+async def scheduler_full_handler(request: Request, exc: SchedulerFull):
+    """The LLM queue is full: fail fast instead of queueing behind minutes of work"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "The AI assistant is busy right now. Please try again in a moment."},
+        headers={"Retry-After": "5"},
+    )
+
 # --- ROUTERS ---
 # Include your chat router with the /api prefix
 app.include_router(chat_router, prefix="/api", tags=["chat"])
@@ -32,6 +82,18 @@ def health_check():
     return {"status": "ok"}
 
 
+# --- METRICS ---
+@app.get("/metrics")
+def metrics_endpoint():
+    """Request latency per route plus the background automation workers."""
+    return {
+        "http": metrics.snapshot(),
+        "outbox": outbox_dispatcher.snapshot(),
+        "event_bus": event_bus.snapshot(),
+        "delayed_jobs": delayed_jobs.snapshot(),
+    }
+
+
 # This part allows the server to be run directly
 if __name__ == "__main__":
     print("🚀 Starting Kanbanotion AI Assistant server at http://127.0.0.1:8000")
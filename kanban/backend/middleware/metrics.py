@@ -0,0 +1,98 @@
+import bisect
+import threading
+import time
+from collections import defaultdict
+
+# Latency histogram bucket upper bounds, in milliseconds
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf"))
+
+
+class RequestMetrics:
+    """Per-route request counts, status classes and a fixed latency histogram (bounded memory)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = defaultdict(lambda: {"requests": 0, "status": defaultdict(int), "buckets": [0] * len(BUCKETS_MS), "total_ms": 0.0})
+        self.in_flight = 0
+
+    def record(self, method: str, route: str, status: int, elapsed_ms: float):
+        with self._lock:
+            stats = self._routes[f"{method} {route}"]
+            stats["requests"] += 1
+            stats["status"][f"{status // 100}xx"] += 1
+            stats["buckets"][bisect.bisect_left(BUCKETS_MS, elapsed_ms)] += 1
+            stats["total_ms"] += elapsed_ms
+
+    @staticmethod
+    def _percentile(buckets: list[int], q: float):
+        # Upper bound of the bucket holding the q-th request
+        target, seen = q * sum(buckets), 0
+        for bound, count in zip(BUCKETS_MS, buckets):
+            seen += count
+            if count and seen >= target:
+                return bound if bound != float("inf") else None
+        return None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            routes = {
+                name: {
+                    "requests": s["requests"],
+                    "status": dict(s["status"]),
+                    "avg_ms": round(s["total_ms"] / s["requests"], 2),
+                    "p50_ms": self._percentile(s["buckets"], 0.5),
+                    "p95_ms": self._percentile(s["buckets"], 0.95),
+                    "p99_ms": self._percentile(s["buckets"], 0.99),
+                }
+                for name, s in self._routes.items()
+            }
+        return {"in_flight": self.in_flight, "routes": routes}
+
+
+metrics = RequestMetrics()
+
+
+class RequestMetricsMiddleware:
+    """
+    Raw ASGI request timing. Records the matched route template (not the raw
+    path, so path parameters don't create unbounded series), the status and
+    the time until the last body chunk was sent.
+    """
+
+    def __init__(self, app, registry: RequestMetrics = None):
+        self.app = app
+        self.registry = registry if registry is not None else metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+        recorded = False
+
+        def finish():
+            nonlocal recorded
+            if not recorded:
+                recorded = True
+                route = scope.get("route")
+                self.registry.record(
+                    scope["method"],
+                    getattr(route, "path", None) or "unmatched",  # 404s, 429s answered before routing
+                    status,
+                    (time.perf_counter() - started) * 1000,
+                )
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finish()
+
+        self.registry.in_flight += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.registry.in_flight -= 1
+            finish()
@@ -0,0 +1,304 @@
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import redis
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+
+
+def _window_tag(window: float) -> str:
+    # Names the counter namespace of one window length: "60s", "86400s", "0_5s"
+    return f"{window:g}s".replace(".", "_")
+
+
+class RateLimitBackend:
+    """
+    Sliding-window-counter limiter; subclasses decide where the counters live.
+
+    Each key keeps only the counts for the current and previous fixed windows;
+    the sliding count is the current count plus the previous one weighted by
+    how much of it still overlaps the window. `_count` must atomically roll
+    the windows forward, add one if the estimate is under the limit, and
+    return (allowed, current, previous).
+
+    Shared stores keep a separate namespace (file, table, key prefix) per
+    window length: staleness is judged by window index, so entries of a
+    short window must never be reused or pruned by a long one, or vice versa.
+    """
+
+    # True if `hit` does I/O and should run off the event loop
+    blocking = False
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+
+    def hit(self, key: str, now: float = None) -> tuple[bool, int, float]:
+        """
+        Counts one request for `key` if it is under the limit.
+        Returns (allowed, remaining, retry_after_seconds).
+        """
+        now = time.time() if now is None else now
+        index = int(now // self.window)
+        elapsed = (now % self.window) / self.window
+        allowed, current, previous = self._count(key, index, 1 - elapsed)
+
+        estimate = previous * (1 - elapsed) + current
+        remaining = max(0, math.floor(self.limit - estimate))
+        if allowed:
+            return True, remaining, 0.0
+        # Time until the weighted previous window has decayed enough for one more request
+        if previous and current < self.limit:
+            retry_after = ((1 - (self.limit - current) / previous) - elapsed) * self.window + 1
+        else:
+            retry_after = (1 - elapsed) * self.window
+        return False, remaining, max(1.0, retry_after)
+
+    def _count(self, key: str, index: int, weight: float) -> tuple[bool, int, int]:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryBackend(RateLimitBackend):
+    """
+    Per-process counters. Keys are spread over independently locked shards,
+    each an LRU that drops keys idle for two windows (their counts no longer
+    matter) and, past `max_keys_per_shard`, the least recently seen key.
+    """
+
+    def __init__(self, limit: int, window: float, shards: int = 16, max_keys_per_shard: int = 65536):
+        super().__init__(limit, window)
+        self.max_keys_per_shard = max_keys_per_shard
+        # key -> [window_index, current_count, previous_count]
+        self._shards = [OrderedDict() for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+
+    def _count(self, key, index, weight):
+        shard_no = hash(key) % len(self._shards)
+        shard = self._shards[shard_no]
+        with self._locks[shard_no]:
+            state = shard.get(key)
+            if state is None:
+                state = shard[key] = [index, 0, 0]
+            else:
+                shard.move_to_end(key)
+                if state[0] != index:
+                    # Roll forward: the old current window becomes the previous one (or is too old to count)
+                    state[2] = state[1] if state[0] == index - 1 else 0
+                    state[0], state[1] = index, 0
+            allowed = state[2] * weight + state[1] < self.limit
+            if allowed:
+                state[1] += 1
+            current, previous = state[1], state[2]
+            self._evict(shard, index)
+        return allowed, current, previous
+
+    def _evict(self, shard: OrderedDict, index: int):
+        # Oldest entries are at the front; stop at the first one still in use
+        while shard:
+            key, state = next(iter(shard.items()))
+            if state[0] < index - 1 or len(shard) > self.max_keys_per_shard:
+                del shard[key]
+            else:
+                break
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+
+class MmapBackend(RateLimitBackend):
+    """
+    Counters in a shared memory-mapped file, for several worker processes on
+    one host (gunicorn). The file is a fixed-size hash table of 24-byte slots
+    split into stripes; a key lives in its home stripe, which is guarded by a
+    byte-range `fcntl` lock (across processes) plus a thread lock (within
+    one). Slots whose window is two or more behind are reused, and a full
+    stripe recycles its stalest slot, so memory stays fixed. Each window
+    length gets its own file (`path` plus e.g. ".60s").
+    """
+
+    SLOT = struct.Struct("<QqII")  # key hash, window index, current, previous
+
+    def __init__(self, limit: int, window: float, path: str, slots: int = 1 << 18, stripe_slots: int = 64):
+        super().__init__(limit, window)
+        self.stripe_slots = stripe_slots
+        self.stripes = max(1, slots // stripe_slots)
+        size = self.stripes * stripe_slots * self.SLOT.size
+        self.path = f"{path}.{_window_tag(window)}"
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        self._locks = [threading.Lock() for _ in range(min(self.stripes, 256))]
+
+    def _count(self, key, index, weight):
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+        stripe = digest % self.stripes
+        base = stripe * self.stripe_slots
+        start, length = base * self.SLOT.size, self.stripe_slots * self.SLOT.size
+        with self._locks[stripe % len(self._locks)]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, length, start)
+            try:
+                slot, free, stalest, stalest_window = None, None, None, None
+                for i in range(self.stripe_slots):
+                    offset = (base + (digest + i) % self.stripe_slots) * self.SLOT.size
+                    h, w, cur, prev = self.SLOT.unpack_from(self._map, offset)
+                    if h == digest:
+                        slot = offset
+                        break
+                    if free is None and (h == 0 or w < index - 1):
+                        free = offset
+                    if stalest_window is None or w < stalest_window:
+                        stalest, stalest_window = offset, w
+                    if h == 0:
+                        break  # never used, so the key can't be further along
+                if slot is None:
+                    slot, (w, cur, prev) = free if free is not None else stalest, (index, 0, 0)
+                if w != index:
+                    prev = cur if w == index - 1 else 0
+                    cur = 0
+                allowed = prev * weight + cur < self.limit
+                if allowed:
+                    cur += 1
+                self.SLOT.pack_into(self._map, slot, digest, index, cur, prev)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, length, start)
+        return allowed, cur, prev
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+
+class SQLiteBackend(RateLimitBackend):
+    """
+    Counters in a SQLite table in WAL mode, shared by every process that can
+    reach the file. Each check is a single UPSERT ... RETURNING, so the
+    read-modify-write is atomic without a separate transaction. Each window
+    length gets its own table (e.g. rate_limits_60s).
+    """
+
+    blocking = True
+
+    UPSERT = """
+        INSERT INTO {table} (key, win, cur, prev, allowed) VALUES (:key, :win, 1, 0, :limit > 0)
+        ON CONFLICT(key) DO UPDATE SET
+            win = :win,
+            prev = CASE WHEN win = :win THEN prev WHEN win = :win - 1 THEN cur ELSE 0 END,
+            cur = CASE WHEN win = :win THEN cur ELSE 0 END + (
+                (CASE WHEN win = :win THEN prev WHEN win = :win - 1 THEN cur ELSE 0 END) * :weight
+                + (CASE WHEN win = :win THEN cur ELSE 0 END) < :limit
+            ),
+            allowed = (CASE WHEN win = :win THEN prev WHEN win = :win - 1 THEN cur ELSE 0 END) * :weight
+                + (CASE WHEN win = :win THEN cur ELSE 0 END) < :limit
+        RETURNING allowed, cur, prev
+    """
+
+    def __init__(self, limit: int, window: float, path: str, prune_every: int = 10000):
+        super().__init__(limit, window)
+        self.path = path
+        self.prune_every = prune_every
+        self._hits = 0
+        self._local = threading.local()
+        self.table = f"rate_limits_{_window_tag(window)}"
+        self._upsert = self.UPSERT.format(table=self.table)
+        db = self._connection()
+        db.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} "
+            "(key TEXT PRIMARY KEY, win INTEGER, cur INTEGER, prev INTEGER, allowed INTEGER) WITHOUT ROWID"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def _count(self, key, index, weight):
+        db = self._connection()
+        allowed, cur, prev = db.execute(
+            self._upsert, {"key": key, "win": index, "weight": weight, "limit": self.limit}
+        ).fetchone()
+        self._hits += 1
+        if self._hits % self.prune_every == 0:
+            db.execute(f"DELETE FROM {self.table} WHERE win < ?", (index - 1,))
+        return bool(allowed), cur, prev
+
+
+class RedisBackend(RateLimitBackend):
+    """
+    Counters in Redis (or anything speaking its protocol), shared across
+    hosts. The roll-forward and conditional increment run in one Lua script,
+    so a check is a single EVALSHA round-trip; keys expire after two windows.
+    Keys are namespaced by window length (`prefix` plus e.g. "60s:").
+    """
+
+    blocking = True
+
+    SCRIPT = """
+        local state = redis.call('HMGET', KEYS[1], 'w', 'c', 'p')
+        local win = tonumber(ARGV[1])
+        local w, c, p = tonumber(state[1]), tonumber(state[2]) or 0, tonumber(state[3]) or 0
+        if w ~= win then
+            if w == win - 1 then p = c else p = 0 end
+            c = 0
+        end
+        local allowed = 0
+        if p * tonumber(ARGV[2]) + c < tonumber(ARGV[3]) then
+            c = c + 1
+            allowed = 1
+        end
+        redis.call('HSET', KEYS[1], 'w', win, 'c', c, 'p', p)
+        redis.call('EXPIRE', KEYS[1], ARGV[4])
+        return {allowed, c, p}
+    """
+
+    def __init__(self, limit: int, window: float, url: str = None, client=None, prefix: str = "ratelimit:"):
+        super().__init__(limit, window)
+        if client is None:
+            if not HAS_REDIS:
+                raise RuntimeError("The redis package is required for the redis rate limit backend")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = f"{prefix}{_window_tag(window)}:"
+        self.ttl = int(math.ceil(window * 2))
+        self._script = client.register_script(self.SCRIPT)
+
+    def _count(self, key, index, weight):
+        allowed, cur, prev = self._script(keys=[self.prefix + key], args=[index, repr(weight), self.limit, self.ttl])
+        return bool(allowed), int(cur), int(prev)
+
+    def close(self):
+        self.client.close()
+
+
+def build_backend(limit: int, window: float, kind: str = None, url: str = None) -> RateLimitBackend:
+    """
+    Backend from RATE_LIMIT_BACKEND (memory, mmap, sqlite, redis) and
+    RATE_LIMIT_URL (a file path for mmap/sqlite, a redis:// URL for redis).
+    """
+    kind = (kind or os.getenv("RATE_LIMIT_BACKEND", "memory")).lower()
+    url = url or os.getenv("RATE_LIMIT_URL")
+    if kind == "memory":
+        return MemoryBackend(limit, window)
+    if kind == "mmap":
+        return MmapBackend(limit, window, url or "/dev/shm/kanbanotion-ratelimit")
+    if kind == "sqlite":
+        return SQLiteBackend(limit, window, url or os.path.join(os.path.dirname(__file__), ".rate_limits.sqlite3"))
+    if kind == "redis":
+        return RedisBackend(limit, window, url or "redis://localhost:6379/0")
+    raise ValueError(f"Unknown rate limit backend: {kind}")
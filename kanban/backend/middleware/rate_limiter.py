@@ -1,53 +1,82 @@
-from fastapi import Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import JSONResponse
-from collections import defaultdict
-import time
-import threading
+from dataclasses import dataclass
+import asyncio
+import math
+import os
 
-# Thread-safe in-memory store (for single-worker dev/prod)
-_request_logs = defaultdict(list)
-_lock = threading.Lock()
+from .rate_limit_backends import RateLimitBackend, build_backend
 
 DAILY_LIMIT = 500
 WINDOW_SECONDS = 86400  # 24 hours
 
-def _get_client_identifier(request: Request) -> str:
+# Comma-separated "prefix=limit/window_seconds" rules; the longest matching prefix wins
+RATE_LIMIT_RULES = os.getenv("RATE_LIMIT_RULES", f"/api/chat={DAILY_LIMIT}/{WINDOW_SECONDS}")
+
+
+@dataclass
+class RateLimitRule:
+    prefix: str
+    limit: int
+    window: float
+    backend: RateLimitBackend
+
+
+def parse_rules(spec: str = RATE_LIMIT_RULES) -> list[RateLimitRule]:
+    # Counters are per-process by default; set RATE_LIMIT_BACKEND=mmap/sqlite/redis to share them
+    # between gunicorn workers (and hosts, for redis) so limits aren't multiplied by the worker count
+    rules = []
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        prefix, _, rate = part.partition("=")
+        limit, _, window = rate.partition("/")
+        if not prefix.startswith("/") or not limit.isdigit():
+            raise ValueError(f"Bad rate limit rule {part!r}; expected /prefix=limit/window_seconds")
+        window = float(window or WINDOW_SECONDS)
+        rules.append(RateLimitRule(prefix, int(limit), window, build_backend(int(limit), window)))
+    return sorted(rules, key=lambda r: len(r.prefix), reverse=True)
+
+
+def _get_client_identifier(scope) -> str:
     # Prefer session ID from header, fallback to IP
-    session_id = request.headers.get("X-Session-ID")
-    if session_id:
-        return f"session:{session_id}"
-    client_ip = request.client.host if request.client else "unknown"
-    return f"ip:{client_ip}"
-
-def _is_rate_limited(identifier: str) -> bool:
-    now = time.time()
-    with _lock:
-        # Clean expired requests
-        _request_logs[identifier] = [
-            ts for ts in _request_logs[identifier] if now - ts < WINDOW_SECONDS
-        ]
-        return len(_request_logs[identifier]) >= DAILY_LIMIT
-
-def _record_request(identifier: str):
-    with _lock:
-        _request_logs[identifier].append(time.time())
-
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Only apply to chat endpoints
-        if request.url.path.startswith("/api/chat"):
-            identifier = _get_client_identifier(request)
-            if _is_rate_limited(identifier):
-                return JSONResponse(
+    for name, value in scope["headers"]:
+        if name == b"x-session-id" and value:
+            return f"session:{value.decode('latin-1')}"
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class RateLimitMiddleware:
+    """
+    Raw ASGI rate limiting, answered with a 429 before routing.
+
+    Unlike a BaseHTTPMiddleware there is no extra task or response-stream
+    wrapping per request: allowed requests are passed straight through, so
+    streaming responses (/api/chat/stream) are untouched.
+    """
+
+    def __init__(self, app, rules: list[RateLimitRule] = None):
+        self.app = app
+        self.rules = rules if rules is not None else parse_rules()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        path = scope["path"]
+        rule = next((r for r in self.rules if path.startswith(r.prefix)), None)
+        if rule is not None:
+            key = f"{rule.prefix}|{_get_client_identifier(scope)}"
+            if rule.backend.blocking:
+                allowed, remaining, retry_after = await asyncio.to_thread(rule.backend.hit, key)
+            else:
+                allowed, remaining, retry_after = rule.backend.hit(key)
+            if not allowed:
+                response = JSONResponse(
                     status_code=429,
                     content={
                         "error": "Rate limit exceeded",
-                        "detail": f"Limit: {DAILY_LIMIT} requests per day",
-                        "reset": "in 24 hours"
-                    }
+                        "detail": f"Limit: {rule.limit} requests per {rule.window:g} seconds",
+                        "reset": f"in {math.ceil(retry_after)} seconds"
+                    },
+                    headers={"Retry-After": str(math.ceil(retry_after))},
                 )
-            _record_request(identifier)
-
-        response = await call_next(request)
-        return response
\ No newline at end of file
+                return await response(scope, receive, send)
+        await self.app(scope, receive, send)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, JSON, func, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, JSON, func, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from .db import Base
 
@@ -129,3 +129,47 @@ class ProductView(Base):
     viewed_at = Column(DateTime(timezone=True), server_default=func.now())
     user = relationship("User")
     product = relationship("Product")
+
+
+class UserChurnFeatures(Base):
+    """Per-user order features for churn scoring, kept current as orders change"""
+    __tablename__ = "user_churn_features"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    last_order_at = Column(DateTime(timezone=True), nullable=True)
+    # {"YYYY-MM-DD": [orders, total_cents, cancelled]} for the last 90 days
+    daily_buckets = Column(JSON, default={})
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class OutboxEvent(Base):
+    """Automation event waiting for (or done with) delivery to n8n; written in the caller's transaction"""
+    __tablename__ = "outbox_events"
+    id = Column(Integer, primary_key=True)
+    endpoint = Column(String(128), nullable=False)  # webhook path under N8N_WEBHOOK_BASE_URL
+    payload = Column(JSON, nullable=False)
+    status = Column(String(20), default="pending", index=True)  # pending, delivered, failed
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    lease_token = Column(String(32), nullable=True)  # set by the dispatcher that claimed it
+    last_error = Column(Text, nullable=True)
+    latency_ms = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    delivered_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class ScheduledJob(Base):
+    """A delayed @listen_for handler call; deleted once it has run"""
+    __tablename__ = "scheduled_jobs"
+    id = Column(Integer, primary_key=True)
+    event = Column(String(128), nullable=False)
+    handler = Column(String(255), nullable=False)  # "module:qualname" of the handler function
+    payload = Column(JSON, nullable=False)
+    run_at = Column(DateTime(timezone=True), nullable=False)
+    status = Column(String(20), default="pending")  # pending, running, failed
+    attempts = Column(Integer, default=0)
+    lease_token = Column(String(32), nullable=True)  # set by the worker that claimed it
+    locked_until = Column(DateTime(timezone=True), nullable=True)  # lease expiry; reclaimed after this
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (Index("ix_scheduled_jobs_status_run_at", "status", "run_at"),)
@@ -1,28 +1,46 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from ..db import get_db
 from .. import models
 from ..schemas import UserCreate, UserLogin, UserOut, TokenOut
-from ..auth import hash_password, verify_password, create_access_token, get_current_user
+from ..auth import ahash_password, averify_password, create_access_token, get_current_user
 
 router = APIRouter()
 
-@router.post("/register", response_model=UserOut)
-def register(body: UserCreate, db: Session = Depends(get_db)):
-    exists = db.query(models.User).filter(models.User.email == body.email).first()
-    if exists:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    user = models.User(email=body.email, password_hash=hash_password(body.password), role="customer")
+def _find_user(db: Session, email: str):
+    return db.query(models.User).filter(models.User.email == email).first()
+
+def _add_user(db: Session, user: models.User) -> models.User:
     db.add(user)
     db.commit()
     db.refresh(user)
     return user
 
+def _save_password_hash(db: Session, user: models.User, new_hash: str):
+    user.password_hash = new_hash
+    db.commit()
+
+# Hashing is awaited on the password pool; DB calls stay on the threadpool, off the event loop
+@router.post("/register", response_model=UserOut)
+async def register(body: UserCreate, db: Session = Depends(get_db)):
+    exists = await run_in_threadpool(_find_user, db, body.email)
+    if exists:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    user = models.User(email=body.email, password_hash=await ahash_password(body.password), role="customer")
+    return await run_in_threadpool(_add_user, db, user)
+
 @router.post("/login", response_model=TokenOut)
-def login(body: UserLogin, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == body.email).first()
-    if not user or not verify_password(body.password, user.password_hash):
+async def login(body: UserLogin, db: Session = Depends(get_db)):
+    user = await run_in_threadpool(_find_user, db, body.email)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    ok, new_hash = await averify_password(body.password, user.password_hash)
+    if not ok:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        # Work factor changed since this password was stored: upgrade it transparently
+        await run_in_threadpool(_save_password_hash, db, user, new_hash)
     token = create_access_token(user.email)
     return TokenOut(access_token=token)
 
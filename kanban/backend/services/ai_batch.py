@@ -0,0 +1,171 @@
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+BATCH_SYSTEM_PROMPT = (
+    "You process many independent items in one go. {instruction}\n"
+    "Each input line is a JSON object with an \"id\". Reply with ONLY a JSON object "
+    "that maps every id (as a string) to its result, and nothing else."
+)
+
+
+@dataclass
+class BatchResult:
+    """Per-item results of a batch run, plus throughput numbers."""
+
+    results: dict[str, Any] = field(default_factory=dict)
+    failed: list[str] = field(default_factory=list)
+    requests: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def items_per_sec(self) -> float:
+        return len(self.results) / self.elapsed if self.elapsed else 0.0
+
+
+def pack(items: dict[str, dict], size: int) -> list[dict[str, dict]]:
+    keys = list(items)
+    return [{k: items[k] for k in keys[i:i + size]} for i in range(0, len(keys), size)]
+
+
+def build_messages(instruction: str, group: dict[str, dict]) -> list[dict]:
+    lines = "\n".join(json.dumps({"id": key, **fields}, ensure_ascii=False, default=str) for key, fields in group.items())
+    return [
+        {"role": "system", "content": BATCH_SYSTEM_PROMPT.format(instruction=instruction.strip())},
+        {"role": "user", "content": f"Items:\n{lines}"},
+    ]
+
+
+def parse_reply(reply: str, group: dict[str, dict], validate: Callable[[Any], Any] | None) -> dict[str, Any]:
+    """Pulls the per-item results out of a reply; items that are missing or fail `validate` are left out."""
+    start, end = reply.find("{"), reply.rfind("}")
+    if start < 0 or end <= start:
+        return {}
+    try:
+        payload = json.loads(reply[start:end + 1])
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(payload, dict):
+        return {}
+
+    parsed = {}
+    for key in group:
+        if key not in payload:
+            continue
+        try:
+            parsed[key] = validate(payload[key]) if validate else payload[key]
+        except (TypeError, ValueError):
+            continue
+    return parsed
+
+
+class _BatchRun:
+    """Shared bookkeeping for the async and threaded drivers."""
+
+    def __init__(self, items: dict, instruction: str, pack_size: int, validate):
+        self.items = {str(k): v for k, v in items.items()}
+        self.instruction = instruction
+        self.pack_size = max(1, pack_size)
+        self.validate = validate
+        self.result = BatchResult()
+        self.dropped: dict[str, dict] = {}  # left out of an otherwise usable reply
+        self.unanswered: dict[str, dict] = {}  # their whole request failed or its reply was unusable
+        self.failed_requests = 0
+
+    def first_round(self) -> list[dict]:
+        return pack(self.items, self.pack_size)
+
+    def retry_round(self) -> list[dict]:
+        """
+        One more try for what the first round missed. Items a usable reply
+        dropped or garbled go on their own; items whose whole request failed
+        are packed again, since going one by one would multiply the requests
+        against a backend that is already failing. If every request failed,
+        the backend is down and nothing is retried.
+        """
+        if self.pack_size == 1 or self.failed_requests == self.result.requests:
+            return []
+        dropped, unanswered = self.dropped, self.unanswered
+        self.dropped, self.unanswered = {}, {}
+        return pack(dropped, 1) + pack(unanswered, self.pack_size)
+
+    def collect(self, group: dict, reply: str | Exception):
+        self.result.requests += 1
+        if isinstance(reply, Exception):
+            logger.warning(f"Batch request for {len(group)} items failed: {reply}")
+            self.failed_requests += 1
+            self.unanswered.update(group)
+            return
+        parsed = parse_reply(reply, group, self.validate)
+        self.result.results.update(parsed)
+        missing = {k: v for k, v in group.items() if k not in parsed}
+        (self.dropped if parsed else self.unanswered).update(missing)
+
+    def finish(self, started: float) -> BatchResult:
+        self.result.elapsed = time.perf_counter() - started
+        self.result.failed = [k for k in self.items if k not in self.result.results]
+        logger.info(
+            f"Batch of {len(self.items)} items: {len(self.result.results)} ok, {len(self.result.failed)} failed, "
+            f"{self.result.requests} requests, {self.result.items_per_sec:.1f} items/sec"
+        )
+        return self.result
+
+
+async def run_batch_async(
+    complete: Callable[[list[dict]], Awaitable[str]],
+    items: dict,
+    instruction: str,
+    pack_size: int = 10,
+    concurrency: int = 4,
+    validate: Callable[[Any], Any] | None = None,
+) -> BatchResult:
+    """Packs `items` into requests and runs at most `concurrency` of them at a time."""
+    run = _BatchRun(items, instruction, pack_size, validate)
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+
+    async def one(group: dict):
+        async with semaphore:
+            try:
+                reply = await complete(build_messages(run.instruction, group))
+            except Exception as e:
+                reply = e
+        run.collect(group, reply)
+
+    await asyncio.gather(*(one(g) for g in run.first_round()))
+    await asyncio.gather(*(one(g) for g in run.retry_round()))
+    return run.finish(started)
+
+
+def run_batch(
+    complete: Callable[[list[dict]], str],
+    items: dict,
+    instruction: str,
+    pack_size: int = 10,
+    concurrency: int = 4,
+    validate: Callable[[Any], Any] | None = None,
+) -> BatchResult:
+    """Blocking variant of `run_batch_async` for sync workflows, using a small thread pool."""
+    run = _BatchRun(items, instruction, pack_size, validate)
+    started = time.perf_counter()
+
+    def one(group: dict):
+        try:
+            return complete(build_messages(run.instruction, group))
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        groups = run.first_round()
+        for group, reply in zip(groups, pool.map(one, groups)):
+            run.collect(group, reply)
+        groups = run.retry_round()
+        for group, reply in zip(groups, pool.map(one, groups)):
+            run.collect(group, reply)
+    return run.finish(started)
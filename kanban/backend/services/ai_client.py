@@ -1,56 +1,261 @@
 import os
 import json
-from openai import OpenAI
+import asyncio
+from contextlib import nullcontext
+import httpx
+import numpy as np
 from dotenv import load_dotenv
 
+from .response_cache import ResponseCache
+from .single_flight import SingleFlight
+from .llm_scheduler import INTERACTIVE, BATCH, LLMScheduler, SchedulerFull
+from .ai_router import ModelRouter, OpenAICompatibleBackend, StubBackend
+from .ai_batch import BatchResult, run_batch, run_batch_async
+from ..config import settings
+
 # Load environment variables from .env file
 load_dotenv()
 
 class AIClient:
     """
     A client to interact with an Ollama server using the OpenAI-compatible API.
-    Enhanced for contextual and multi-project memory support.
+    Enhanced for contextual and multi-project memory support. Completions go
+    through a ModelRouter, which can fail over to other backends (Groq, stub).
     """
 
-    def __init__(self, model: str = "llama3.1:latest", temperature: float = 0.7, num_ctx: int = 4096):
-        # Initialize the Ollama-compatible OpenAI client
-        self.client = OpenAI(
-            base_url="http://localhost:11434/v1",
-            api_key="ollama",  # Any string works for local Ollama
+    def __init__(
+        self,
+        model: str = "llama3.1:latest",
+        temperature: float = 0.7,
+        num_ctx: int = 4096,
+        base_url: str = "http://localhost:11434/v1",
+        max_connections: int = 32,
+        keep_alive: str | int = os.getenv("OLLAMA_KEEP_ALIVE", "30m"),
+        cache: ResponseCache | None = None,
+        scheduler: LLMScheduler | None = None,
+        router: ModelRouter | None = None,
+    ):
+        # Async client for request handlers; one shared connection pool so
+        # concurrent chats overlap instead of blocking the event loop
+        self.http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(300.0, connect=5.0),
+        )
+        # The local Ollama server, reached through its OpenAI-compatible API
+        self.ollama = OpenAICompatibleBackend(
+            "ollama",
+            base_url=base_url,
+            model=model,
+            http=self.http,
+            timeout=httpx.Timeout(300.0, connect=5.0),
+            extra_body=lambda: {
+                # Some Ollama models (e.g., Llama3) respect num_ctx
+                "num_ctx": self.num_ctx,
+                "keep_alive": self.keep_alive,
+            },
         )
+        self.client = self.ollama.client
+        self.aclient = self.ollama.aclient
+        # Picks the backend for each completion; Ollama only unless configured otherwise
+        self.router = router or ModelRouter([self.ollama])
         self.model = model
         self.temperature = temperature
         self.num_ctx = num_ctx
+        # How long Ollama keeps the model (and its cached prompt prefix) loaded; -1 = forever
+        self.keep_alive = keep_alive
+        self.native_url = base_url.removesuffix("/v1")
+        self._pin_task: asyncio.Task | None = None
+        # Optional reply cache in front of the (non-streaming and streaming) completions
+        self.cache = cache
+        # Coalesces identical in-flight completions (see SingleFlight)
+        self.flight = SingleFlight()
+        # Concurrency cap and priority lanes for calls to the model server
+        self.scheduler = scheduler
         print(f"✅ AIClient initialized with model '{self.model}' (ctx={self.num_ctx}, temp={self.temperature})")
 
     # ----------------------------------------------------------------------
     # 1. Standard chat completion
     # ----------------------------------------------------------------------
-    def chat_completion(self, messages: list[dict], temperature: float | None = None) -> str:
+    def chat_completion(self, messages: list[dict], temperature: float | None = None, lane: str = INTERACTIVE) -> str:
         """
         Generates a chat completion using the configured Ollama model.
+        Blocking; use `achat_completion` from async code. `lane` is the
+        scheduler priority lane ("interactive" or "batch").
+        """
+        cached = self._cache_get(messages, temperature)
+        if cached is not None:
+            return cached
+
+        def generate() -> str:
+            reply = self.complete(messages, temperature, lane=lane)
+            self._cache_put(messages, temperature, reply)
+            return reply
+
+        try:
+            return self.flight.do_sync(self._flight_key(messages, temperature), generate)
+        except SchedulerFull:
+            raise
+        except Exception as e:
+            return self._failure_reply(e)
+
+    async def achat_completion(self, messages: list[dict], temperature: float | None = None, lane: str = INTERACTIVE) -> str:
+        """
+        Async variant of `chat_completion` that never blocks the event loop.
+        Raises `SchedulerFull` when the lane's queue is full.
         """
+        cached = await self._acache_get(messages, temperature)
+        if cached is not None:
+            return cached
+
+        async def generate() -> str:
+            reply = await self.acomplete(messages, temperature, lane=lane)
+            await self._acache_put(messages, temperature, reply)
+            return reply
+
+        # Identical prompts already being generated share that generation
         try:
-            completion = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=temperature or self.temperature,
-                extra_body={
-                    # Some Ollama models (e.g., Llama3) respect num_ctx
-                    "num_ctx": self.num_ctx
-                }
-            )
-            return completion.choices[0].message.content.strip()
+            return await self.flight.do(self._flight_key(messages, temperature), generate)
+        except SchedulerFull:
+            raise
         except Exception as e:
-            print(f"❌ Ollama API call failed: {e}")
-            print("---")
-            print(f"💡 Is the Ollama server running? (ollama serve)")
-            print(f"💡 Is '{self.model}' installed? (ollama list)")
-            print("---")
-            return "Sorry, I can't connect to the local AI service. Please ensure Ollama is running and the model is installed."
+            return self._failure_reply(e)
+
+    def complete(self, messages: list[dict], temperature: float | None = None, lane: str = INTERACTIVE) -> str:
+        """
+        Like `chat_completion`, but raises instead of returning the fallback reply.
+        """
+        with self._slot_sync(lane):
+            return self.router.complete(messages, temperature or self.temperature)
+
+    async def acomplete(self, messages: list[dict], temperature: float | None = None, lane: str = INTERACTIVE) -> str:
+        """
+        Like `achat_completion`, but raises instead of returning the fallback reply.
+        For background work whose output is stored (summaries, scores).
+        """
+        async with self._slot(lane):
+            return await self.router.acomplete(messages, temperature or self.temperature)
+
+    async def astream_chat_completion(self, messages: list[dict], temperature: float | None = None, lane: str = INTERACTIVE):
+        """
+        Yields content deltas as Ollama generates them, so callers can forward
+        the first tokens without waiting for the full completion. The scheduler
+        slot is held until the stream ends; `SchedulerFull` is raised before the
+        first token. A failure before any token yields the fallback reply; once
+        tokens have been sent it is raised, so callers never mistake a partial
+        answer followed by the fallback text for a complete reply.
+        """
+        cached = await self._acache_get(messages, temperature)
+        if cached is not None:
+            yield cached
+            return
+        parts = []
+        async with self._slot(lane):
+            try:
+                async for token in self.router.astream(messages, temperature or self.temperature):
+                    parts.append(token)
+                    yield token
+            except Exception as e:
+                if parts:
+                    print(f"❌ Ollama stream broke off after {len(parts)} tokens: {e}")
+                    raise
+                yield self._failure_reply(e)
+                return
+        await self._acache_put(messages, temperature, "".join(parts).strip())
+
+    def _slot(self, lane: str):
+        return self.scheduler.slot(lane) if self.scheduler else nullcontext()
+
+    def _slot_sync(self, lane: str):
+        return self.scheduler.slot_sync(lane) if self.scheduler else nullcontext()
+
+    def _cache_params(self, temperature: float | None) -> dict:
+        return {"model": self.model, "temperature": temperature or self.temperature, "num_ctx": self.num_ctx}
+
+    def _flight_key(self, messages: list[dict], temperature: float | None) -> str:
+        return ResponseCache.make_key(messages, self._cache_params(temperature))
+
+    def _cache_get(self, messages: list[dict], temperature: float | None) -> str | None:
+        if self.cache is None:
+            return None
+        return self.cache.get(messages, self._cache_params(temperature))
+
+    def _cache_put(self, messages: list[dict], temperature: float | None, reply: str):
+        # Only successful, non-empty completions are cached; fallback replies never are
+        if self.cache is not None and reply:
+            self.cache.put(messages, self._cache_params(temperature), reply)
+
+    async def _acache_get(self, messages: list[dict], temperature: float | None) -> str | None:
+        # The semantic level calls the embedding model; keep that off the event loop
+        if self.cache is not None and self.cache.embed is not None:
+            return await asyncio.to_thread(self._cache_get, messages, temperature)
+        return self._cache_get(messages, temperature)
+
+    async def _acache_put(self, messages: list[dict], temperature: float | None, reply: str):
+        if self.cache is not None and self.cache.embed is not None:
+            await asyncio.to_thread(self._cache_put, messages, temperature, reply)
+        else:
+            self._cache_put(messages, temperature, reply)
+
+    def _failure_reply(self, e: Exception) -> str:
+        print(f"❌ Ollama API call failed: {e}")
+        print("---")
+        print(f"💡 Is the Ollama server running? (ollama serve)")
+        print(f"💡 Is '{self.model}' installed? (ollama list)")
+        print("---")
+        return "Sorry, I can't connect to the local AI service. Please ensure Ollama is running and the model is installed."
+
+    def embed(self, texts: list[str], model: str = "nomic-embed-text") -> list[list[float]]:
+        """
+        Embeds texts with a local Ollama embedding model. Raises on failure.
+        """
+        response = self.client.embeddings.create(model=model, input=texts)
+        return [item.embedding for item in response.data]
 
     # ----------------------------------------------------------------------
-    # 2. Summarization helper
+    # 2. Prompt-prefix reuse (pinned session)
+    # ----------------------------------------------------------------------
+    async def prefill(self, prefix: list[dict], keep_alive: str | int | None = None) -> dict:
+        """
+        Evaluates `prefix` on Ollama's native API without generating, so the model
+        is loaded and the prefix's KV cache is warm for the next request that
+        starts with the byte-identical messages. Returns Ollama's timing stats.
+        """
+        response = await self.http.post(
+            f"{self.native_url}/api/chat",
+            json={
+                "model": self.model,
+                "messages": prefix,
+                "stream": False,
+                "keep_alive": self.keep_alive if keep_alive is None else keep_alive,
+                # Leave num_ctx at the model default: the /v1 endpoint can't set it, and a
+                # different value here would force a reload and throw the cache away
+                "options": {"num_predict": 1},
+            },
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def pin_prefix(self, prefix: list[dict], refresh_seconds: float = 240.0):
+        """
+        Pinned-session mode: keep the model resident (keep_alive=-1) and re-prefill
+        the static prefix periodically so it stays cached between chats. The refresh
+        also renews residency if a request without keep_alive reset Ollama's 5m default.
+        """
+        self.keep_alive = -1
+
+        async def keep_warm():
+            while True:
+                try:
+                    stats = await self.prefill(prefix)
+                    print(f"📌 Prompt prefix pinned ({stats.get('prompt_eval_count', 0)} tokens evaluated)")
+                except Exception as e:
+                    print(f"⚠️ Could not pin prompt prefix: {e}")
+                await asyncio.sleep(refresh_seconds)
+
+        self._pin_task = asyncio.create_task(keep_warm())
+
+    # ----------------------------------------------------------------------
+    # 3. Summarization helper
     # ----------------------------------------------------------------------
     def summarize(self, text: str, length: int = 100) -> str:
         """
@@ -60,13 +265,146 @@ class AIClient:
             {"role": "system", "content": "You are a concise summarization assistant."},
             {"role": "user", "content": f"Summarize the following text in under {length} words:\n{text}"}
         ]
-        return self.chat_completion(messages)
+        return self.chat_completion(messages, lane=BATCH)
+
+    async def asummarize(self, text: str, length: int = 100) -> str:
+        """
+        Async variant of `summarize`. Raises on failure, so an error reply is
+        never mistaken for a summary.
+        """
+        messages = [
+            {"role": "system", "content": "You are a concise summarization assistant."},
+            {"role": "user", "content": f"Summarize the following text in under {length} words:\n{text}"}
+        ]
+        return await self.acomplete(messages, lane=BATCH)
+
+    # ----------------------------------------------------------------------
+    # 4. Batch helpers for offline automation
+    # ----------------------------------------------------------------------
+    async def abatch_json(
+        self,
+        items: dict,
+        instruction: str,
+        pack_size: int = 10,
+        concurrency: int = 4,
+        validate=None,
+        temperature: float = 0.1,
+    ) -> BatchResult:
+        """
+        Runs one small structured prompt per item, `pack_size` items per request
+        and at most `concurrency` requests at a time, on the batch lane. `items`
+        maps an id to the item's fields; the model answers a JSON object keyed by
+        id. Results are parsed (and checked with `validate`) per item; items a
+        packed reply missed are retried alone. See `BatchResult` for throughput.
+        """
+        return await run_batch_async(
+            lambda messages: self.acomplete(messages, temperature, lane=BATCH),
+            items, instruction, pack_size=pack_size, concurrency=concurrency, validate=validate,
+        )
+
+    def batch_json(
+        self,
+        items: dict,
+        instruction: str,
+        pack_size: int = 10,
+        concurrency: int = 4,
+        validate=None,
+        temperature: float = 0.1,
+    ) -> BatchResult:
+        """Blocking variant of `abatch_json` for sync workflows."""
+        return run_batch(
+            lambda messages: self.complete(messages, temperature, lane=BATCH),
+            items, instruction, pack_size=pack_size, concurrency=concurrency, validate=validate,
+        )
+
+    async def aclose(self):
+        """Release the pooled async connections (called on app shutdown)."""
+        if self._pin_task:
+            self._pin_task.cancel()
+            self._pin_task = None
+        await self.router.aclose()
+        if self.ollama not in self.router.backends:
+            await self.ollama.aclose()
 
 # ----------------------------------------------------------------------
-# 3. Singleton factory (as before)
+# 5. Singleton factory (as before)
 # ----------------------------------------------------------------------
+def build_response_cache(ai_client: AIClient) -> ResponseCache | None:
+    """
+    Response cache configured from the environment:
+      AI_CACHE_ENABLED (default true), AI_CACHE_TTL seconds, AI_CACHE_SIZE entries,
+      AI_CACHE_PATH (SQLite file; empty keeps the cache in memory only),
+      AI_CACHE_DB_ROWS (row cap for that file, enforced every AI_CACHE_PURGE_INTERVAL seconds),
+      AI_CACHE_SEMANTIC_THRESHOLD (cosine similarity; unset disables the semantic level),
+      AI_CACHE_EMBEDDING_MODEL (Ollama model used by the semantic level).
+    """
+    if os.getenv("AI_CACHE_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+    default_path = os.path.join(os.path.dirname(__file__), ".response_cache.sqlite3")
+    threshold = os.getenv("AI_CACHE_SEMANTIC_THRESHOLD")
+    embed = None
+    if threshold:
+        model = os.getenv("AI_CACHE_EMBEDDING_MODEL", "nomic-embed-text")
+        embed = lambda texts: np.asarray(ai_client.embed(texts, model=model), dtype=np.float32)
+    return ResponseCache(
+        db_path=os.getenv("AI_CACHE_PATH", default_path) or None,
+        max_entries=int(os.getenv("AI_CACHE_SIZE", "1024")),
+        ttl_seconds=float(os.getenv("AI_CACHE_TTL", "3600")),
+        embed=embed,
+        similarity_threshold=float(threshold or 0.92),
+        max_db_rows=int(os.getenv("AI_CACHE_DB_ROWS", "100000")),
+        purge_interval=float(os.getenv("AI_CACHE_PURGE_INTERVAL", "300")),
+    )
+
+
+def build_scheduler() -> LLMScheduler:
+    """
+    LLM scheduler configured from the environment: LLM_MAX_CONCURRENCY (match
+    Ollama's OLLAMA_NUM_PARALLEL), LLM_QUEUE_INTERACTIVE and LLM_QUEUE_BATCH.
+    """
+    return LLMScheduler(
+        max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "2")),
+        queue_limits={
+            INTERACTIVE: int(os.getenv("LLM_QUEUE_INTERACTIVE", "32")),
+            BATCH: int(os.getenv("LLM_QUEUE_BATCH", "256")),
+        },
+    )
+
+
+def build_router(ai_client: AIClient) -> ModelRouter:
+    """
+    Model router over the backends named in settings.AI_BACKENDS (comma-separated,
+    from "ollama", "groq", "stub"). Groq is skipped while GROQ_API_KEY is unset.
+    """
+    backends = []
+    for name in (n.strip().lower() for n in settings.AI_BACKENDS.split(",")):
+        if name == "ollama":
+            backends.append(ai_client.ollama)
+        elif name == "groq" and settings.GROQ_API_KEY:
+            backends.append(OpenAICompatibleBackend(
+                "groq",
+                base_url=settings.GROQ_BASE_URL,
+                model=settings.GROQ_MODEL,
+                api_key=settings.GROQ_API_KEY,
+                timeout=httpx.Timeout(30.0, connect=3.0),
+            ))
+        elif name == "stub":
+            backends.append(StubBackend())
+        elif name and name != "groq":
+            raise ValueError(f"Unknown AI backend '{name}' in AI_BACKENDS")
+    return ModelRouter(
+        backends or [ai_client.ollama],
+        failure_threshold=settings.AI_CIRCUIT_FAILURES,
+        cooldown=settings.AI_CIRCUIT_COOLDOWN,
+    )
+
+
 def get_ai_client():
     """Factory function to get a singleton AI client instance."""
     if not hasattr(get_ai_client, "instance"):
-        get_ai_client.instance = AIClient()
+        client = AIClient()
+        client.router = build_router(client)
+        client.cache = build_response_cache(client)
+        client.scheduler = build_scheduler()
+        get_ai_client.instance = client
     return get_ai_client.instance
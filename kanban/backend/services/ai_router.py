@@ -0,0 +1,300 @@
+import hashlib
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+import httpx
+from openai import OpenAI, AsyncOpenAI
+
+
+class AllBackendsFailed(Exception):
+    """Every backend was unavailable (circuit open) or failed for this request."""
+
+
+# ----------------------------------------------------------------------
+# 1. Backends
+# ----------------------------------------------------------------------
+class OpenAICompatibleBackend:
+    """
+    A chat backend speaking the OpenAI API: Ollama's /v1 endpoint or Groq.
+    `extra_body` is called per request, so runtime changes (e.g. Ollama's
+    keep_alive in pinned-session mode) are picked up.
+    """
+
+    last_resort = False
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        model: str,
+        api_key: str = "ollama",
+        http: httpx.AsyncClient | None = None,
+        timeout: float | httpx.Timeout = 60.0,
+        extra_body: Callable[[], dict] | None = None,
+    ):
+        self.name = name
+        self.model = model
+        self.extra_body = extra_body or dict
+        self.client = OpenAI(base_url=base_url, api_key=api_key, timeout=timeout, max_retries=0)
+        self.aclient = AsyncOpenAI(base_url=base_url, api_key=api_key, http_client=http, timeout=timeout, max_retries=0)
+
+    def _args(self, messages: list[dict], temperature: float) -> dict:
+        return {"model": self.model, "messages": messages, "temperature": temperature, "extra_body": self.extra_body()}
+
+    def complete(self, messages: list[dict], temperature: float) -> str:
+        completion = self.client.chat.completions.create(**self._args(messages, temperature))
+        return completion.choices[0].message.content.strip()
+
+    async def acomplete(self, messages: list[dict], temperature: float) -> str:
+        completion = await self.aclient.chat.completions.create(**self._args(messages, temperature))
+        return completion.choices[0].message.content.strip()
+
+    async def astream(self, messages: list[dict], temperature: float):
+        stream = await self.aclient.chat.completions.create(**self._args(messages, temperature), stream=True)
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def aclose(self):
+        await self.aclient.close()
+
+
+class StubBackend:
+    """
+    Deterministic offline backend for tests and local development without a
+    model server: the reply depends only on the last user message. Only used
+    when every real backend is unavailable.
+    """
+
+    name = "stub"
+    last_resort = True
+
+    def complete(self, messages: list[dict], temperature: float) -> str:
+        question = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        digest = hashlib.sha1(question.encode("utf-8")).hexdigest()[:8]
+        return f"[stub {digest}] The AI model is offline. You asked: {question[:200]}"
+
+    async def acomplete(self, messages: list[dict], temperature: float) -> str:
+        return self.complete(messages, temperature)
+
+    async def astream(self, messages: list[dict], temperature: float):
+        yield self.complete(messages, temperature)
+
+    async def aclose(self):
+        pass
+
+
+# ----------------------------------------------------------------------
+# 2. Health tracking and circuit breaker
+# ----------------------------------------------------------------------
+LATENCY_METRICS = ("total", "ttft")
+
+
+class BackendHealth:
+    """
+    Rolling latency and error samples for one backend, plus its circuit state.
+    Latency is kept per metric: "total" time for completions and "ttft" (time
+    to first token) for streams, so neither skews the other's ranking.
+    """
+
+    def __init__(self, window: int = 100):
+        self.latencies: dict[str, deque[float]] = {metric: deque(maxlen=window) for metric in LATENCY_METRICS}
+        self.outcomes: deque[bool] = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.probing = False
+
+    def percentile(self, q: float, metric: str = "total") -> float | None:
+        samples = self.latencies[metric]
+        if len(samples) < 2:
+            return samples[0] if samples else None
+        return statistics.quantiles(samples, n=100)[int(q * 100) - 1]
+
+    def reset(self):
+        """Forget samples from before the circuit last opened."""
+        self.outcomes.clear()
+        for samples in self.latencies.values():
+            samples.clear()
+
+    @property
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+
+class ModelRouter:
+    """
+    Sends each request to the fastest healthy backend and fails over to the next.
+
+    Backends are ranked by rolling p95 latency on the metric that matters for
+    the call (total time for completions, time to first token for streams;
+    untried backends first, in
+    configured order, so they get measured). After `failure_threshold`
+    consecutive failures, or an error rate above `max_error_rate`, a backend's
+    circuit opens for `cooldown` seconds; then a single probe request decides
+    whether it closes again. Last-resort backends (the stub) are only tried
+    after every other backend.
+    """
+
+    def __init__(
+        self,
+        backends: list,
+        failure_threshold: int = 3,
+        max_error_rate: float = 0.5,
+        cooldown: float = 30.0,
+        window: int = 100,
+        min_samples: int = 5,
+    ):
+        if not backends:
+            raise ValueError("ModelRouter needs at least one backend")
+        self.backends = backends
+        self.failure_threshold = failure_threshold
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self.min_samples = min_samples
+        self.health = {b.name: BackendHealth(window) for b in backends}
+        self._lock = threading.Lock()
+
+    def ranked(self, metric: str = "total") -> list:
+        """Backends worth trying for the next request, best first by p95 `metric` latency."""
+        now = time.monotonic()
+        candidates = []
+        with self._lock:
+            for order, backend in enumerate(self.backends):
+                health = self.health[backend.name]
+                if health.open_until > now or health.probing:
+                    continue
+                measured = len(health.latencies[metric]) >= self.min_samples
+                p95 = health.percentile(0.95, metric) if measured else 0.0
+                candidates.append((backend.last_resort, p95, order, backend))
+        return [c[-1] for c in sorted(candidates, key=lambda c: c[:3])]
+
+    def _claim(self, backend) -> bool:
+        """A backend whose cooldown is over is half-open: exactly one request gets to probe it."""
+        with self._lock:
+            health = self.health[backend.name]
+            if not health.open_until:
+                return True
+            if health.probing or health.open_until > time.monotonic():
+                return False
+            health.probing = True
+            return True
+
+    def _release(self, backend):
+        """The call was cancelled (client went away): no outcome, but let another request probe."""
+        with self._lock:
+            self.health[backend.name].probing = False
+
+    def _record(self, backend, ok: bool, latency: float | None = None, metric: str = "total"):
+        with self._lock:
+            health = self.health[backend.name]
+            if ok and health.open_until:
+                # The probe closed the circuit: old failures must not count against it again
+                health.reset()
+                print(f"✅ Circuit closed for AI backend '{backend.name}'")
+            health.outcomes.append(ok)
+            health.probing = False
+            if ok:
+                health.latencies[metric].append(latency)
+                health.consecutive_failures = 0
+                health.open_until = 0.0
+                return
+            health.consecutive_failures += 1
+            tripped = health.consecutive_failures >= self.failure_threshold or (
+                len(health.outcomes) >= 10 and health.error_rate > self.max_error_rate
+            )
+            if tripped or health.open_until:
+                health.open_until = time.monotonic() + self.cooldown
+                print(f"⚡ Circuit open for AI backend '{backend.name}' ({self.cooldown:.0f}s)")
+
+    # ----------------------------------------------------------------------
+    # 3. Routed calls
+    # ----------------------------------------------------------------------
+    def complete(self, messages: list[dict], temperature: float) -> str:
+        errors = []
+        for backend in self.ranked():
+            if not self._claim(backend):
+                continue
+            started = time.perf_counter()
+            try:
+                reply = backend.complete(messages, temperature)
+            except Exception as e:
+                self._record(backend, ok=False)
+                errors.append(f"{backend.name}: {e}")
+                continue
+            except BaseException:
+                self._release(backend)
+                raise
+            self._record(backend, ok=True, latency=time.perf_counter() - started)
+            return reply
+        raise AllBackendsFailed("; ".join(errors) or "all AI backends are cooling down")
+
+    async def acomplete(self, messages: list[dict], temperature: float) -> str:
+        errors = []
+        for backend in self.ranked():
+            if not self._claim(backend):
+                continue
+            started = time.perf_counter()
+            try:
+                reply = await backend.acomplete(messages, temperature)
+            except Exception as e:
+                self._record(backend, ok=False)
+                errors.append(f"{backend.name}: {e}")
+                continue
+            except BaseException:
+                self._release(backend)
+                raise
+            self._record(backend, ok=True, latency=time.perf_counter() - started)
+            return reply
+        raise AllBackendsFailed("; ".join(errors) or "all AI backends are cooling down")
+
+    async def astream(self, messages: list[dict], temperature: float):
+        """Fails over until a backend produces its first token; errors after that are raised."""
+        errors = []
+        for backend in self.ranked("ttft"):
+            if not self._claim(backend):
+                continue
+            started = time.perf_counter()
+            stream = backend.astream(messages, temperature)
+            try:
+                first = await anext(stream, None)
+            except Exception as e:
+                self._record(backend, ok=False)
+                errors.append(f"{backend.name}: {e}")
+                continue
+            except BaseException:
+                self._release(backend)
+                raise
+            self._record(backend, ok=True, latency=time.perf_counter() - started, metric="ttft")
+            if first is not None:
+                yield first
+            async for token in stream:
+                yield token
+            return
+        raise AllBackendsFailed("; ".join(errors) or "all AI backends are cooling down")
+
+    def snapshot(self) -> dict:
+        """Per-backend p50/p95 latency (ms) per metric, error rate and circuit state."""
+        now = time.monotonic()
+        with self._lock:
+            report = {}
+            for backend in self.backends:
+                health = self.health[backend.name]
+                latency = {}
+                for metric in LATENCY_METRICS:
+                    for q in (0.5, 0.95):
+                        value = health.percentile(q, metric)
+                        latency[f"{metric}_p{int(q * 100)}_ms"] = round(value * 1000, 1) if value is not None else None
+                report[backend.name] = {
+                    **latency,
+                    "error_rate": round(health.error_rate, 3),
+                    "samples": len(health.outcomes),
+                    "circuit": "open" if health.open_until > now else ("half-open" if health.open_until else "closed"),
+                }
+            return report
+
+    async def aclose(self):
+        for backend in self.backends:
+            await backend.aclose()
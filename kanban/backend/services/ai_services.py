@@ -0,0 +1,42 @@
+# backend/services/ai_services.py
+
+from .ai_client import get_ai_client
+from .llm_scheduler import BATCH
+
+
+class AIService:
+    """
+    Blocking AI helpers for automation workflows (churn scoring, cart emails, pricing).
+
+    All calls go through the scheduler's batch lane, so they only use the model
+    when no interactive chat is waiting, and fail fast with `SchedulerFull`
+    when the batch queue is already full.
+    """
+
+    ANALYSIS_PROMPT = "You are a precise analytics assistant. Answer exactly in the format requested."
+    CONTENT_PROMPT = "You are an e-commerce copywriter. Follow the requested output format exactly."
+
+    @staticmethod
+    def quick_analysis(prompt: str) -> str:
+        """Short, low-temperature answer (scores, JSON) for a workflow decision"""
+        messages = [
+            {"role": "system", "content": AIService.ANALYSIS_PROMPT},
+            {"role": "user", "content": prompt.strip()},
+        ]
+        return get_ai_client().chat_completion(messages, temperature=0.1, lane=BATCH)
+
+    @staticmethod
+    def generate_content(prompt: str) -> str:
+        """Longer generated copy (emails, descriptions)"""
+        messages = [
+            {"role": "system", "content": AIService.CONTENT_PROMPT},
+            {"role": "user", "content": prompt.strip()},
+        ]
+        return get_ai_client().chat_completion(messages, lane=BATCH)
+
+    @staticmethod
+    def batch_analysis(items: dict, instruction: str, validate=None, pack_size: int = 10, concurrency: int = 4):
+        """Many small structured analyses packed into few requests; returns a `BatchResult`"""
+        return get_ai_client().batch_json(
+            items, instruction, pack_size=pack_size, concurrency=concurrency, validate=validate
+        )
@@ -1,7 +1,7 @@
  #updated by qwen3 
-import asyncio
 from typing import Optional
-from app.services.ai_client import get_ai_client  # ← uses the client we created
+from .ai_client import get_ai_client  # ← uses the client we created
+from .llm_scheduler import SchedulerFull
 
 # System prompt for e-commerce assistant
 SYSTEM_PROMPT = (
@@ -32,15 +32,13 @@ async def assistant_reply(user_input: str, user_email: Optional[str] = None) ->
             {"role": "user", "content": user_input}
         ]
 
-        # Since Ollama/Groq SDKs are synchronous, run in thread pool
-        loop = asyncio.get_event_loop()
-        reply = await loop.run_in_executor(
-            None,
-            ai_client.chat_completion,
-            messages
-        )
+        # Async completion shares the client's connection pool and keeps the event loop free
+        reply = await ai_client.achat_completion(messages)
         return reply
 
+    except SchedulerFull:
+        raise  # answered with 503 by the app's exception handler
+
     except Exception as e:
         error_msg = f"AI service error: {str(e)}"
         print(f"[AI Error] {error_msg}")  # Log to console
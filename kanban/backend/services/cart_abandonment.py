@@ -3,11 +3,11 @@
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, Any, List
-from app.db import get_db
-from app.models import User, Cart, CartItem, Product, ProductView
-from app.services.ai_services import AIService
-from app.services.email_svc import EmailService
-from app.automation.triggers.event_triggers import trigger_event, listen_for
+from ..db import get_db
+from ..models import User, Cart, CartItem, Product, ProductView
+from .ai_services import AIService
+from .email_svc import EmailService
+from ..automation.triggers.event_triggers import trigger_event, listen_for
 
 logger = logging.getLogger(__name__)
 
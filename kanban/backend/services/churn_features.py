@@ -0,0 +1,164 @@
+# backend/services/churn_features.py
+
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional
+
+from sqlalchemy import case, func
+
+from ..models import Order, UserChurnFeatures
+
+logger = logging.getLogger(__name__)
+
+WINDOW_DAYS = 90
+ORDERS, CENTS, CANCELLED = range(3)  # positions in a daily bucket
+
+
+class ChurnFeatureStore:
+    """
+    Incrementally maintained churn features, one row per user.
+
+    Orders are folded into daily buckets (count, spend, cancellations) for the
+    last 90 days, so the 30/60/90-day windows are sums over at most 90 small
+    buckets instead of a scan of the user's orders. Writes happen in the
+    caller's session, so features commit together with the order change.
+    """
+
+    @staticmethod
+    def _day(when: datetime) -> str:
+        if when.tzinfo:
+            when = when.astimezone(timezone.utc)
+        return when.date().isoformat()
+
+    @staticmethod
+    def _load(db, user_id: int) -> tuple[UserChurnFeatures, bool]:
+        """
+        The user's feature row, locked for update. A missing row is created and
+        backfilled from the orders table, so it already reflects this
+        transaction's pending order changes; returns (row, backfilled).
+        """
+        features = db.get(UserChurnFeatures, user_id, with_for_update=True)
+        if features is not None:
+            return features, False
+        db.flush()  # the backfill must see the order change being recorded
+        features = UserChurnFeatures(user_id=user_id, daily_buckets={})
+        ChurnFeatureStore._fill(features, ChurnFeatureStore._aggregate(db, user_id).get(user_id, []))
+        db.add(features)
+        db.flush()  # later lookups in this session (autoflush is off) must find it
+        return features, True
+
+    @staticmethod
+    def _aggregate(db, user_id: Optional[int] = None) -> Dict[int, list]:
+        """Daily (day, orders, cents, cancelled, last_created_at) rows per user for the last 90 days"""
+        since = datetime.utcnow() - timedelta(days=WINDOW_DAYS)
+        day = func.date(Order.created_at)
+        query = db.query(
+            Order.user_id,
+            day,
+            func.count(Order.id),
+            func.coalesce(func.sum(Order.total_cents), 0),
+            func.sum(case((Order.status == "cancelled", 1), else_=0)),
+            func.max(Order.created_at),
+        ).filter(Order.created_at >= since)
+        if user_id is not None:
+            query = query.filter(Order.user_id == user_id)
+        days: Dict[int, list] = {}
+        for uid, bucket_day, orders, cents, cancelled, last in query.group_by(Order.user_id, day):
+            days.setdefault(uid, []).append((str(bucket_day), orders, int(cents), int(cancelled or 0), last))
+        return days
+
+    @staticmethod
+    def _fill(features: UserChurnFeatures, days: list):
+        features.daily_buckets = {day: [orders, cents, cancelled] for day, orders, cents, cancelled, _ in days}
+        lasts = [last for *_, last in days if last is not None]
+        features.last_order_at = max(lasts, key=_naive_utc) if lasts else None
+
+    @staticmethod
+    def _update_bucket(db, user_id: int, when: datetime, orders: int = 0, cents: int = 0, cancelled: int = 0):
+        features, backfilled = ChurnFeatureStore._load(db, user_id)
+        if backfilled:
+            return features  # the change is already in the backfill
+        oldest = ChurnFeatureStore._day(datetime.utcnow() - timedelta(days=WINDOW_DAYS))
+        # Reassign (not mutate) the JSON so SQLAlchemy sees the change
+        buckets = {day: list(b) for day, b in (features.daily_buckets or {}).items() if day >= oldest}
+        day = ChurnFeatureStore._day(when)
+        if day >= oldest:
+            bucket = buckets.setdefault(day, [0, 0, 0])
+            bucket[ORDERS] += orders
+            bucket[CENTS] += cents
+            bucket[CANCELLED] = max(0, bucket[CANCELLED] + cancelled)
+        features.daily_buckets = buckets
+        return features
+
+    # ----------------------------------------------------------------------
+    # Order events
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def record_order(db, user_id: int, created_at: datetime, total_cents: int):
+        """A new order was placed"""
+        features = ChurnFeatureStore._update_bucket(db, user_id, created_at, orders=1, cents=total_cents)
+        if features.last_order_at is None or _naive_utc(created_at) > _naive_utc(features.last_order_at):
+            features.last_order_at = created_at
+
+    @staticmethod
+    def record_status_change(db, user_id: int, created_at: datetime, old_status: str, new_status: str):
+        """Keeps the cancellation count right when an order moves into or out of 'cancelled'"""
+        if (old_status == "cancelled") == (new_status == "cancelled"):
+            return
+        ChurnFeatureStore._update_bucket(db, user_id, created_at, cancelled=1 if new_status == "cancelled" else -1)
+
+    # ----------------------------------------------------------------------
+    # Reads
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def get_metrics(db, user_id: int, now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """
+        Churn metrics in the shape `ChurnPredictionService._get_user_metrics` returns,
+        or None if the user has no feature row yet (see `rebuild`).
+        """
+        features = db.query(UserChurnFeatures).filter(UserChurnFeatures.user_id == user_id).first()
+        if features is None:
+            return None
+
+        now = now or datetime.utcnow()
+        since = {d: ChurnFeatureStore._day(now - timedelta(days=d)) for d in (30, 60, 90)}
+        totals = {d: [0, 0, 0] for d in since}
+        for day, bucket in (features.daily_buckets or {}).items():
+            for d, first_day in since.items():
+                if day >= first_day:
+                    totals[d] = [a + b for a, b in zip(totals[d], bucket)]
+
+        orders_90d, cents_90d, cancelled_90d = totals[90]
+        last = features.last_order_at
+        recent = last is not None and ChurnFeatureStore._day(last) >= since[90]
+        return {
+            "total_orders": orders_90d,
+            "orders_last_30d": totals[30][ORDERS],
+            "orders_last_60d": totals[60][ORDERS],
+            "avg_order_value": cents_90d / 100 / orders_90d if orders_90d else 0,
+            "days_since_last_order": (now - _naive_utc(last)).days if recent else 999,
+            "total_spent": cents_90d / 100,
+            "order_frequency_declining": totals[30][ORDERS] < totals[60][ORDERS] - totals[30][ORDERS],
+            "has_cancelled_orders": cancelled_90d > 0,
+        }
+
+    @staticmethod
+    def rebuild(db, user_id: Optional[int] = None):
+        """Backfills feature rows from the orders table (all users, or one); rows with no recent orders are reset"""
+        days_by_user = ChurnFeatureStore._aggregate(db, user_id)
+        existing = db.query(UserChurnFeatures)
+        if user_id is not None:
+            existing = existing.filter(UserChurnFeatures.user_id == user_id)
+        rows = {f.user_id: f for f in existing.with_for_update()}
+        for uid in set(rows) | set(days_by_user):
+            features = rows.get(uid)
+            if features is None:
+                features = UserChurnFeatures(user_id=uid)
+                db.add(features)
+            ChurnFeatureStore._fill(features, days_by_user.get(uid, []))
+        db.commit()
+        logger.info(f"Rebuilt churn features for {len(days_by_user)} users ({len(set(rows) - set(days_by_user))} reset)")
+
+
+def _naive_utc(when: datetime) -> datetime:
+    return when.astimezone(timezone.utc).replace(tzinfo=None) if when.tzinfo else when
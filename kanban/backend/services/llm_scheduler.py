@@ -0,0 +1,175 @@
+import asyncio
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+
+class SchedulerFull(Exception):
+    """Raised when a lane's queue is at its limit; callers should answer 503."""
+
+    def __init__(self, lane: str, depth: int):
+        super().__init__(f"LLM queue '{lane}' is full ({depth} waiting)")
+        self.lane = lane
+        self.depth = depth
+
+
+class _Waiter:
+    """A queued caller: an asyncio future (event-loop callers) or a threading.Event (worker threads)."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop | None = None):
+        self.loop = loop
+        self.future = loop.create_future() if loop else None
+        self.event = None if loop else threading.Event()
+
+    def wake(self):
+        if self.loop:
+            self.loop.call_soon_threadsafe(self._resolve)
+        else:
+            self.event.set()
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class LLMScheduler:
+    """
+    Caps how many completions run against the model server at once.
+
+    Callers queue in priority lanes; a freed slot always goes to the oldest
+    waiter of the highest-priority non-empty lane, so interactive chat overtakes
+    batch jobs. Each lane has a queue-depth limit past which new work is rejected
+    immediately with `SchedulerFull` instead of waiting behind a long queue.
+    Works for both async callers and blocking callers in worker threads.
+    """
+
+    def __init__(self, max_concurrency: int = 2, queue_limits: dict[str, int] | None = None, samples: int = 512):
+        self.max_concurrency = max_concurrency
+        # Lane order is priority order
+        self.queue_limits = queue_limits or {INTERACTIVE: 32, BATCH: 256}
+        self._queues: dict[str, deque[_Waiter]] = {lane: deque() for lane in self.queue_limits}
+        self._running = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            lane: {
+                "submitted": 0, "rejected": 0, "completed": 0, "failed": 0,
+                "wait_ms": deque(maxlen=samples), "total_ms": deque(maxlen=samples),
+            }
+            for lane in self.queue_limits
+        }
+
+    # ----------------------------------------------------------------------
+    # 1. Slot handling
+    # ----------------------------------------------------------------------
+    def _enqueue(self, lane: str, loop: asyncio.AbstractEventLoop | None) -> _Waiter | None:
+        """Takes a free slot (returns None) or queues the caller (returns its waiter)."""
+        if lane not in self._queues:
+            raise ValueError(f"Unknown LLM lane '{lane}'")
+        with self._lock:
+            stats = self._stats[lane]
+            stats["submitted"] += 1
+            if self._running < self.max_concurrency and not any(self._queues.values()):
+                self._running += 1
+                return None
+            queue = self._queues[lane]
+            if len(queue) >= self.queue_limits[lane]:
+                stats["rejected"] += 1
+                raise SchedulerFull(lane, len(queue))
+            waiter = _Waiter(loop)
+            queue.append(waiter)
+            return waiter
+
+    def _release(self):
+        """Hands the slot straight to the next waiter, or frees it."""
+        with self._lock:
+            for queue in self._queues.values():
+                if queue:
+                    queue.popleft().wake()
+                    return
+            self._running -= 1
+
+    def _abandon(self, lane: str, waiter: _Waiter):
+        """A queued async caller was cancelled: leave the queue, or pass on a slot it was just given."""
+        with self._lock:
+            try:
+                self._queues[lane].remove(waiter)
+                return
+            except ValueError:
+                pass
+        self._release()
+
+    def _record(self, lane: str, queued_at: float, started_at: float, ok: bool):
+        now = time.perf_counter()
+        with self._lock:
+            stats = self._stats[lane]
+            stats["completed" if ok else "failed"] += 1
+            stats["wait_ms"].append((started_at - queued_at) * 1000)
+            stats["total_ms"].append((now - queued_at) * 1000)
+
+    # ----------------------------------------------------------------------
+    # 2. Public API
+    # ----------------------------------------------------------------------
+    @asynccontextmanager
+    async def slot(self, lane: str = INTERACTIVE):
+        """`async with scheduler.slot("batch"): ...` runs the body once a slot is free."""
+        queued_at = time.perf_counter()
+        waiter = self._enqueue(lane, asyncio.get_running_loop())
+        if waiter:
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                self._abandon(lane, waiter)
+                raise
+        started_at = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self._release()
+            self._record(lane, queued_at, started_at, ok)
+
+    @contextmanager
+    def slot_sync(self, lane: str = INTERACTIVE):
+        """Blocking variant of `slot` for code running in worker threads."""
+        queued_at = time.perf_counter()
+        waiter = self._enqueue(lane, None)
+        if waiter:
+            waiter.event.wait()
+        started_at = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self._release()
+            self._record(lane, queued_at, started_at, ok)
+
+    def snapshot(self) -> dict:
+        """Per-lane counters, queue depth and p50/p95 latencies (queue wait and total)."""
+        with self._lock:
+            lanes = {}
+            for lane, stats in self._stats.items():
+                lanes[lane] = {
+                    "queued": len(self._queues[lane]),
+                    "queue_limit": self.queue_limits[lane],
+                    **{k: stats[k] for k in ("submitted", "rejected", "completed", "failed")},
+                    "wait_ms": _percentiles(stats["wait_ms"]),
+                    "total_ms": _percentiles(stats["total_ms"]),
+                }
+            return {"running": self._running, "max_concurrency": self.max_concurrency, "lanes": lanes}
+
+
+def _percentiles(samples) -> dict:
+    if not samples:
+        return {"p50": None, "p95": None}
+    if len(samples) == 1:
+        only = round(samples[0], 1)
+        return {"p50": only, "p95": only}
+    cuts = statistics.quantiles(samples, n=20)
+    return {"p50": round(statistics.median(samples), 1), "p95": round(cuts[18], 1)}
@@ -2,9 +2,10 @@
 
 from typing import Dict, Any, List
 from datetime import datetime
-from app.models import Order, OrderItem
-from app.db import get_db
-from app.automation.triggers.event_triggers import trigger_event
+from ..models import Order, OrderItem
+from ..db import get_db
+from ..automation.triggers.event_triggers import trigger_event
+from .churn_features import ChurnFeatureStore
 import logging
 
 logger = logging.getLogger(__name__)
@@ -55,11 +56,10 @@ class OrderService:
                 )
                 db.add(order_item)
             
-            # Commit to database
-            db.commit()
-            db.refresh(order)
+            # Keep the user's churn features current, in the same transaction
+            ChurnFeatureStore.record_order(db, user_id, order.created_at, int(round(total_amount * 100)))
             
-            # 🚀 TRIGGER AUTOMATION EVENT
+            # 🚀 TRIGGER AUTOMATION EVENT (outbox row, committed with the order)
             trigger_event("order_created", {
                 "order_id": order.id,
                 "user_id": user_id,
@@ -67,7 +67,11 @@ class OrderService:
                 "items": items,
                 "status": order.status,
                 "created_at": str(order.created_at)
-            })
+            }, db=db)
+            
+            # Commit to database
+            db.commit()
+            db.refresh(order)
             
             logger.info(f"Order {order.id} created successfully for user {user_id}")
             return order
@@ -90,17 +94,18 @@ class OrderService:
             old_status = order.status
             order.status = new_status
             order.updated_at = datetime.utcnow()
+            ChurnFeatureStore.record_status_change(db, order.user_id, order.created_at, old_status, new_status)
             
-            db.commit()
-            db.refresh(order)
-            
-            # 🚀 TRIGGER AUTOMATION EVENT
+            # 🚀 TRIGGER AUTOMATION EVENT (outbox row, committed with the status change)
             trigger_event("order_status_changed", {
                 "order_id": order.id,
                 "old_status": old_status,
                 "new_status": new_status,
                 "user_id": order.user_id
-            })
+            }, db=db)
+            
+            db.commit()
+            db.refresh(order)
             
             logger.info(f"Order {order_id} status updated: {old_status} -> {new_status}")
             return order
@@ -123,20 +128,22 @@ class OrderService:
             if order.status in ['shipped', 'delivered', 'cancelled']:
                 raise ValueError(f"Cannot cancel order with status: {order.status}")
             
+            old_status = order.status
             order.status = 'cancelled'
             order.cancellation_reason = reason
             order.updated_at = datetime.utcnow()
+            ChurnFeatureStore.record_status_change(db, order.user_id, order.created_at, old_status, 'cancelled')
             
-            db.commit()
-            db.refresh(order)
-            
-            # 🚀 TRIGGER AUTOMATION EVENT
+            # 🚀 TRIGGER AUTOMATION EVENT (outbox row, committed with the cancellation)
             trigger_event("order_cancelled", {
                 "order_id": order.id,
                 "user_id": order.user_id,
                 "reason": reason,
                 "refund_amount": float(order.total_amount)
-            })
+            }, db=db)
+            
+            db.commit()
+            db.refresh(order)
             
             logger.info(f"Order {order_id} cancelled. Reason: {reason}")
             return order
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+_COST = re.compile(rb"^\$2[abxy]?\$(\d{2})\$")
+
+
+class HasherBusy(Exception):
+    """Raised instead of queueing when too many password hashes are already pending."""
+
+    def __init__(self, pending: int):
+        super().__init__(f"{pending} password hashes pending")
+        self.pending = pending
+
+
+# ----------------------------------------------------------------------
+# 1. Work done in the worker processes (module-level so it pickles)
+# ----------------------------------------------------------------------
+def _secret(password: str) -> bytes:
+    # bcrypt only uses the first 72 bytes; passlib truncated silently, so keep existing hashes valid
+    return password.encode("utf-8")[:72]
+
+
+def hash_password_sync(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(_secret(password), bcrypt.gensalt(rounds)).decode("ascii")
+
+
+def verify_and_update_sync(password: str, hash_: str, rounds: int) -> tuple[bool, Optional[str]]:
+    """
+    (matches, new_hash). `new_hash` is set when the password matched but the
+    stored hash uses a different work factor than `rounds`.
+    """
+    stored = (hash_ or "").encode("ascii", "ignore")
+    cost = _COST.match(stored)
+    if cost is None:
+        return False, None
+    try:
+        if not bcrypt.checkpw(_secret(password), stored):
+            return False, None
+    except ValueError:
+        return False, None
+    if int(cost.group(1)) != rounds:
+        return True, hash_password_sync(password, rounds)
+    return True, None
+
+
+# ----------------------------------------------------------------------
+# 2. Executor
+# ----------------------------------------------------------------------
+class PasswordHasher:
+    """
+    bcrypt on a dedicated process pool.
+
+    Hashing is deliberately slow (~250 ms), so doing it on FastAPI's shared
+    threadpool lets a login spike starve every other sync endpoint. Here it
+    runs in `workers` separate processes (using several cores, outside the
+    GIL), at most `max_pending` at a time; beyond that callers get
+    `HasherBusy` right away instead of waiting behind the backlog.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 64, rounds: int = 12):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.pending = 0
+        self.stats = {"hashed": 0, "verified": 0, "rehashed": 0, "rejected": 0}
+        self._pool: ProcessPoolExecutor | None = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: the workers only import this module, not the app (or its threads)
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def _submit(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.stats["rejected"] += 1
+            raise HasherBusy(self.pending)
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor(), fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        result = await self._submit(hash_password_sync, password, self.rounds)
+        self.stats["hashed"] += 1
+        return result
+
+    async def verify_and_update(self, password: str, hash_: str) -> tuple[bool, Optional[str]]:
+        """Checks the password; returns a replacement hash if the work factor changed."""
+        ok, new_hash = await self._submit(verify_and_update_sync, password, hash_, self.rounds)
+        self.stats["verified"] += 1
+        if new_hash:
+            self.stats["rehashed"] += 1
+        return ok, new_hash
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "pending": self.pending, "workers": self.workers, "max_pending": self.max_pending}
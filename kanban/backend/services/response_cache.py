@@ -0,0 +1,210 @@
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _normalize(text: str) -> str:
+    return _WHITESPACE_RE.sub(" ", text).strip().casefold()
+
+
+class ResponseCache:
+    """
+    Two-level cache for LLM replies.
+
+    Exact level: SHA-256 of the normalized message list plus model params, kept
+    in an in-memory LRU with TTL and, optionally, a SQLite table that survives
+    restarts. Semantic level (optional): when `embed` is given, a miss falls back
+    to the most similar earlier *last user message* with an identical preceding
+    conversation, if cosine similarity >= `similarity_threshold`.
+
+    Every level is bounded: the memory LRU and the semantic vectors (across all
+    prefixes, least recently used prefix evicted first) hold at most
+    `max_entries` each, and the SQLite table is swept of expired rows and
+    trimmed to `max_db_rows` every `purge_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600,
+        embed: Optional[Callable[[list[str]], np.ndarray]] = None,
+        similarity_threshold: float = 0.92,
+        max_db_rows: int = 100_000,
+        purge_interval: float = 300,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+        self.max_db_rows = max_db_rows
+        self.purge_interval = purge_interval
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0}
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        # prefix hash -> list of (expires_at, unit vector, reply), least recently used prefix first
+        self._semantic: OrderedDict[str, list[tuple[float, np.ndarray, str]]] = OrderedDict()
+        self._semantic_size = 0
+        self._next_purge = 0.0
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache "
+                "(key TEXT PRIMARY KEY, reply TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS ix_response_cache_expires_at ON response_cache (expires_at)")
+            self._purge(time.time())
+
+    @staticmethod
+    def make_key(messages: list[dict], params: dict) -> str:
+        normalized = [(m["role"], _normalize(m["content"])) for m in messages]
+        payload = json.dumps({"messages": normalized, "params": params}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # ----------------------------------------------------------------------
+    # Lookup
+    # ----------------------------------------------------------------------
+    def get(self, messages: list[dict], params: dict) -> Optional[str]:
+        key = self.make_key(messages, params)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[0] > now:
+                self._memory.move_to_end(key)
+                self.stats["exact_hits"] += 1
+                return entry[1]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT reply, expires_at FROM response_cache WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+                if row:
+                    self._remember(key, row[0], row[1])
+                    self.stats["exact_hits"] += 1
+                    return row[0]
+
+        reply = self._semantic_get(messages, params, now)
+        with self._lock:
+            if reply is not None:
+                self.stats["semantic_hits"] += 1
+            else:
+                self.stats["misses"] += 1
+        return reply
+
+    def _semantic_get(self, messages: list[dict], params: dict, now: float) -> Optional[str]:
+        if self.embed is None or not messages or messages[-1]["role"] != "user":
+            return None
+        prefix = self._prefix_key(messages, params)
+        with self._lock:
+            candidates = [c for c in self._semantic.get(prefix, []) if c[0] > now]
+            if candidates:
+                self._semantic.move_to_end(prefix)
+        if not candidates:
+            return None
+        try:
+            query = self._unit(self.embed([messages[-1]["content"]])[0])
+        except Exception as e:
+            logger.warning(f"Semantic cache lookup skipped, embedding failed: {e}")
+            return None
+        scores = np.stack([vector for _, vector, _ in candidates]) @ query
+        best = int(np.argmax(scores))
+        return candidates[best][2] if scores[best] >= self.similarity_threshold else None
+
+    # ----------------------------------------------------------------------
+    # Store
+    # ----------------------------------------------------------------------
+    def put(self, messages: list[dict], params: dict, reply: str):
+        key = self.make_key(messages, params)
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        with self._lock:
+            if now >= self._next_purge:
+                self._purge(now)
+            self._remember(key, reply, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO response_cache (key, reply, expires_at) VALUES (?, ?, ?)",
+                    (key, reply, expires_at),
+                )
+            self.stats["stores"] += 1
+
+        if self.embed is not None and messages and messages[-1]["role"] == "user":
+            try:
+                vector = self._unit(self.embed([messages[-1]["content"]])[0])
+            except Exception as e:
+                logger.warning(f"Semantic cache store skipped, embedding failed: {e}")
+                return
+            prefix = self._prefix_key(messages, params)
+            with self._lock:
+                bucket = self._semantic.pop(prefix, [])
+                self._semantic_size -= len(bucket)
+                bucket = [c for c in bucket if c[0] > now]
+                bucket.append((expires_at, vector, reply))
+                bucket = bucket[-self.max_entries:]
+                self._semantic[prefix] = bucket
+                self._semantic_size += len(bucket)
+                while self._semantic_size > self.max_entries:
+                    _, evicted = self._semantic.popitem(last=False)
+                    self._semantic_size -= len(evicted)
+
+    def _remember(self, key: str, reply: str, expires_at: float):
+        self._memory[key] = (expires_at, reply)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _purge(self, now: float):
+        """Drops expired semantic vectors and expired/excess SQLite rows. Caller holds the lock."""
+        self._next_purge = now + self.purge_interval
+        for prefix in list(self._semantic):
+            bucket = self._semantic[prefix]
+            live = [c for c in bucket if c[0] > now]
+            self._semantic_size -= len(bucket) - len(live)
+            if live:
+                self._semantic[prefix] = live
+            else:
+                del self._semantic[prefix]
+        if self._db is not None:
+            self._db.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,))
+            # Keep the rows that live longest (the most recently stored)
+            self._db.execute(
+                "DELETE FROM response_cache WHERE key IN "
+                "(SELECT key FROM response_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_db_rows,),
+            )
+
+    def _prefix_key(self, messages: list[dict], params: dict) -> str:
+        return self.make_key(messages[:-1], params)
+
+    @staticmethod
+    def _unit(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def snapshot(self) -> dict:
+        """Hit/miss counters plus current sizes, for the metrics endpoint."""
+        with self._lock:
+            lookups = self.stats["exact_hits"] + self.stats["semantic_hits"] + self.stats["misses"]
+            hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+            return {
+                **self.stats,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "semantic_entries": self._semantic_size,
+                "semantic_prefixes": len(self._semantic),
+            }
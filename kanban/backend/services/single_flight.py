@@ -0,0 +1,66 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Collapses identical concurrent calls into one.
+
+    The first caller for a key runs the work; callers arriving with the same key
+    while it is still running wait for that result instead of starting their own.
+    Results are not kept after the call finishes (that's the response cache's job).
+    """
+
+    def __init__(self):
+        self.stats = {"calls": 0, "coalesced": 0}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._futures: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Async variant: followers await the leader's task."""
+        with self._lock:
+            self.stats["calls"] += 1
+            task = self._tasks.get(key)
+            if task is not None:
+                self.stats["coalesced"] += 1
+            else:
+                task = asyncio.ensure_future(fn())
+                self._tasks[key] = task
+                task.add_done_callback(lambda _: self._forget(self._tasks, key, task))
+        # Shielded, so one caller disconnecting doesn't cancel the generation for the rest
+        return await asyncio.shield(task)
+
+    def do_sync(self, key: str, fn: Callable[[], T]) -> T:
+        """Blocking variant for threads: followers wait on the leader's future."""
+        with self._lock:
+            self.stats["calls"] += 1
+            future = self._futures.get(key)
+            leader = future is None
+            if leader:
+                future = self._futures[key] = Future()
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            self._forget(self._futures, key, future)
+        return future.result()
+
+    def _forget(self, flights: dict, key: str, flight):
+        with self._lock:
+            if flights.get(key) is flight:
+                del flights[key]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "in_flight": len(self._tasks) + len(self._futures)}
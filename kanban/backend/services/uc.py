@@ -24,6 +24,11 @@ def run_scheduled_jobs():
         else:
             logger.info("Dynamic pricing not available, skipping...")
             
+        # Run delayed event handlers that are due (when no in-process worker is running them)
+        from ..automation.triggers.event_triggers import delayed_jobs
+        ran = delayed_jobs.run_due()
+        logger.info(f"Ran {ran} due delayed jobs.")
+
         # Add other scheduled jobs here
         logger.info("All scheduled jobs completed successfully.")
         
@@ -0,0 +1,103 @@
+"""
+Requests per second through the rate-limit middleware, BaseHTTPMiddleware vs raw ASGI.
+
+Runs a minimal FastAPI app in-process (httpx ASGITransport, no sockets) so
+the numbers reflect middleware overhead rather than the network. "base http"
+is the previous RateLimitMiddleware (a BaseHTTPMiddleware subclass) over the
+same counter backend; "asgi" is the current one, alone and together with
+RequestMetricsMiddleware.
+
+    cd kanban && python -m benchmarks.bench_middleware --requests 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+
+from backend.middleware.metrics import RequestMetrics, RequestMetricsMiddleware
+from backend.middleware.rate_limit_backends import MemoryBackend
+from backend.middleware.rate_limiter import RateLimitMiddleware, RateLimitRule
+
+LIMIT = 10 ** 9  # never reject: measure the cost of the check, not of 429s
+
+
+class BaseHTTPRateLimitMiddleware(BaseHTTPMiddleware):
+    """The previous implementation, kept here as the baseline."""
+
+    def __init__(self, app, backend):
+        super().__init__(app)
+        self.backend = backend
+
+    async def dispatch(self, request, call_next):
+        if request.url.path.startswith("/api/chat"):
+            session_id = request.headers.get("X-Session-ID")
+            identifier = f"session:{session_id}" if session_id else f"ip:{request.client.host}"
+            allowed, _, _ = self.backend.hit(identifier)
+            if not allowed:
+                return JSONResponse(status_code=429, content={"error": "Rate limit exceeded"})
+        return await call_next(request)
+
+
+def build_app(stack: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/chat/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.get("/api/chat/stream")
+    async def stream():
+        async def chunks():
+            for i in range(10):
+                yield f"data: {i}\n\n"
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    if stack == "base http":
+        app.add_middleware(BaseHTTPRateLimitMiddleware, backend=MemoryBackend(LIMIT, 86400))
+    elif stack.startswith("asgi"):
+        app.add_middleware(RateLimitMiddleware, rules=[RateLimitRule("/api/chat", LIMIT, 86400, MemoryBackend(LIMIT, 86400))])
+        if stack == "asgi + metrics":
+            app.add_middleware(RequestMetricsMiddleware, registry=RequestMetrics())
+    return app
+
+
+async def run(stack: str, path: str, requests: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=build_app(stack))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        remaining = iter(range(requests))
+
+        async def worker(n: int):
+            headers = {"X-Session-ID": f"bench-{n}"}
+            for _ in remaining:
+                response = await client.get(path, headers=headers)
+                response.raise_for_status()
+
+        await client.get(path)  # warm up routing and imports
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+        return requests / (time.perf_counter() - started)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    stacks = ["none", "base http", "asgi", "asgi + metrics"]
+    print(f"{'middleware':<16}{'json req/s':>14}{'stream req/s':>16}")
+    results = {}
+    for stack in stacks:
+        json_rps = await run(stack, "/api/chat/ping", args.requests, args.concurrency)
+        stream_rps = await run(stack, "/api/chat/stream", args.requests, args.concurrency)
+        results[stack] = json_rps
+        print(f"{stack:<16}{json_rps:>14.0f}{stream_rps:>16.0f}")
+    print(f"asgi vs base http: {results['asgi'] / results['base http']:.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
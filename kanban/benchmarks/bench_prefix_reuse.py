@@ -0,0 +1,68 @@
+"""
+Prefill time for chat prompts with and without prompt-prefix reuse.
+
+Sends the Koby system prompt plus a short question to a running Ollama,
+reading Ollama's own prompt_eval stats. "reuse" keeps the system prompt
+byte-identical (as chat_api does); "no reuse" prepends a random nonce so
+every request has to prefill the full prompt again.
+
+    cd kanban && python -m benchmarks.bench_prefix_reuse --runs 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import uuid
+
+from backend.services.ai_client import AIClient
+
+KANBAN_PATH = os.path.join(os.path.dirname(__file__), "..", "backend", "chat", "kanbanotion.txt")
+QUESTIONS = [
+    "What should I work on next?",
+    "Summarize the blueprint for the restaurant site.",
+    "How do I structure the kanban columns?",
+    "Give me a checklist for launching the landing page.",
+    "Which tasks are blocked right now?",
+]
+
+
+async def run(client: AIClient, system_prompt: str, runs: int, reuse: bool):
+    durations, evaluated = [], []
+    if reuse:
+        await client.prefill([{"role": "system", "content": system_prompt}])
+    for i in range(runs):
+        content = system_prompt if reuse else f"[session {uuid.uuid4().hex}]\n{system_prompt}"
+        stats = await client.prefill([
+            {"role": "system", "content": content},
+            {"role": "user", "content": QUESTIONS[i % len(QUESTIONS)]},
+        ])
+        durations.append(stats.get("prompt_eval_duration", 0) / 1e6)
+        evaluated.append(stats.get("prompt_eval_count", 0))
+    return statistics.median(durations), statistics.median(evaluated)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--model", default="llama3.1:latest")
+    args = parser.parse_args()
+
+    with open(KANBAN_PATH, "r", encoding="utf-8") as f:
+        system_prompt = f.read()
+
+    client = AIClient(model=args.model)
+    try:
+        cold_ms, cold_tokens = await run(client, system_prompt, args.runs, reuse=False)
+        warm_ms, warm_tokens = await run(client, system_prompt, args.runs, reuse=True)
+    finally:
+        await client.aclose()
+
+    print(f"{'mode':<12}{'median prefill (ms)':>22}{'tokens evaluated':>20}")
+    print(f"{'no reuse':<12}{cold_ms:>22.1f}{cold_tokens:>20.0f}")
+    print(f"{'reuse':<12}{warm_ms:>22.1f}{warm_tokens:>20.0f}")
+    if warm_ms:
+        print(f"speedup: {cold_ms / warm_ms:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -10,6 +10,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const resetChatBtn = document.getElementById('reset-chat-btn');
     
     const backendUrl = 'http://127.0.0.1:8000/api/chat';
+    const streamUrl = 'http://127.0.0.1:8000/api/chat/stream';
     const resetUrl = 'http://127.0.0.1:8000/api/chat/reset';
 
     // --- MARKDOWN & CODE FORMATTING FUNCTIONS ---
@@ -215,7 +216,7 @@ document.addEventListener('DOMContentLoaded', () => {
         try {
             console.log('📤 Sending message:', userMessage);
             
-            const response = await fetch(backendUrl, {
+            const response = await fetch(streamUrl, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ message: userMessage }),
@@ -225,10 +226,29 @@ document.addEventListener('DOMContentLoaded', () => {
                 throw new Error(`HTTP error! Status: ${response.status}`);
             }
 
-            const data = await response.json();
-            console.log('📥 Received response:', data);
-            
-            addMessage(data.reply, 'ai');
+            // Render tokens as they arrive (server-sent events)
+            const bubble = addMessage('', 'ai');
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let reply = '';
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                const events = buffer.split('\n\n');
+                buffer = events.pop();
+                for (const event of events) {
+                    const dataLine = event.split('\n').find(line => line.startsWith('data: '));
+                    if (!dataLine || event.startsWith('event: done')) continue;
+                    reply += JSON.parse(dataLine.slice(6)).token;
+                    bubble.innerHTML = formatMessage(reply);
+                    chatMessages.scrollTop = chatMessages.scrollHeight;
+                }
+            }
+            console.log('📥 Received response:', reply.substring(0, 50) + '...');
         } catch (error) {
             console.error("❌ Error communicating with backend:", error);
             addMessage("Sorry, I can't connect to the server. Please check your backend is running.", 'ai');
@@ -261,6 +281,7 @@ function addMessage(text, sender) {
     chatMessages.scrollTop = chatMessages.scrollHeight;
     
     console.log(`✅ Message added (${sender}):`, text.substring(0, 50) + '...');
+    return bubble;
 }
 
     // --- MOBILE DETECTION ---
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from backend.services.ai_client import AIClient
+from backend.services.ai_router import ModelRouter
+from backend.services.response_cache import ResponseCache
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+class BrokenStreamBackend:
+    """Sends `tokens`, then fails with `error` (if any)."""
+
+    name = "broken"
+    last_resort = False
+
+    def __init__(self, tokens: list[str], error: Exception | None = None):
+        self.tokens = tokens
+        self.error = error
+
+    async def astream(self, messages, temperature):
+        for token in self.tokens:
+            yield token
+        if self.error is not None:
+            raise self.error
+
+    async def aclose(self):
+        pass
+
+
+def _client(backend) -> AIClient:
+    return AIClient(router=ModelRouter([backend]), cache=ResponseCache())
+
+
+async def _collect(client: AIClient) -> list[str]:
+    return [token async for token in client.astream_chat_completion(MESSAGES)]
+
+
+def test_failure_before_the_first_token_yields_the_fallback_reply():
+    client = _client(BrokenStreamBackend([], ConnectionError("refused")))
+    tokens = asyncio.run(_collect(client))
+    assert len(tokens) == 1 and tokens[0].startswith("Sorry")
+
+
+def test_failure_mid_stream_is_raised_and_not_cached():
+    client = _client(BrokenStreamBackend(["Hel", "lo"], ConnectionError("reset")))
+    sent = []
+
+    async def main():
+        async for token in client.astream_chat_completion(MESSAGES):
+            sent.append(token)
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(main())
+    assert sent == ["Hel", "lo"]
+    assert client.cache.stats["stores"] == 0
+
+
+def test_complete_stream_is_cached():
+    client = _client(BrokenStreamBackend(["Hel", "lo"]))
+    assert asyncio.run(_collect(client)) == ["Hel", "lo"]
+    assert asyncio.run(_collect(client)) == ["Hello"]
@@ -0,0 +1,157 @@
+import asyncio
+import time
+
+import pytest
+
+from backend.services.ai_router import AllBackendsFailed, ModelRouter, StubBackend
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+class FakeBackend:
+    last_resort = False
+
+    def __init__(self, name: str):
+        self.name = name
+        self.healthy = True
+        self.calls = 0
+        self.gate: asyncio.Event | None = None
+
+    def _reply(self):
+        if not self.healthy:
+            raise ConnectionError("down")
+        return self.name
+
+    def complete(self, messages, temperature):
+        self.calls += 1
+        return self._reply()
+
+    async def acomplete(self, messages, temperature):
+        self.calls += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        return self._reply()
+
+    async def astream(self, messages, temperature):
+        yield await self.acomplete(messages, temperature)
+
+
+def _expire_cooldown(router: ModelRouter, name: str):
+    router.health[name].open_until = time.monotonic() - 1
+
+
+def test_failures_open_the_circuit_and_fail_over():
+    primary = FakeBackend("primary")
+    router = ModelRouter([primary, StubBackend()], failure_threshold=3, cooldown=60)
+    primary.healthy = False
+    for _ in range(3):
+        assert router.complete(MESSAGES, 0.2).startswith("[stub")
+    assert router.snapshot()["primary"]["circuit"] == "open"
+
+    router.complete(MESSAGES, 0.2)
+    assert primary.calls == 3  # skipped while open
+
+
+def test_half_open_probe_closes_or_reopens_the_circuit():
+    primary = FakeBackend("primary")
+    router = ModelRouter([primary, StubBackend()], failure_threshold=1, cooldown=60)
+    primary.healthy = False
+    router.complete(MESSAGES, 0.2)
+
+    _expire_cooldown(router, "primary")
+    router.complete(MESSAGES, 0.2)  # the probe fails: open again for a full cooldown
+    assert router.health["primary"].open_until > time.monotonic() + 30
+
+    primary.healthy = True
+    _expire_cooldown(router, "primary")
+    assert router.complete(MESSAGES, 0.2) == "primary"
+    assert router.snapshot()["primary"]["circuit"] == "closed"
+
+
+def test_closing_the_circuit_forgets_the_failures_that_opened_it():
+    primary = FakeBackend("primary")
+    router = ModelRouter([primary, StubBackend()], failure_threshold=100, max_error_rate=0.5, cooldown=60)
+    primary.healthy = False
+    for _ in range(10):
+        router.complete(MESSAGES, 0.2)
+    assert router.snapshot()["primary"]["circuit"] == "open"
+
+    primary.healthy = True
+    _expire_cooldown(router, "primary")
+    assert router.complete(MESSAGES, 0.2) == "primary"
+
+    primary.healthy = False
+    router.complete(MESSAGES, 0.2)  # one error after recovering is not an error rate above 50%
+    assert router.snapshot()["primary"]["circuit"] == "closed"
+
+
+def test_streams_and_completions_are_ranked_on_their_own_latency():
+    fast_tokens, fast_replies = FakeBackend("fast_tokens"), FakeBackend("fast_replies")
+    router = ModelRouter([fast_tokens, fast_replies], min_samples=2)
+    for _ in range(2):
+        router._record(fast_tokens, ok=True, latency=0.1, metric="ttft")
+        router._record(fast_tokens, ok=True, latency=5.0, metric="total")
+        router._record(fast_replies, ok=True, latency=1.0, metric="ttft")
+        router._record(fast_replies, ok=True, latency=2.0, metric="total")
+
+    assert router.ranked("ttft")[0] is fast_tokens
+    assert router.ranked("total")[0] is fast_replies
+    assert router.complete(MESSAGES, 0.2) == "fast_replies"
+
+    async def first_token():
+        return await anext(router.astream(MESSAGES, 0.2))
+
+    assert asyncio.run(first_token()) == "fast_tokens"
+    assert len(router.health["fast_tokens"].latencies["ttft"]) == 3
+    assert len(router.health["fast_replies"].latencies["total"]) == 3
+
+
+def test_only_one_request_probes_a_half_open_backend():
+    primary = FakeBackend("primary")
+    router = ModelRouter([primary, StubBackend()], failure_threshold=1, cooldown=60)
+    primary.healthy = False
+    router.complete(MESSAGES, 0.2)
+    primary.healthy = True
+    _expire_cooldown(router, "primary")
+
+    async def main():
+        primary.gate = asyncio.Event()
+        probe = asyncio.create_task(router.acomplete(MESSAGES, 0.2))
+        await asyncio.sleep(0)
+        # While the probe is in flight everyone else goes to the next backend
+        assert (await router.acomplete(MESSAGES, 0.2)).startswith("[stub")
+        primary.gate.set()
+        return await probe
+
+    assert asyncio.run(main()) == "primary"
+    assert primary.calls == 2  # the failure that opened the circuit, then the probe
+
+
+def test_cancelled_probe_lets_the_next_request_probe():
+    primary = FakeBackend("primary")
+    router = ModelRouter([primary, StubBackend()], failure_threshold=1, cooldown=60)
+    primary.healthy = False
+    router.complete(MESSAGES, 0.2)
+    primary.healthy = True
+    _expire_cooldown(router, "primary")
+
+    async def main():
+        primary.gate = asyncio.Event()
+        stream = router.astream(MESSAGES, 0.2)
+        probe = asyncio.create_task(anext(stream))
+        await asyncio.sleep(0)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        primary.gate.set()
+        return await router.acomplete(MESSAGES, 0.2)
+
+    assert asyncio.run(main()) == "primary"
+
+
+def test_all_backends_failing_raises():
+    primary = FakeBackend("primary")
+    primary.healthy = False
+    router = ModelRouter([primary])
+    with pytest.raises(AllBackendsFailed):
+        router.complete(MESSAGES, 0.2)
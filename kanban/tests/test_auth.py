@@ -0,0 +1,110 @@
+import time
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+from backend import auth, models
+from backend.config import settings
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    auth._token_cache.clear()
+    auth._user_cache.clear()
+    yield
+    auth._token_cache.clear()
+    auth._user_cache.clear()
+
+
+def _add_user(session, email: str) -> models.User:
+    user = models.User(email=email, password_hash="x", role="customer")
+    session.add(user)
+    session.commit()
+    return user
+
+
+def _current_user(session, email: str) -> models.User:
+    creds = HTTPAuthorizationCredentials(scheme="Bearer", credentials=auth.create_access_token(email))
+    return auth.get_current_user(creds, session)
+
+
+def test_cached_user_is_served_without_a_query(session_factory):
+    with session_factory() as session:
+        _add_user(session, "a@example.com")
+    with session_factory() as session:
+        assert _current_user(session, "a@example.com").role == "customer"
+        assert "a@example.com" in auth._user_cache
+    with session_factory() as session:
+        user = _current_user(session, "a@example.com")
+        assert user.email == "a@example.com" and user in session
+
+
+def test_committed_update_drops_the_cached_user(session_factory):
+    with session_factory() as session:
+        user = _add_user(session, "a@example.com")
+        auth._cache_user(user)
+        user.role = "admin"
+        session.flush()
+        assert "a@example.com" in auth._user_cache  # not visible to others until the commit
+        session.commit()
+        assert "a@example.com" not in auth._user_cache
+    with session_factory() as session:
+        assert _current_user(session, "a@example.com").role == "admin"
+
+
+def test_committed_email_change_drops_the_old_email(session_factory):
+    with session_factory() as session:
+        user = _add_user(session, "old@example.com")
+        auth._cache_user(user)
+        user.email = "new@example.com"
+        session.commit()
+    assert "old@example.com" not in auth._user_cache
+
+
+def test_committed_delete_drops_the_cached_user(session_factory):
+    with session_factory() as session:
+        user = _add_user(session, "a@example.com")
+        auth._cache_user(user)
+        session.delete(user)
+        session.commit()
+        assert "a@example.com" not in auth._user_cache
+        with pytest.raises(HTTPException) as exc:
+            _current_user(session, "a@example.com")
+        assert exc.value.status_code == 401
+
+
+def test_rollback_keeps_the_cached_user(session_factory):
+    with session_factory() as session:
+        user = _add_user(session, "a@example.com")
+        auth._cache_user(user)
+        user.role = "admin"
+        session.flush()
+        session.rollback()
+        assert auth._user_cache["a@example.com"][1]["role"] == "customer"
+        assert "auth_changed_emails" not in session.info
+
+
+def test_expired_token_is_rejected_even_when_cached():
+    token = auth.create_access_token("a@example.com", expires_delta=timedelta(seconds=-5))
+    # Cached while it was still valid
+    auth._token_cache[token] = ("a@example.com", time.time() - 5)
+    with pytest.raises(HTTPException) as exc:
+        auth._decode_token(token)
+    assert exc.value.status_code == 401
+    assert token not in auth._token_cache
+
+
+def test_user_cache_size_is_bounded(monkeypatch):
+    monkeypatch.setattr(settings, "AUTH_USER_CACHE_SIZE", 3)
+    for n in range(5):
+        auth._cache_user(models.User(id=n, email=f"u{n}@example.com", password_hash="x", role="customer"))
+    assert list(auth._user_cache) == ["u2@example.com", "u3@example.com", "u4@example.com"]
+
+
+def test_token_cache_size_is_bounded(monkeypatch):
+    monkeypatch.setattr(settings, "AUTH_TOKEN_CACHE_SIZE", 3)
+    for n in range(5):
+        auth._decode_token(auth.create_access_token(f"u{n}@example.com"))
+    assert [sub for sub, _ in auth._token_cache.values()] == ["u2@example.com", "u3@example.com", "u4@example.com"]
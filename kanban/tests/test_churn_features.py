@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+
+from backend.models import Order, User, UserChurnFeatures
+from backend.services.churn_features import ChurnFeatureStore
+
+
+def _user(db, user_id: int):
+    db.add(User(id=user_id, email=f"user{user_id}@example.com", password_hash="x"))
+    db.flush()
+
+
+def _place(db, user_id: int, days_ago: int, cents: int, status: str = "paid") -> Order:
+    """Writes an order the way OrderService does: the order row and the feature update in one transaction."""
+    created_at = datetime.utcnow() - timedelta(days=days_ago)
+    order = Order(user_id=user_id, total_cents=cents, status=status, created_at=created_at)
+    db.add(order)
+    db.flush()
+    ChurnFeatureStore.record_order(db, user_id, created_at, cents)
+    db.commit()
+    return order
+
+
+def _cancel(db, order: Order):
+    old_status, order.status = order.status, "cancelled"
+    ChurnFeatureStore.record_status_change(db, order.user_id, order.created_at, old_status, "cancelled")
+    db.commit()
+
+
+def _rebuilt_metrics(db, user_id: int, now: datetime):
+    ChurnFeatureStore.rebuild(db)
+    return ChurnFeatureStore.get_metrics(db, user_id, now)
+
+
+def test_incremental_features_match_rebuild(session_factory):
+    db = session_factory()
+    _user(db, 1)
+    orders = [_place(db, 1, days_ago, cents) for days_ago, cents in [(75, 1200), (40, 800), (40, 500), (10, 2500), (2, 999)]]
+    _place(db, 1, 200, 10_000)  # outside the 90-day window
+    _cancel(db, orders[1])
+    now = datetime.utcnow()
+
+    incremental = ChurnFeatureStore.get_metrics(db, 1, now)
+    assert incremental["total_orders"] == 5
+    assert incremental["orders_last_30d"] == 2
+    assert incremental["total_spent"] == 59.99
+    assert incremental["has_cancelled_orders"]
+    assert incremental["days_since_last_order"] == 2
+    assert incremental == _rebuilt_metrics(db, 1, now)
+    db.close()
+
+
+def test_first_feature_row_is_backfilled_from_orders(session_factory):
+    db = session_factory()
+    _user(db, 1)
+    # Orders written before the feature store existed
+    for days_ago in (50, 20):
+        db.add(Order(user_id=1, total_cents=1000, status="paid", created_at=datetime.utcnow() - timedelta(days=days_ago)))
+    db.commit()
+    assert ChurnFeatureStore.get_metrics(db, 1) is None
+
+    _place(db, 1, 1, 500)
+    now = datetime.utcnow()
+    metrics = ChurnFeatureStore.get_metrics(db, 1, now)
+    assert metrics["total_orders"] == 3
+    assert metrics["total_spent"] == 25.0
+    assert metrics == _rebuilt_metrics(db, 1, now)
+    db.close()
+
+
+def test_rebuild_resets_users_without_recent_orders(session_factory):
+    db = session_factory()
+    _user(db, 1)
+    _user(db, 2)
+    _place(db, 1, 5, 1000)
+    _place(db, 2, 5, 1000)
+    # User 1's orders are gone (or aged out) since the row was written
+    db.query(Order).filter(Order.user_id == 1).delete()
+    db.commit()
+
+    ChurnFeatureStore.rebuild(db)
+    stale = db.get(UserChurnFeatures, 1)
+    assert stale.daily_buckets == {}
+    assert stale.last_order_at is None
+    assert ChurnFeatureStore.get_metrics(db, 1)["total_orders"] == 0
+    assert ChurnFeatureStore.get_metrics(db, 2)["total_orders"] == 1
+    db.close()
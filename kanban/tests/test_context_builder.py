@@ -0,0 +1,66 @@
+from backend.chat.context_builder import CONTEXT_HEADER, CONTEXT_SEPARATOR, ContextBuilder, message_tokens, shorten
+
+SYSTEM = {"role": "system", "content": "You are a helpful assistant."}
+
+
+def _turns(n: int, words: int = 20) -> list[dict]:
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"turn {i} " + "word " * words}
+        for i in range(n)
+    ]
+
+
+def _total(messages: list[dict]) -> int:
+    return sum(message_tokens(m) for m in messages)
+
+
+def test_short_conversation_is_sent_whole():
+    turns = _turns(4)
+    assert ContextBuilder(budget_tokens=4096).build(SYSTEM, turns) == [SYSTEM] + turns
+
+
+def test_oldest_turns_are_dropped_to_fit_the_budget():
+    builder = ContextBuilder(budget_tokens=400, reserve_tokens=100)
+    turns = _turns(40)
+    prompt = builder.build(SYSTEM, turns)
+    assert prompt[0] == SYSTEM and prompt[-1] == turns[-1]
+    assert prompt[1:] == turns[-(len(prompt) - 1):]
+    assert _total(prompt) <= 300
+
+
+def test_summary_is_pinned_after_the_system_prompt():
+    summary = {"role": "system", "content": "Summary of earlier turns."}
+    prompt = ContextBuilder(budget_tokens=400, reserve_tokens=100).build(SYSTEM, _turns(40), summary=summary)
+    assert prompt[:2] == [SYSTEM, summary]
+
+
+def test_newest_turn_is_kept_before_context():
+    builder = ContextBuilder(budget_tokens=400, reserve_tokens=100)
+    newest = {"role": "user", "content": "ask " * 200}
+    context = CONTEXT_HEADER + CONTEXT_SEPARATOR.join(["chunk " * 200, "more " * 200])
+    prompt = builder.build(SYSTEM, [newest], context=context)
+    assert prompt[-1] == newest
+    assert prompt[1]["content"].startswith(CONTEXT_HEADER + "chunk") and "more" not in prompt[1]["content"]
+    assert _total(prompt) <= 300
+
+
+def test_context_goes_just_before_the_newest_turn_best_chunk_first():
+    builder = ContextBuilder(budget_tokens=600, reserve_tokens=100)
+    turns = _turns(3, words=5)
+    context = CONTEXT_HEADER + CONTEXT_SEPARATOR.join(["best " * 60, "second " * 60, "third " * 300])
+    prompt = builder.build(SYSTEM, turns, context=context)
+    context_message = prompt[-2]
+    assert context_message["role"] == "system" and context_message["content"].startswith(CONTEXT_HEADER + "best")
+    assert "second" in context_message["content"]
+    assert prompt[-1] == turns[-1]
+    assert _total(prompt) <= 500
+
+
+def test_oversized_turns_are_shortened_to_head_and_tail():
+    long_turn = {"role": "assistant", "content": "start " + "middle " * 2000 + "end"}
+    excerpt = shorten(long_turn, 100)
+    assert message_tokens(excerpt) <= 100
+    assert excerpt["content"].startswith("start") and excerpt["content"].endswith("end")
+
+    prompt = ContextBuilder(budget_tokens=4096, max_turn_tokens=100).build(SYSTEM, [long_turn, _turns(1)[0]])
+    assert message_tokens(prompt[1]) <= 100
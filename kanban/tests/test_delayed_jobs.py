@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.automation.triggers.delayed_jobs import DelayedJobScheduler, parse_delay
+from backend.models import ScheduledJob
+
+calls = []
+
+
+def remember(user_id: int, cart_id: int):
+    calls.append((user_id, cart_id))
+
+
+def explode(user_id: int):
+    raise RuntimeError("handler failed")
+
+
+@pytest.fixture(autouse=True)
+def _reset_calls():
+    calls.clear()
+
+
+def _make_due(session_factory):
+    db = session_factory()
+    db.query(ScheduledJob).update({"run_at": datetime.utcnow() - timedelta(seconds=1)})
+    db.commit()
+    db.close()
+
+
+def _jobs(session_factory):
+    db = session_factory()
+    try:
+        return db.query(ScheduledJob).all()
+    finally:
+        db.close()
+
+
+def test_parse_delay():
+    assert parse_delay("1 hour") == timedelta(hours=1)
+    assert parse_delay("1h30m") == timedelta(hours=1, minutes=30)
+    assert parse_delay("2 days, 5 minutes") == timedelta(days=2, minutes=5)
+    assert parse_delay(90) == timedelta(seconds=90)
+    with pytest.raises(ValueError):
+        parse_delay("soon")
+    with pytest.raises(ValueError):
+        parse_delay("3 fortnights")
+
+
+def test_job_runs_once_when_due_and_is_deleted(session_factory):
+    scheduler = DelayedJobScheduler(session_factory)
+    scheduler.schedule("cart_created", remember, "1 hour", {"user_id": 1, "cart_id": 7})
+
+    assert scheduler.run_due() == 0  # not due yet
+    _make_due(session_factory)
+    assert scheduler.run_due() == 1
+    assert calls == [(1, 7)]
+    assert _jobs(session_factory) == []
+    assert scheduler.run_due() == 0
+
+
+def test_a_claimed_job_is_not_claimed_again(session_factory):
+    first, second = DelayedJobScheduler(session_factory), DelayedJobScheduler(session_factory)
+    job_id = first.schedule("cart_created", remember, 0, {"user_id": 1, "cart_id": 7})
+    _make_due(session_factory)
+
+    assert len(first._claim([job_id])) == 1
+    assert second._claim([job_id]) == []
+    assert second.stats["lost_claims"] == 1
+    # A lease that ran out (its worker died) can be taken over
+    db = session_factory()
+    db.query(ScheduledJob).update({"locked_until": datetime.utcnow() - timedelta(seconds=1)})
+    db.commit()
+    db.close()
+    assert len(second._claim([job_id])) == 1
+
+
+def test_failed_job_backs_off_then_gives_up(session_factory):
+    scheduler = DelayedJobScheduler(session_factory, max_attempts=2)
+    scheduler.schedule("low_engagement", explode, 0, {"user_id": 1})
+    _make_due(session_factory)
+
+    assert scheduler.run_due() == 1
+    [job] = _jobs(session_factory)
+    assert (job.status, job.attempts) == ("pending", 1)
+    assert job.run_at > datetime.utcnow()
+
+    _make_due(session_factory)
+    assert scheduler.run_due() == 1
+    [job] = _jobs(session_factory)
+    assert (job.status, job.attempts) == ("failed", 2)
+    assert "handler failed" in job.last_error
+    assert scheduler.run_due() == 0
+
+
+def test_refill_loads_only_jobs_within_the_horizon(session_factory):
+    scheduler = DelayedJobScheduler(session_factory, horizon=60)
+    soon = scheduler.schedule("cart_created", remember, 30, {"user_id": 1, "cart_id": 1})
+    scheduler.schedule("cart_created", remember, "2 hours", {"user_id": 2, "cart_id": 2})
+
+    scheduler._refill()
+    assert scheduler.snapshot()["in_memory"] == 1
+    assert [job_id for _, job_id in scheduler._heap] == [soon]
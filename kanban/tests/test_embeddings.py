@@ -0,0 +1,63 @@
+import numpy as np
+
+from backend.chat.embeddings import HashingEmbedder, VectorIndex
+
+KANBAN = "Kanban boards limit work in progress.\n\nCards move across columns from left to right."
+BILLING = "Invoices are sent monthly.\n\nStripe handles card payments and refunds."
+
+
+class CountingEmbedder(HashingEmbedder):
+    def __init__(self):
+        super().__init__(dim=64)
+        self.embedded = 0
+
+    def embed(self, texts):
+        self.embedded += len(texts)
+        return super().embed(texts)
+
+
+def test_search_returns_the_closest_chunk_first(tmp_path):
+    index = VectorIndex(str(tmp_path), CountingEmbedder(), chunk_size=60)
+    index.update_document("kanban", "kanban.txt", KANBAN)
+    index.update_document("billing", "billing.txt", BILLING)
+
+    [results] = index.search(["stripe card payments refunds"], k=2)
+    assert results[0][0]["doc_key"] == "billing"
+    assert results[0][1] >= results[1][1]
+    assert index.search([]) == []
+
+
+def test_only_new_or_changed_chunks_are_embedded(tmp_path):
+    embedder = CountingEmbedder()
+    index = VectorIndex(str(tmp_path), embedder, chunk_size=60)
+    assert index.update_document("kanban", "kanban.txt", KANBAN) == 2
+    assert index.update_document("kanban", "kanban.txt", KANBAN) == 0
+    assert index.update_document("kanban", "kanban.txt", KANBAN + "\n\nWIP limits expose bottlenecks.") == 1
+    assert embedder.embedded == 3 and len(index) == 3
+
+    index.remove_document("kanban")
+    assert len(index) == 0 and index.search(["kanban"]) == [[]]
+
+
+def test_saved_index_is_memory_mapped_and_kept_on_unchanged_rescan(tmp_path):
+    index = VectorIndex(str(tmp_path), CountingEmbedder(), chunk_size=60)
+    index.update_document("kanban", "kanban.txt", KANBAN)
+    index.save()
+    assert not index.dirty
+
+    embedder = CountingEmbedder()
+    reloaded = VectorIndex(str(tmp_path), embedder, chunk_size=60)
+    assert isinstance(reloaded._vectors, np.memmap)
+    assert reloaded.update_document("kanban", "kanban.txt", KANBAN) == 0
+    assert isinstance(reloaded._vectors, np.memmap) and not reloaded.dirty
+    assert embedder.embedded == 0
+
+
+def test_changing_the_embedder_rebuilds_the_index(tmp_path):
+    index = VectorIndex(str(tmp_path), CountingEmbedder(), chunk_size=60)
+    index.update_document("kanban", "kanban.txt", KANBAN)
+    index.save()
+
+    other = CountingEmbedder()
+    other.name = "other"
+    assert len(VectorIndex(str(tmp_path), other, chunk_size=60)) == 0
@@ -0,0 +1,65 @@
+import asyncio
+import os
+
+from backend.chat import ingest
+from backend.chat.ingest import DocumentIngestor
+from backend.chat.pdf_cache import PdfTextCache
+
+
+def _ingestor(tmp_path, path, cache):
+    # No start(): extraction runs on the default thread pool instead of worker processes
+    return DocumentIngestor(lambda: {"pdf-guide": ("pdf", path, "guide.pdf")}, [str(tmp_path)], pdf_cache=cache)
+
+
+def test_scan_publishes_ready_documents_and_fills_the_cache(tmp_path, make_pdf):
+    path = make_pdf(tmp_path / "guide.pdf", ["Kanban basics"])
+    cache = PdfTextCache(str(tmp_path / "cache"))
+    ingestor = _ingestor(tmp_path, path, cache)
+    published = []
+    ingestor.subscribe(lambda doc: published.append((doc.key, doc.status)))
+
+    async def main():
+        ingestor.scan()
+        await asyncio.gather(*ingestor._jobs)
+
+    asyncio.run(main())
+    assert published == [("pdf-guide", "ready")]
+    assert ingestor.get("pdf-guide").pages == ["Kanban basics"]
+    assert cache.lookup(path) == ["Kanban basics"]
+
+
+def test_pdf_edited_during_parse_is_not_cached_as_the_new_version(tmp_path, make_pdf, monkeypatch):
+    path = make_pdf(tmp_path / "guide.pdf", ["First edition"])
+    cache = PdfTextCache(str(tmp_path / "cache"))
+    ingestor = _ingestor(tmp_path, path, cache)
+    extract = ingest._extract_document
+
+    def edited_while_parsing(kind, path):
+        pages = extract(kind, path)
+        make_pdf(path, ["Second edition, longer"])
+        return pages
+
+    monkeypatch.setattr(ingest, "_extract_document", edited_while_parsing)
+
+    async def main():
+        ingestor.scan()
+        await asyncio.gather(*ingestor._jobs)
+
+    asyncio.run(main())
+    assert cache.lookup(path) is None  # the first edition's text is filed under its own version
+    monkeypatch.setattr(ingest, "_extract_document", extract)
+    assert asyncio.run(ingestor.read("pdf", path)) == ["Second edition, longer"]
+
+
+def test_read_treats_an_empty_page_list_as_a_result(tmp_path, make_pdf, monkeypatch):
+    path = make_pdf(tmp_path / "scan.pdf", [])
+    cache = PdfTextCache(str(tmp_path / "cache"))
+    ingestor = _ingestor(tmp_path, path, cache)
+    assert asyncio.run(ingestor.read("pdf", path)) == [""]
+
+    monkeypatch.setattr(ingest, "_extract_document", lambda kind, path: [])
+    os.utime(path, ns=(1, 1))
+    assert asyncio.run(ingestor.read("pdf", path)) == []
+    # Cached: a second read doesn't parse again
+    monkeypatch.setattr(ingest, "_extract_document", lambda kind, path: 1 / 0)
+    assert asyncio.run(ingestor.read("pdf", path)) == []
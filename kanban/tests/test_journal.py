@@ -0,0 +1,64 @@
+from backend.chat.journal import ConversationJournal
+
+SYSTEM = {"role": "system", "content": "You are helpful."}
+
+
+def test_journal_replays_appended_turns(tmp_path):
+    journal = ConversationJournal(str(tmp_path / "memory.json"))
+    history = journal.load([SYSTEM])
+    turn = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
+    history.extend(turn)
+    journal.append(*turn, history=history)
+    journal.close()
+
+    assert ConversationJournal(str(tmp_path / "memory.json")).load([SYSTEM]) == [SYSTEM, *turn]
+
+
+def test_journal_truncates_torn_last_line(tmp_path):
+    journal = ConversationJournal(str(tmp_path / "memory.json"))
+    history = journal.load([SYSTEM])
+    user = {"role": "user", "content": "hi"}
+    history.append(user)
+    journal.append(user)
+    journal.close()
+    with open(journal.journal_path, "a", encoding="utf-8") as f:
+        f.write('{"role": "assistant", "cont')  # crash mid-write
+
+    reloaded = ConversationJournal(str(tmp_path / "memory.json"))
+    assert reloaded.load([SYSTEM]) == [SYSTEM, user]
+    reply = {"role": "assistant", "content": "hello"}
+    reloaded.append(reply)
+    reloaded.close()
+
+    assert ConversationJournal(str(tmp_path / "memory.json")).load([SYSTEM]) == [SYSTEM, user, reply]
+
+
+def test_journal_ignores_lines_from_an_older_epoch(tmp_path):
+    journal = ConversationJournal(str(tmp_path / "memory.json"))
+    history = journal.load([SYSTEM])
+    stale = {"role": "user", "content": "already in the snapshot"}
+    history.append(stale)
+    journal.append(stale)
+    journal.close()
+    journal_lines = open(journal.journal_path, encoding="utf-8").read()
+    journal.rewrite(history)
+    journal.close()
+    # Crash between writing the snapshot and truncating the journal
+    with open(journal.journal_path, "w", encoding="utf-8") as f:
+        f.write(journal_lines)
+
+    assert ConversationJournal(str(tmp_path / "memory.json")).load([SYSTEM]) == [SYSTEM, stale]
+
+
+def test_journal_skips_turns_already_in_the_snapshot(tmp_path):
+    journal = ConversationJournal(str(tmp_path / "memory.json"))
+    history = journal.load([SYSTEM])
+    user = {"role": "user", "content": "hi"}
+    history.append(user)
+    journal.rewrite(history)  # e.g. the summarizer, while the turn is in flight
+    reply = {"role": "assistant", "content": "hello"}
+    history.append(reply)
+    journal.append(user, reply)
+    journal.close()
+
+    assert ConversationJournal(str(tmp_path / "memory.json")).load([SYSTEM]) == [SYSTEM, user, reply]
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from backend.services.llm_scheduler import BATCH, INTERACTIVE, LLMScheduler, SchedulerFull
+
+
+def test_scheduler_runs_at_most_max_concurrency():
+    scheduler = LLMScheduler(max_concurrency=2)
+    running, peak = 0, 0
+
+    async def job():
+        nonlocal running, peak
+        async with scheduler.slot(BATCH):
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    async def main():
+        await asyncio.gather(*(job() for _ in range(8)))
+
+    asyncio.run(main())
+    assert peak == 2
+    assert scheduler.snapshot()["lanes"][BATCH]["completed"] == 8
+    assert scheduler.snapshot()["running"] == 0
+
+
+def test_interactive_lane_overtakes_batch():
+    scheduler = LLMScheduler(max_concurrency=1)
+    order = []
+
+    async def job(lane, name):
+        async with scheduler.slot(lane):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        first = asyncio.create_task(job(BATCH, "running"))
+        await asyncio.sleep(0)
+        queued = [asyncio.create_task(job(BATCH, f"batch-{i}")) for i in range(3)]
+        await asyncio.sleep(0)
+        chat = asyncio.create_task(job(INTERACTIVE, "chat"))
+        await asyncio.gather(first, chat, *queued)
+
+    asyncio.run(main())
+    assert order == ["running", "chat", "batch-0", "batch-1", "batch-2"]
+
+
+def test_full_lane_rejects_immediately():
+    scheduler = LLMScheduler(max_concurrency=1, queue_limits={INTERACTIVE: 1, BATCH: 1})
+
+    async def hold(release: asyncio.Event, lane: str = BATCH):
+        async with scheduler.slot(lane):
+            await release.wait()
+
+    async def main():
+        release = asyncio.Event()
+        busy = asyncio.create_task(hold(release))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(hold(release))
+        await asyncio.sleep(0)
+        with pytest.raises(SchedulerFull):
+            async with scheduler.slot(BATCH):
+                pass
+        # Other lanes keep their own limit
+        chat = asyncio.create_task(hold(release, INTERACTIVE))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(busy, waiting, chat)
+
+    asyncio.run(main())
+    lanes = scheduler.snapshot()["lanes"]
+    assert lanes[BATCH]["rejected"] == 1
+    assert lanes[BATCH]["completed"] == 2
+    assert lanes[INTERACTIVE]["completed"] == 1
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    scheduler = LLMScheduler(max_concurrency=1)
+
+    async def main():
+        release = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot(BATCH):
+                await release.wait()
+
+        busy = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.sleep(0)
+        assert scheduler.snapshot()["lanes"][BATCH]["queued"] == 0
+        release.set()
+        await busy
+
+    asyncio.run(main())
+    assert scheduler.snapshot()["running"] == 0
@@ -0,0 +1,97 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+
+from backend.automation.triggers.outbox import OutboxDispatcher
+from backend.models import OutboxEvent
+
+
+def _dispatcher(session_factory, handler, **kwargs) -> OutboxDispatcher:
+    dispatcher = OutboxDispatcher(session_factory, "http://n8n.test/webhook", **kwargs)
+    dispatcher._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return dispatcher
+
+
+def _enqueue(session_factory, dispatcher, *endpoints):
+    db = session_factory()
+    for endpoint in endpoints:
+        dispatcher.enqueue(db, endpoint, {"event_name": endpoint})
+    db.commit()
+    db.close()
+
+
+def _rows(session_factory):
+    db = session_factory()
+    try:
+        return {row.endpoint: row for row in db.query(OutboxEvent)}
+    finally:
+        db.close()
+
+
+def test_dispatch_delivers_and_retries_failures(session_factory):
+    sent = []
+
+    def handler(request):
+        sent.append(request.url.path)
+        return httpx.Response(500 if request.url.path.endswith("broken") else 200)
+
+    dispatcher = _dispatcher(session_factory, handler)
+    _enqueue(session_factory, dispatcher, "order_created", "broken")
+
+    assert asyncio.run(dispatcher.dispatch_once()) == 2
+    rows = _rows(session_factory)
+    assert rows["order_created"].status == "delivered"
+    assert rows["broken"].status == "pending"
+    assert rows["broken"].attempts == 1
+    assert rows["broken"].next_attempt_at > datetime.utcnow()
+    assert sorted(sent) == ["/webhook/broken", "/webhook/order_created"]
+    # Not due again until its backoff has passed
+    assert asyncio.run(dispatcher.dispatch_once()) == 0
+
+
+def test_any_delivery_error_is_a_failed_attempt(session_factory):
+    def handler(request):
+        raise RuntimeError("unexpected")
+
+    dispatcher = _dispatcher(session_factory, handler, max_attempts=1)
+    _enqueue(session_factory, dispatcher, "order_created")
+
+    assert asyncio.run(dispatcher.dispatch_once()) == 1
+    row = _rows(session_factory)["order_created"]
+    assert row.status == "failed"
+    assert "RuntimeError" in row.last_error
+
+
+def test_a_claimed_batch_is_not_claimed_again(session_factory):
+    first = _dispatcher(session_factory, lambda request: httpx.Response(200))
+    second = _dispatcher(session_factory, lambda request: httpx.Response(200))
+    _enqueue(session_factory, first, "a", "b", "c")
+
+    assert len(first._claim()) == 3
+    assert second._claim() == []
+    # Once the lease runs out another dispatcher takes over
+    db = session_factory()
+    db.query(OutboxEvent).update({"next_attempt_at": datetime.utcnow() - timedelta(seconds=1)})
+    db.commit()
+    db.close()
+    assert len(second._claim()) == 3
+
+
+def test_prune_deletes_old_delivered_events_only(session_factory):
+    dispatcher = _dispatcher(session_factory, lambda request: httpx.Response(200), retention=3600, prune_batch=2)
+    _enqueue(session_factory, dispatcher, "old-1", "old-2", "old-3", "recent", "failed")
+    db = session_factory()
+    long_ago = datetime.utcnow() - timedelta(days=2)
+    for row in db.query(OutboxEvent):
+        if row.endpoint.startswith("old"):
+            row.status, row.delivered_at = "delivered", long_ago
+        elif row.endpoint == "recent":
+            row.status, row.delivered_at = "delivered", datetime.utcnow()
+        else:
+            row.status = "failed"
+    db.commit()
+    db.close()
+
+    assert dispatcher.prune() == 3
+    assert sorted(_rows(session_factory)) == ["failed", "recent"]
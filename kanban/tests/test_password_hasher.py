@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend import auth, models
+from backend.db import get_db
+from backend.routes import users
+from backend.services.password_hasher import HasherBusy, PasswordHasher, hash_password_sync, verify_and_update_sync
+
+# bcrypt's minimum work factor, so the tests stay fast
+ROUNDS = 4
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(workers=1, max_pending=1, rounds=ROUNDS)
+    yield hasher
+    hasher.shutdown()
+
+
+def test_hasher_rejects_beyond_max_pending(hasher):
+    async def main():
+        first = asyncio.create_task(hasher.hash("one"))
+        await asyncio.sleep(0)  # the first hash is now pending in the pool
+        with pytest.raises(HasherBusy):
+            await hasher.hash("two")
+        return await first
+
+    stored = asyncio.run(main())
+    assert verify_and_update_sync("one", stored, ROUNDS) == (True, None)
+    assert hasher.snapshot()["rejected"] == 1 and hasher.pending == 0
+
+
+def test_verify_rehashes_when_rounds_change(hasher):
+    stored = hash_password_sync("secret", ROUNDS)
+    assert asyncio.run(hasher.verify_and_update("secret", stored)) == (True, None)
+    assert asyncio.run(hasher.verify_and_update("wrong", stored)) == (False, None)
+
+    hasher.rounds = ROUNDS + 1
+    ok, new_hash = asyncio.run(hasher.verify_and_update("secret", stored))
+    assert ok and new_hash.startswith(f"$2b$0{ROUNDS + 1}$")
+    assert verify_and_update_sync("secret", new_hash, ROUNDS + 1) == (True, None)
+    assert hasher.stats["rehashed"] == 1
+
+
+def test_secrets_longer_than_72_bytes_use_the_first_72(hasher):
+    long_secret = "é" * 40  # 80 bytes in UTF-8
+    stored = asyncio.run(hasher.hash(long_secret))
+    assert asyncio.run(hasher.verify_and_update(long_secret, stored)) == (True, None)
+    assert verify_and_update_sync(long_secret[:36] + "other", stored, ROUNDS) == (True, None)
+    assert verify_and_update_sync(long_secret[:35], stored, ROUNDS) == (False, None)
+
+
+def test_malformed_hash_does_not_match():
+    assert verify_and_update_sync("secret", "not-a-bcrypt-hash", ROUNDS) == (False, None)
+    assert verify_and_update_sync("secret", None, ROUNDS) == (False, None)
+
+
+@pytest.fixture
+def client(session_factory, hasher, monkeypatch):
+    monkeypatch.setattr(auth, "password_hasher", hasher)
+    hasher.max_pending = 4
+    app = FastAPI()
+    app.include_router(users.router, prefix="/api/users")
+
+    def override_get_db():
+        with session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as client:
+        yield client
+
+
+def test_register_and_login(client):
+    credentials = {"email": "a@example.com", "password": "secret"}
+    assert client.post("/api/users/register", json=credentials).status_code == 200
+    assert client.post("/api/users/register", json=credentials).status_code == 400
+
+    token = client.post("/api/users/login", json=credentials).json()["access_token"]
+    assert auth._decode_token(token) == "a@example.com"
+    assert client.post("/api/users/login", json={**credentials, "password": "wrong"}).status_code == 401
+    assert client.post("/api/users/login", json={**credentials, "email": "b@example.com"}).status_code == 401
+
+
+def test_login_upgrades_the_stored_hash(client, hasher, session_factory):
+    credentials = {"email": "a@example.com", "password": "secret"}
+    client.post("/api/users/register", json=credentials)
+    hasher.rounds = ROUNDS + 1
+    assert client.post("/api/users/login", json=credentials).status_code == 200
+    with session_factory() as db:
+        stored = db.query(models.User).filter_by(email="a@example.com").one().password_hash
+    assert stored.startswith(f"$2b$0{ROUNDS + 1}$")
+
+
+def test_busy_hasher_answers_503(client, hasher):
+    hasher.max_pending = 0
+    response = client.post("/api/users/register", json={"email": "a@example.com", "password": "secret"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "2"
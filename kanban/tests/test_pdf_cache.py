@@ -0,0 +1,53 @@
+import os
+
+from backend.chat.ingest import _extract_document
+from backend.chat.pdf_cache import PdfTextCache
+
+LINES = ["Kanban boards help teams", "visual-", "ize their work.   "]
+EXPECTED = ["Kanban boards help teams\nvisualize their work."]
+
+
+def test_get_pages_parses_once_and_serves_normalized_pages(tmp_path, make_pdf, monkeypatch):
+    path = make_pdf(tmp_path / "guide.pdf", LINES)
+    cache = PdfTextCache(str(tmp_path / "cache"))
+    assert cache.get_pages(path) == EXPECTED
+
+    # A fresh cache (e.g. after a restart) reads the sidecar instead of parsing
+    monkeypatch.setattr("backend.chat.pdf_cache.extract_pages", lambda path: 1 / 0)
+    assert PdfTextCache(str(tmp_path / "cache")).get_pages(path) == EXPECTED
+
+
+def test_ingestor_and_get_pages_store_the_same_form(tmp_path, make_pdf):
+    path = make_pdf(tmp_path / "guide.pdf", LINES)
+    ingested = PdfTextCache(str(tmp_path / "ingested"))
+    ingested.store(path, _extract_document("pdf", path))
+    direct = PdfTextCache(str(tmp_path / "direct"))
+
+    assert ingested.lookup(path) == direct.get_pages(path) == EXPECTED
+
+
+def test_edited_pdf_replaces_its_old_sidecar(tmp_path, make_pdf):
+    path = make_pdf(tmp_path / "guide.pdf", LINES)
+    cache = PdfTextCache(str(tmp_path / "cache"))
+    cache.get_pages(path)
+    make_pdf(path, ["Second edition"])
+    os.utime(path, ns=(1, 1))
+
+    assert cache.lookup(path) is None
+    assert cache.get_pages(path) == ["Second edition"]
+    assert len(os.listdir(tmp_path / "cache")) == 1
+
+
+def test_store_tolerates_a_sidecar_removed_concurrently(tmp_path, make_pdf, monkeypatch):
+    path = make_pdf(tmp_path / "guide.pdf", LINES)
+    cache = PdfTextCache(str(tmp_path / "cache"))
+    cache.store(path, ["old"], key=cache._key(path).replace("-v", "-0-v"))
+    real_remove = os.remove
+
+    def racing_remove(stale):
+        real_remove(stale)  # the other worker got there first
+        real_remove(stale)
+
+    monkeypatch.setattr(os, "remove", racing_remove)
+    cache.store(path, EXPECTED)
+    assert cache.lookup(path) == EXPECTED
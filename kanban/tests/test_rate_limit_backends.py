@@ -0,0 +1,87 @@
+import os
+import uuid
+
+import pytest
+
+from backend.middleware.rate_limit_backends import HAS_REDIS, MemoryBackend, MmapBackend, RedisBackend, SQLiteBackend
+
+WINDOW = 60.0
+START = 1_000_020.0  # start of a window (divisible by WINDOW)
+
+
+def _redis(limit, window):
+    if not HAS_REDIS:
+        pytest.skip("redis client not installed")
+    backend = RedisBackend(limit, window, os.getenv("REDIS_URL", "redis://localhost:6379/15"), prefix=f"test:{uuid.uuid4().hex}:")
+    try:
+        backend.client.ping()
+    except Exception:
+        pytest.skip("no redis server")
+    return backend
+
+
+@pytest.fixture(params=["memory", "mmap", "sqlite", "redis"])
+def make_backend(request, tmp_path):
+    created = []
+
+    def make(limit, window=WINDOW):
+        if request.param == "memory":
+            backend = MemoryBackend(limit, window)
+        elif request.param == "mmap":
+            # One small stripe and pruning on every hit, so slot reuse and pruning happen in tests
+            backend = MmapBackend(limit, window, str(tmp_path / "counters"), slots=8, stripe_slots=8)
+        elif request.param == "sqlite":
+            backend = SQLiteBackend(limit, window, str(tmp_path / "counters.sqlite3"), prune_every=1)
+        else:
+            backend = _redis(limit, window)
+        created.append(backend)
+        return backend
+
+    make.kind = request.param
+    yield make
+    for backend in created:
+        backend.close()
+
+
+def test_limit_within_a_window(make_backend):
+    backend = make_backend(3)
+    assert [backend.hit("ip:1", START + i)[0] for i in range(4)] == [True, True, True, False]
+    allowed, remaining, retry_after = backend.hit("ip:1", START + 10)
+    assert not allowed and remaining == 0
+    assert 0 < retry_after <= WINDOW
+    # Keys are counted separately
+    assert backend.hit("ip:2", START + 10)[0]
+
+
+def test_previous_window_is_weighted_by_overlap(make_backend):
+    backend = make_backend(4)
+    for i in range(4):
+        assert backend.hit("ip:1", START + i)[0]
+    # At the start of the next window the full previous count still applies
+    assert not backend.hit("ip:1", START + WINDOW)[0]
+    # Halfway through it counts for 2, leaving room for 2 more
+    halfway = START + WINDOW * 1.5
+    assert [backend.hit("ip:1", halfway)[0] for _ in range(3)] == [True, True, False]
+    # Two windows later nothing of it is left
+    assert [backend.hit("ip:1", START + WINDOW * 3)[0] for _ in range(5)] == [True] * 4 + [False]
+
+
+def test_counters_are_shared_between_instances(make_backend):
+    if make_backend.kind == "memory":
+        pytest.skip("memory counters are per-process by design")
+    first, second = make_backend(2), make_backend(2)
+    if make_backend.kind == "redis":
+        second.prefix = first.prefix
+    assert first.hit("ip:1", START)[0]
+    assert second.hit("ip:1", START)[0]
+    assert not first.hit("ip:1", START)[0]
+
+
+
+def test_short_window_traffic_leaves_long_window_counters_alone(make_backend):
+    daily, minute = make_backend(3, 86400), make_backend(1000, 60)
+    assert [daily.hit("/api/chat|ip:1", START)[0] for _ in range(3)] == [True] * 3
+    # Minute-rule traffic over the next hour (same day) recycles and prunes only its own stale entries
+    for i in range(70):
+        assert minute.hit(f"/api|ip:{i}", START + 120 + i * 60)[0]
+    assert not daily.hit("/api/chat|ip:1", START + 120 + 70 * 60)[0]
@@ -0,0 +1,23 @@
+from backend.middleware.rate_limit_backends import MemoryBackend
+
+WINDOW = 60.0
+START = 1_000_020.0  # start of a window (divisible by WINDOW)
+
+
+def test_memory_backend_bounds_its_keys():
+    backend = MemoryBackend(5, WINDOW, shards=1, max_keys_per_shard=100)
+    for i in range(1000):
+        backend.hit(f"ip:{i}", START)
+    assert len(backend) == 100
+    # Keys idle for two windows are dropped on the next hit
+    backend.hit("ip:new", START + WINDOW * 2)
+    assert len(backend) == 1
+
+
+def test_memory_backend_keeps_two_counters_per_key():
+    backend = MemoryBackend(1000, WINDOW, shards=1)
+    for i in range(500):
+        backend.hit("ip:1", START + i * 0.1)
+    assert len(backend) == 1
+    [[key, state]] = backend._shards[0].items()
+    assert state == [int(START // WINDOW), 500, 0]
@@ -0,0 +1,75 @@
+import sqlite3
+import time
+
+from backend.chat.embeddings import HashingEmbedder
+from backend.services.response_cache import ResponseCache
+
+PARAMS = {"model": "llama3.1:latest", "temperature": 0.7}
+
+
+def _ask(question: str, history: list[dict] | None = None) -> list[dict]:
+    return (history or []) + [{"role": "user", "content": question}]
+
+
+def test_exact_hit_ignores_case_and_whitespace():
+    cache = ResponseCache()
+    cache.put(_ask("What is  a WIP limit?"), PARAMS, "A cap on work in progress.")
+    assert cache.get(_ask("what is a wip limit? "), PARAMS) == "A cap on work in progress."
+    assert cache.get(_ask("What is a WIP limit?"), {**PARAMS, "temperature": 0.2}) is None
+    assert cache.stats["exact_hits"] == 1 and cache.stats["misses"] == 1
+
+
+def test_entries_expire_and_memory_is_bounded():
+    cache = ResponseCache(max_entries=2, ttl_seconds=0.05)
+    for n in range(3):
+        cache.put(_ask(f"question {n}"), PARAMS, f"reply {n}")
+    assert cache.get(_ask("question 0"), PARAMS) is None
+    assert cache.get(_ask("question 2"), PARAMS) == "reply 2"
+    time.sleep(0.06)
+    assert cache.get(_ask("question 2"), PARAMS) is None
+
+
+def test_sqlite_level_survives_a_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    ResponseCache(db_path=path).put(_ask("hello"), PARAMS, "hi")
+    assert ResponseCache(db_path=path).get(_ask("hello"), PARAMS) == "hi"
+
+
+def test_sqlite_table_is_trimmed_on_purge(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(db_path=path, max_db_rows=3, purge_interval=0)
+    for n in range(6):
+        cache.put(_ask(f"question {n}"), PARAMS, f"reply {n}")
+    rows = sqlite3.connect(path).execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+    assert rows == 4  # trimmed to max_db_rows before each store
+
+
+def test_semantic_hit_needs_a_similar_question_and_the_same_history():
+    cache = ResponseCache(embed=HashingEmbedder().embed, similarity_threshold=0.8)
+    history = [{"role": "system", "content": "You are helpful."}]
+    cache.put(_ask("how do wip limits work on a kanban board", history), PARAMS, "They cap work in progress.")
+
+    assert cache.get(_ask("how do wip limits work on the kanban board", history), PARAMS) == "They cap work in progress."
+    assert cache.get(_ask("refund my last invoice please", history), PARAMS) is None
+    other_history = [{"role": "system", "content": "You are terse."}]
+    assert cache.get(_ask("how do wip limits work on the kanban board", other_history), PARAMS) is None
+    assert cache.stats["semantic_hits"] == 1
+
+
+def test_semantic_vectors_are_bounded_across_prefixes():
+    cache = ResponseCache(max_entries=3, embed=HashingEmbedder(dim=32).embed)
+    for n in range(5):
+        cache.put(_ask("question", [{"role": "system", "content": f"prompt {n}"}]), PARAMS, f"reply {n}")
+    assert cache.snapshot()["semantic_entries"] == 3
+    assert cache.snapshot()["semantic_prefixes"] == 3
+
+
+def test_embedding_failure_falls_back_to_exact_only():
+    def broken(texts):
+        raise ConnectionError("embedding server down")
+
+    cache = ResponseCache(embed=broken)
+    cache.put(_ask("hello"), PARAMS, "hi")
+    assert cache.get(_ask("hello"), PARAMS) == "hi"
+    assert cache.get(_ask("hello there"), PARAMS) is None
+    assert cache.snapshot()["hit_rate"] == 0.5
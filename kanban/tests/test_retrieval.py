@@ -0,0 +1,45 @@
+from backend.chat.retrieval import BM25Index, chunk_text, tokenize
+
+
+def _index() -> BM25Index:
+    index = BM25Index()
+    index.update_document("kanban", "kanban.txt", "Kanban boards limit work in progress.\n\nCards move across columns.")
+    index.update_document("billing", "billing.txt", "Invoices are sent monthly.\n\nStripe handles card payments.")
+    index.update_document("courses", "courses.txt", "Each course has lessons and quizzes.")
+    return index
+
+
+def test_tokenize_drops_stopwords_and_single_letters():
+    assert tokenize("What is the WIP limit, a Kanban rule?") == ["wip", "limit", "kanban", "rule"]
+
+
+def test_chunk_text_splits_on_paragraphs_within_size():
+    text = "\n\n".join(["alpha " * 10, "beta " * 10, "gamma " * 200])
+    chunks = chunk_text(text, size=150)
+    assert all(len(c) <= 150 for c in chunks)
+    assert chunks[0].startswith("alpha") and "beta" in chunks[0]
+    assert "".join(chunks).replace("\n", "").replace(" ", "") == text.replace("\n", "").replace(" ", "")
+
+
+def test_search_ranks_the_matching_document_first():
+    results = _index().search("How do I limit work in progress?", k=2)
+    assert results[0][0].doc_key == "kanban"
+    assert all(score > 0 for _, score in results)
+
+
+def test_search_ignores_unknown_terms_and_respects_k():
+    index = _index()
+    assert index.search("zebra") == []
+    assert len(index.search("card cards invoices lessons", k=2)) == 2
+
+
+def test_update_replaces_and_remove_forgets_a_document():
+    index = _index()
+    index.update_document("billing", "billing.txt", "Refunds take five days.")
+    assert index.search("invoices") == []
+    assert index.search("refunds")[0][0].doc_key == "billing"
+
+    index.remove_document("billing")
+    assert index.search("refunds") == []
+    assert not any(chunk_id.startswith("billing#") for posting in index.postings.values() for chunk_id in posting)
+    assert index._total_length == sum(chunk.length for chunk in index.chunks.values())
@@ -0,0 +1,102 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.services.single_flight import SingleFlight
+
+
+def test_concurrent_identical_calls_share_one_run():
+    flight = SingleFlight()
+    runs = 0
+
+    async def work():
+        nonlocal runs
+        runs += 1
+        await asyncio.sleep(0.01)
+        return "reply"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("same", work) for _ in range(5)), flight.do("other", work))
+
+    assert asyncio.run(main()) == ["reply"] * 6
+    assert runs == 2
+    assert flight.snapshot() == {"calls": 6, "coalesced": 4, "in_flight": 0}
+
+
+def test_every_waiter_gets_the_leaders_error():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ConnectionError("down")
+
+    async def main():
+        return await asyncio.gather(flight.do("k", work), flight.do("k", work), return_exceptions=True)
+
+    assert [type(e) for e in asyncio.run(main())] == [ConnectionError, ConnectionError]
+    assert flight.snapshot()["in_flight"] == 0
+
+
+def test_a_cancelled_caller_does_not_cancel_the_shared_run():
+    flight = SingleFlight()
+    release = None
+
+    async def work():
+        await release.wait()
+        return "reply"
+
+    async def main():
+        nonlocal release
+        release = asyncio.Event()
+        leader = asyncio.create_task(flight.do("k", work))
+        follower = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        release.set()
+        return await follower
+
+    assert asyncio.run(main()) == "reply"
+
+
+def test_finished_calls_are_not_cached():
+    flight = SingleFlight()
+    replies = iter(["first", "second"])
+
+    async def work():
+        return next(replies)
+
+    assert asyncio.run(flight.do("k", work)) == "first"
+    assert asyncio.run(flight.do("k", work)) == "second"
+
+
+def test_sync_callers_on_threads_share_one_run():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    runs = 0
+
+    def work():
+        nonlocal runs
+        runs += 1
+        started.set()
+        release.wait(5)
+        return "reply"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do_sync("k", work)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do_sync("k", work))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    while flight.snapshot()["coalesced"] < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert results == ["reply"] * 4 and runs == 1
+    assert flight.snapshot()["in_flight"] == 0